@@ -0,0 +1,338 @@
+"""
+Офлайн-загрузка истории и пересчёт статистики карточек вне веб-процесса.
+
+Две фазы:
+  fetch     — действия карточек из Trello (get_card_actions + save_card_history)
+              в пуле потоков; параллелизм ограничен --fetch-concurrency, а запросы
+              токена — своей корзиной --rate/--burst (BACKFILL_RATE_LIMIT): очередь
+              приоритетов веб-процесса сюда не распространяется. Лучше запускать
+              backfill с отдельным токеном (--token); с общим токеном бюджеты
+              (burst + rate * 10) веб-процессов и backfill вместе не должны
+              превышать 100 запросов за 10 секунд. На 429 корзина ждёт Retry-After;
+  recompute — статистика по сохранённой истории (таймлайны, как в метриках)
+              в пуле процессов, результат пишется в card_stats.
+
+Готовые карточки записываются в файл контрольной точки, поэтому прерванный
+запуск продолжается с того же места. Ход и скорость печатаются в stderr.
+
+Запуск из корня репозитория:
+    python -m backend.app.backfill --board BOARD_ID [--board ...] [--checkpoint backfill.json]
+    python -m backend.app.backfill --cards-file ids.txt --fetch-concurrency 4 --workers 8
+    python -m backend.app.backfill --all --no-fetch
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import groupby
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .database import SessionLocal, init_db
+from .models import Card, CardHistory, CardRollup, CardStat
+from .timeline import CardTimeline, load_card_rollup
+from .trello_api import TRELLO_TOKEN, get_board_cards, get_card_actions, save_card_history
+from .trello_clients import (
+    BACKGROUND, TRELLO_RATE_BURST, TRELLO_RATE_LIMIT, TRELLO_WINDOW_LIMIT, get_client, trello_priority, window_budget,
+)
+
+logger = logging.getLogger(__name__)
+
+# Одновременных загрузок карточек из Trello
+BACKFILL_FETCH_CONCURRENCY = int(os.getenv("BACKFILL_FETCH_CONCURRENCY", "8"))
+# Процессов для пересчёта; 0 — по числу ядер
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "0"))
+# Карточек в одной задаче пересчёта (один запрос истории и один commit на пачку)
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "200"))
+# Запросов к Trello в секунду и подряд для backfill. С токеном веб-процесса сумма
+# window_budget всех процессов должна укладываться в TRELLO_WINDOW_LIMIT
+BACKFILL_RATE_LIMIT = float(os.getenv("BACKFILL_RATE_LIMIT", "3"))
+BACKFILL_RATE_BURST = float(os.getenv("BACKFILL_RATE_BURST", "10"))
+
+# Как часто сохранять контрольную точку и печатать ход (секунды)
+CHECKPOINT_INTERVAL = 5.0
+
+
+class Checkpoint:
+    """Готовые карточки по фазам в JSON-файле; без пути — только в памяти."""
+
+    PHASES = ("fetch", "recompute")
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.done = {phase: set() for phase in self.PHASES}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            for phase in self.PHASES:
+                self.done[phase].update(data.get(phase, []))
+        self.saved_at = time.monotonic()
+
+    def mark(self, phase: str, card_ids):
+        self.done[phase].update(card_ids)
+        if time.monotonic() - self.saved_at >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self):
+        self.saved_at = time.monotonic()
+        if not self.path:
+            return
+        # Запись через временный файл: прерывание не оставит обрезанный JSON
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({phase: sorted(ids) for phase, ids in self.done.items()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class Progress:
+    """Счётчик фазы: печатает ход и скорость не чаще раза в CHECKPOINT_INTERVAL."""
+
+    def __init__(self, phase: str, total: int):
+        self.phase = phase
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = self.reported = time.monotonic()
+
+    def advance(self, done: int = 0, failed: int = 0):
+        self.done += done
+        self.failed += failed
+        if time.monotonic() - self.reported >= CHECKPOINT_INTERVAL:
+            self.report()
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        self.reported = time.monotonic()
+        rate = self.rate()
+        left = self.total - self.done - self.failed
+        eta = f", eta {left / rate:.0f}s" if rate and left else ""
+        print(f"{self.phase}: {self.done}/{self.total} cards, {self.failed} failed, "
+              f"{rate:.1f} cards/s{eta}", file=sys.stderr)
+
+    def summary(self) -> dict:
+        return {
+            "cards": self.done,
+            "failed": self.failed,
+            "seconds": round(time.monotonic() - self.started, 3),
+            "cards_per_second": round(self.rate(), 2),
+        }
+
+
+def fetch_card(card_id: str, token: str = None):
+    """
+    Загружает и сохраняет историю одной карточки (в своей сессии БД).
+    Запросы к Trello идут фоновым классом через корзину backfill (см. main).
+    """
+    db = SessionLocal()
+    try:
+        with trello_priority(BACKGROUND):
+            actions = get_card_actions(card_id, token)
+            save_card_history(card_id, actions, db, token)
+    finally:
+        db.close()
+
+
+def fetch_cards(card_ids: list, checkpoint: Checkpoint, concurrency: int, token: str = None) -> dict:
+    """
+    Фаза fetch: не больше concurrency карточек в работе одновременно.
+    Ошибочные карточки не попадают в контрольную точку и повторятся при следующем запуске.
+    """
+    pending = [card_id for card_id in card_ids if card_id not in checkpoint.done["fetch"]]
+    progress = Progress("fetch", len(pending))
+    errors = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        queue = iter(pending)
+        running = {}
+        try:
+            while True:
+                # Новая карточка ставится в работу только на место завершённой
+                for card_id in queue:
+                    running[executor.submit(fetch_card, card_id, token)] = card_id
+                    if len(running) >= concurrency:
+                        break
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    card_id = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors[card_id] = str(e)
+                        logger.warning("Backfill fetch failed", extra={"card_id": card_id, "error": str(e)})
+                        progress.advance(failed=1)
+                    else:
+                        checkpoint.mark("fetch", [card_id])
+                        progress.advance(done=1)
+        finally:
+            checkpoint.save()
+    progress.report()
+    return {**progress.summary(), "errors": errors}
+
+
+def card_stats(timeline: CardTimeline) -> dict:
+    """Статистика для card_stats — те же время в колонках и на участниках, что в метриках."""
+    time_per_list, time_per_member, _ = timeline.list_and_member_times()
+    return {
+        "total_time": round(sum(time_per_list.values())),
+        "time_per_list": json.dumps(time_per_list, ensure_ascii=False),
+        "time_per_member": json.dumps(time_per_member, ensure_ascii=False),
+    }
+
+
+def recompute_chunk(db_card_ids: list) -> list:
+    """
+    Пересчитывает card_stats для пачки карточек (выполняется в процессе пула).
+    История пачки читается одним запросом. Возвращает ID карточек Trello.
+    """
+    db = SessionLocal()
+    try:
+        return _recompute_chunk(db_card_ids, db)
+    finally:
+        db.close()
+
+
+def _recompute_chunk(db_card_ids: list, db: Session) -> list:
+    trello_ids = dict(db.query(Card.id, Card.trello_card_id).filter(Card.id.in_(db_card_ids)))
+    with_rollups = {card_id for (card_id,) in db.query(CardRollup.card_id).filter(CardRollup.card_id.in_(db_card_ids))}
+    rows = db.query(
+        CardHistory.card_id, CardHistory.id, CardHistory.action_type, CardHistory.list_name,
+        CardHistory.member_id, CardHistory.date,
+    ).filter(CardHistory.card_id.in_(db_card_ids)).order_by(
+        CardHistory.card_id, CardHistory.date, CardHistory.id
+    ).all()
+    history = {card_id: [row[1:] for row in group] for card_id, group in groupby(rows, key=lambda row: row[0])}
+
+    stats = []
+    for card_id in trello_ids:
+        rollup = load_card_rollup(card_id, db) if card_id in with_rollups else None
+        timeline = CardTimeline.from_rows(history.get(card_id, ()), rollup)
+        if not timeline.is_empty():
+            stats.append({"card_id": card_id, **card_stats(timeline)})
+
+    db.query(CardStat).filter(CardStat.card_id.in_(db_card_ids)).delete(synchronize_session=False)
+    if stats:
+        db.execute(insert(CardStat), stats)
+    db.commit()
+    return list(trello_ids.values())
+
+
+def recompute_cards(card_ids: list, checkpoint: Checkpoint, workers: int, chunk_size: int) -> dict:
+    """Фаза recompute: пачки карточек по процессам пула (workers=1 — в текущем процессе)."""
+    pending = set(card_ids) - checkpoint.done["recompute"]
+    db = SessionLocal()
+    try:
+        db_card_ids = []
+        ids = sorted(pending)
+        for start in range(0, len(ids), chunk_size):
+            db_card_ids.extend(card_id for (card_id,) in db.query(Card.id).filter(
+                Card.trello_card_id.in_(ids[start:start + chunk_size])
+            ))
+    finally:
+        db.close()
+    db_card_ids.sort()
+    chunks = [db_card_ids[start:start + chunk_size] for start in range(0, len(db_card_ids), chunk_size)]
+
+    progress = Progress("recompute", len(db_card_ids))
+    try:
+        if workers <= 1:
+            for chunk in chunks:
+                checkpoint.mark("recompute", recompute_chunk(chunk))
+                progress.advance(done=len(chunk))
+        else:
+            # spawn: дочерние процессы открывают свои соединения с БД, а не делят унаследованные
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                for done in executor.map(recompute_chunk, chunks):
+                    checkpoint.mark("recompute", done)
+                    progress.advance(done=len(done))
+    finally:
+        checkpoint.save()
+    progress.report()
+    # Карточки, которых нет в базе (например, загрузка не удалась), не пересчитываются
+    return {**progress.summary(), "missing": len(pending) - len(db_card_ids)}
+
+
+def collect_card_ids(boards=(), cards=(), cards_file: str = None, all_cards: bool = False, token: str = None) -> list:
+    """ID карточек Trello из досок, списка, файла (по одному в строке) и/или всей базы."""
+    card_ids = list(cards)
+    if cards_file:
+        with open(cards_file, encoding="utf-8") as f:
+            card_ids.extend(line.strip() for line in f if line.strip())
+    for board_id in boards:
+        with trello_priority(BACKGROUND):
+            card_ids.extend(get_board_cards(board_id, token))
+    if all_cards:
+        db = SessionLocal()
+        try:
+            card_ids.extend(card_id for (card_id,) in db.query(Card.trello_card_id))
+        finally:
+            db.close()
+    return list(dict.fromkeys(card_ids))
+
+
+def run_backfill(card_ids: list, checkpoint_path: str = None, fetch: bool = True, recompute: bool = True,
+                 fetch_concurrency: int = None, workers: int = None, chunk_size: int = None,
+                 token: str = None) -> dict:
+    """Загружает историю и пересчитывает статистику для card_ids."""
+    fetch_concurrency = fetch_concurrency or BACKFILL_FETCH_CONCURRENCY
+    workers = workers or BACKFILL_WORKERS or os.cpu_count() or 1
+    chunk_size = chunk_size or BACKFILL_CHUNK_SIZE
+    checkpoint = Checkpoint(checkpoint_path)
+    result = {"cards": len(card_ids), "checkpoint": checkpoint_path}
+    if fetch:
+        result["fetch"] = fetch_cards(card_ids, checkpoint, fetch_concurrency, token)
+    if recompute:
+        result["recompute"] = recompute_cards(card_ids, checkpoint, workers, chunk_size)
+    logger.info("Backfill finished", extra={key: value for key, value in result.items() if key != "fetch"})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill card history from Trello and recompute card stats")
+    parser.add_argument("--board", action="append", default=[], help="board ID (repeatable)")
+    parser.add_argument("--cards", nargs="*", default=[], help="card IDs")
+    parser.add_argument("--cards-file", help="file with one card ID per line")
+    parser.add_argument("--all", action="store_true", help="every card already in the database")
+    parser.add_argument("--checkpoint", help="JSON file with finished cards; an interrupted run resumes from it")
+    parser.add_argument("--no-fetch", action="store_true", help="only recompute stats from stored history")
+    parser.add_argument("--no-recompute", action="store_true", help="only fetch history from Trello")
+    parser.add_argument("--fetch-concurrency", type=int, default=BACKFILL_FETCH_CONCURRENCY)
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="recompute processes, 0 = CPU count")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    parser.add_argument("--token", default=TRELLO_TOKEN, help="Trello token (default: TRELLO_TOKEN)")
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE_LIMIT, help="Trello requests per second")
+    parser.add_argument("--burst", type=float, default=BACKFILL_RATE_BURST, help="Trello requests in a row")
+    args = parser.parse_args()
+
+    if not (args.board or args.cards or args.cards_file or args.all):
+        parser.error("nothing to do: pass --board, --cards, --cards-file or --all")
+    # Свежая база: таблицы создаются так же, как при старте веб-приложения
+    init_db()
+    # Отдельный процесс: в его корзине нет интерактивных запросов, запас для них не нужен
+    get_client(args.token).set_rate(args.rate, args.burst)
+    if not args.no_fetch and args.token == TRELLO_TOKEN:
+        shared = window_budget(args.rate, args.burst) + window_budget(TRELLO_RATE_LIMIT, TRELLO_RATE_BURST)
+        if shared > TRELLO_WINDOW_LIMIT:
+            logger.warning(
+                "Backfill shares TRELLO_TOKEN with the web process: %.0f requests per 10 s (one web worker) "
+                "exceed Trello's %d. Pass a separate --token or lower TRELLO_RATE_LIMIT/BURST and --rate/--burst",
+                shared, TRELLO_WINDOW_LIMIT,
+            )
+    card_ids = collect_card_ids(args.board, args.cards, args.cards_file, args.all, args.token)
+    result = run_backfill(
+        card_ids, args.checkpoint, fetch=not args.no_fetch, recompute=not args.no_recompute,
+        fetch_concurrency=args.fetch_concurrency, workers=args.workers, chunk_size=args.chunk_size,
+        token=args.token,
+    )
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import ast
+import json
+import logging
+import os
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .database import insert_ignore
+from .models import BoardSettings
+from .trello_clients import token_namespace
+
+logger = logging.getLogger(__name__)
+
+# Настройки бейджей доски по умолчанию (совпадают с board-settings.html)
+DEFAULT_BOARD_SETTINGS = {
+    "show_current_list_time": False,
+    "show_total_time": False,
+    "show_specific_lists_time": False,
+    "show_personal_time": False,
+    "colors": {
+        "current_list": "#0079bf",
+        "total_time": "#61bd4f",
+        "specific_lists": "#ff9f43",
+        "personal_time": "#eb5a46",
+    },
+    "selected_lists": [],
+}
+
+# Кэш сбрасывается при сохранении настроек; TTL страхует другие воркеры
+BOARD_SETTINGS_TTL = float(os.getenv("BOARD_SETTINGS_TTL", "60"))
+BOARD_LISTS_TTL = float(os.getenv("BOARD_LISTS_TTL", "60"))
+# Сколько секунд помнить доски участника при проверке доступа
+BOARD_ACCESS_TTL = float(os.getenv("BOARD_ACCESS_TTL", "300"))
+
+settings_cache = TTLCache("board_settings", BOARD_SETTINGS_TTL)
+lists_cache = TTLCache("board_lists", BOARD_LISTS_TTL)
+member_boards_cache = TTLCache("member_boards", BOARD_ACCESS_TTL)
+
+
+class SettingsVersionConflict(Exception):
+    """Настройки доски успели изменить с момента чтения клиентом."""
+
+
+def parse_settings(raw: str) -> dict:
+    """
+    Разбирает сохранённые настройки. Старые записи хранились как str(dict),
+    поэтому при ошибке JSON пробуем ast.literal_eval; нечитаемые — пустые (по умолчанию).
+    """
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        pass
+    try:
+        value = ast.literal_eval(raw)
+    except (ValueError, SyntaxError) as e:
+        logger.warning("Unreadable stored settings, using defaults", extra={"error": str(e)})
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def normalize_board_settings(settings: dict) -> dict:
+    """Дополняет настройки значениями по умолчанию."""
+    result = {**DEFAULT_BOARD_SETTINGS, **settings}
+    result["colors"] = {**DEFAULT_BOARD_SETTINGS["colors"], **settings.get("colors", {})}
+    result["selected_lists"] = list(settings.get("selected_lists", []))
+    return result
+
+
+def get_board_settings(board_id: str, db: Session) -> dict:
+    """Настройки доски: {"board_id", "version", "settings"}. Читается из кэша."""
+    def load():
+        row = db.query(BoardSettings).filter(BoardSettings.board_id == board_id).first()
+        if not row:
+            return {"board_id": board_id, "version": 0, "settings": normalize_board_settings({})}
+        return {"board_id": board_id, "version": row.version,
+                "settings": normalize_board_settings(parse_settings(row.settings))}
+
+    return settings_cache.get_or_load(board_id, load)
+
+
+def save_board_settings(board_id: str, settings: dict, db: Session, expected_version: int = None) -> dict:
+    """
+    Сохраняет настройки доски как JSON и увеличивает версию.
+    Если передан expected_version и он не совпадает — SettingsVersionConflict.
+    """
+    if not db.query(BoardSettings.id).filter(BoardSettings.board_id == board_id).first():
+        insert_ignore(db, BoardSettings, {"board_id": board_id, "settings": "{}", "version": 0}, ["board_id"])
+        db.commit()
+
+    # Блокировка строки (PostgreSQL) делает проверку версии и запись атомарными
+    row = db.query(BoardSettings).filter(BoardSettings.board_id == board_id).with_for_update().first()
+    current_version = row.version
+    if expected_version is not None and expected_version != current_version:
+        db.rollback()
+        raise SettingsVersionConflict(
+            f"Настройки доски {board_id} уже изменены (версия {current_version}, ожидалась {expected_version})"
+        )
+
+    normalized = normalize_board_settings(settings)
+    row.settings = json.dumps(normalized)
+    row.version = current_version + 1
+    row.updated_at = datetime.utcnow()
+    db.commit()
+
+    settings_cache.invalidate(board_id)
+    return {"board_id": board_id, "version": row.version, "settings": normalized}
+
+
+def get_cached_board_lists(board_id: str, token: str = None) -> list:
+    """
+    Колонки доски [{"id", "name"}] с кэшированием, чтобы не ходить в Trello на каждый бейдж.
+    Кэш разделён по токенам: пользователь не получит колонки доски, которую его токен не видит.
+    """
+    from .trello_api import get_board_lists
+
+    def load():
+        return [{"id": lst["id"], "name": lst["name"]} for lst in get_board_lists(board_id, token)]
+
+    return lists_cache.get_or_load((token_namespace(token), board_id), load)
+
+
+def require_board_member(board_id: str, token: str = None):
+    """
+    Пропускает только участника доски: токен обязателен (общий TRELLO_TOKEN
+    из .env не подходит), доски участника берутся из Trello и кэшируются по токену.
+    Иначе — 401 без токена, 403 для чужой доски или непринятого Trello токена.
+    """
+    from .trello_api import get_member_board_ids
+
+    if not token:
+        raise HTTPException(status_code=401, detail="X-Trello-Token is required")
+    try:
+        board_ids = member_boards_cache.get_or_load(token_namespace(token), lambda: get_member_board_ids(token))
+    except Exception as e:
+        logger.warning("Board access check failed", extra={"board_id": board_id, "error": str(e)})
+        raise HTTPException(status_code=403, detail="Trello token was not accepted")
+    if board_id not in board_ids:
+        raise HTTPException(status_code=403, detail=f"No access to board {board_id}")
+
+
+def build_card_badges(settings: dict, metrics: dict, list_names: dict, id_list: str) -> list:
+    """
+    Бейджи карточки по настройкам доски (та же логика, что раньше была в powerup.js).
+    list_names — {id колонки: имя}, id_list — текущая колонка карточки.
+    """
+    badges = []
+    time_per_list = metrics.get("time_per_list") or {}
+    current_list_name = list_names.get(id_list)
+    colors = settings["colors"]
+
+    if settings["show_current_list_time"] and current_list_name and time_per_list.get(current_list_name):
+        hours = time_per_list[current_list_name] / 3600
+        badges.append({"text": f"{current_list_name}: {hours:.1f}h", "color": colors["current_list"]})
+
+    if settings["show_total_time"] and metrics.get("total_time") is not None:
+        hours = metrics["total_time"] / 3600
+        badges.append({"text": f"Total: {hours:.1f}h", "color": colors["total_time"]})
+
+    if (settings["show_specific_lists_time"] and id_list in settings["selected_lists"]
+            and current_list_name and time_per_list.get(current_list_name)):
+        hours = time_per_list[current_list_name] / 3600
+        badges.append({"text": f"{current_list_name}: {hours:.1f}h", "color": colors["specific_lists"]})
+
+    return badges
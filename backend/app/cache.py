@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+from .telemetry import record_cache_lookup
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Потокобезопасный in-memory кэш с временем жизни и ограничением размера (LRU).
+    Попадания и промахи попадают в метрику cache_lookups_total{cache=name}.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                record_cache_lookup(self.name, True)
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+        record_cache_lookup(self.name, False)
+        return default
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """Возвращает значение из кэша или вызывает loader() и кэширует результат."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -1,14 +1,41 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert as sql_insert, inspect, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
+from .telemetry import instrument_engine
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tracker.db")
+# postgres:// (Heroku и др.) и postgresql:// без драйвера — явно через psycopg2
+for _scheme in ("postgres://", "postgresql://"):
+    if DATABASE_URL.startswith(_scheme):
+        DATABASE_URL = "postgresql+psycopg2://" + DATABASE_URL[len(_scheme):]
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Параметры пула соединений (используются для PostgreSQL и других серверных БД)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def make_engine(url: str):
+    """Создаёт engine с настройками под диалект: SQLite — файл, остальные — пул."""
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+engine = make_engine(DATABASE_URL)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -20,7 +47,89 @@ def get_db():
     finally:
         db.close()
 
+def insert_ignore(db, model, values: dict, index_elements: list):
+    """
+    INSERT, который молча пропускает строку при конфликте уникального ключа.
+    Используется, когда несколько воркеров одновременно создают одну запись.
+    PostgreSQL и SQLite — ON CONFLICT DO NOTHING, остальные диалекты — обычный
+    INSERT в savepoint: конфликт откатывает только его.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        try:
+            with db.begin_nested():
+                db.execute(sql_insert(model).values(**values))
+        except IntegrityError:
+            pass
+        return
+    stmt = insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+    db.execute(stmt)
+
+# Текущая колонка карточек, у которых её ещё нет: последняя строка истории
+# (как в save_card_history), а если вся история свёрнута — открытая колонка свёртки.
+# Доска в истории не хранится: board_id заполнит следующая загрузка карточки
+FILL_CARD_CURRENT_LIST_SQL = (
+    """UPDATE cards SET
+        current_list = (SELECT h.list_name FROM card_history h WHERE h.card_id = cards.id
+                        ORDER BY h.date DESC, h.id DESC LIMIT 1),
+        current_list_since = (SELECT MAX(h.date) FROM card_history h WHERE h.card_id = cards.id)
+    WHERE current_list_since IS NULL
+      AND EXISTS (SELECT 1 FROM card_history h WHERE h.card_id = cards.id)""",
+    """UPDATE cards SET
+        current_list = (SELECT r.open_list FROM card_rollups r WHERE r.card_id = cards.id),
+        current_list_since = (SELECT r.open_list_since FROM card_rollups r WHERE r.card_id = cards.id)
+    WHERE current_list_since IS NULL
+      AND EXISTS (SELECT 1 FROM card_rollups r WHERE r.card_id = cards.id AND r.open_list_since IS NOT NULL)""",
+)
+
+def fill_card_current_lists(connection):
+    for statement in FILL_CARD_CURRENT_LIST_SQL:
+        connection.execute(text(statement))
+
+def add_missing_columns(engine) -> set:
+    """
+    create_all не меняет существующие таблицы: в SQLite базу, созданную прежней версией
+    через init_db() (без alembic_version), добавляет новые nullable-колонки моделей и
+    недостающие индексы. Базы под alembic, в том числе PostgreSQL, обновляются только
+    миграциями. Возвращает добавленные колонки {(таблица, колонка)}.
+    """
+    added = set()
+    if engine.dialect.name != "sqlite":
+        return added
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    if "alembic_version" in existing_tables:
+        return added
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns or not column.nullable or column.primary_key:
+                    continue
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                )
+                added.add((table.name, column.name))
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+        if ("cards", "current_list_since") in added:
+            fill_card_current_lists(connection)
+    return added
+
 # --- Добавьте эту функцию ---
 def init_db():
+    from .search import ensure_card_search_index
     Base.metadata.create_all(bind=engine)
-# ----------------------------
\ No newline at end of file
+    add_missing_columns(engine)
+    ensure_card_search_index(engine)
+# ----------------------------
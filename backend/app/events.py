@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from .telemetry import Counter, register
+
+logger = logging.getLogger(__name__)
+
+# Предел одновременных подписчиков на процесс (сверх — 503)
+MAX_SSE_SUBSCRIBERS = int(os.getenv("MAX_SSE_SUBSCRIBERS", "10000"))
+# Интервал комментариев-heartbeat, чтобы прокси не рвали простаивающие соединения
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Ключ подписи билетов на поток доски; с несколькими воркерами или хостами задайте
+# общий, иначе у каждого процесса свой случайный и билет другого воркера не примется
+SSE_TICKET_SECRET = (os.getenv("SSE_TICKET_SECRET") or secrets.token_hex(32)).encode()
+# Сколько секунд билет действует; EventSource переподключается с ним же
+SSE_TICKET_TTL = int(os.getenv("SSE_TICKET_TTL", "3600"))
+
+BADGE_EVENTS = register(Counter(
+    "badge_events_total", "Обновления бейджей, отправленные подписчикам доски",
+    ("result",),
+))
+
+
+class BoardSubscription:
+    """
+    Один зритель доски. Обновления копятся в pending (card_id -> delta):
+    если клиент не успевает читать, старые значения по карточке просто
+    перезаписываются, так что память ограничена числом карточек доски.
+    """
+
+    def __init__(self, board_id: str):
+        self.board_id = board_id
+        self.pending = {}
+        self.settings_version = None  # версия настроек доски, если их сохранили
+        self.ready = asyncio.Event()
+
+    def push(self, deltas: dict):
+        self.pending.update(deltas)
+        self.ready.set()
+
+    def push_settings(self, version: int):
+        self.settings_version = version
+        self.ready.set()
+
+    def take(self):
+        """Накопленные (deltas, версия настроек или None)."""
+        deltas, self.pending = self.pending, {}
+        version, self.settings_version = self.settings_version, None
+        self.ready.clear()
+        return deltas, version
+
+
+class BadgeHub:
+    """In-process fan-out обновлений бейджей по доскам для SSE-подписчиков."""
+
+    def __init__(self):
+        self._boards = {}  # board_id -> set[BoardSubscription]
+        self._count = 0
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def has_subscribers(self, board_id: str) -> bool:
+        return bool(self._boards.get(board_id))
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    def subscribe(self, board_id: str):
+        """Регистрирует зрителя. Вызывается из event loop; None, если лимит исчерпан."""
+        with self._lock:
+            if self._count >= MAX_SSE_SUBSCRIBERS:
+                return None
+            self._loop = asyncio.get_running_loop()
+            subscription = BoardSubscription(board_id)
+            self._boards.setdefault(board_id, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription: BoardSubscription):
+        with self._lock:
+            subscribers = self._boards.get(subscription.board_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._boards[subscription.board_id]
+
+    def _deliver(self, board_id: str, deltas: dict):
+        for subscription in list(self._boards.get(board_id, ())):
+            subscription.push(deltas)
+        BADGE_EVENTS.inc(result="delivered")
+
+    def _deliver_settings(self, board_id: str, version: int):
+        for subscription in list(self._boards.get(board_id, ())):
+            subscription.push_settings(version)
+        BADGE_EVENTS.inc(result="settings")
+
+    def _dispatch(self, deliver, board_id: str, *args):
+        """
+        Доставка из event loop. Безопасно вызывать из потоков пула (синхронные
+        обработчики FastAPI): одним call_soon_threadsafe на публикацию, а не на подписчика.
+        """
+        if not self.has_subscribers(board_id) or self._loop is None:
+            BADGE_EVENTS.inc(result="no_subscribers")
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            deliver(board_id, *args)
+        else:
+            self._loop.call_soon_threadsafe(deliver, board_id, *args)
+
+    def publish(self, board_id: str, deltas: dict):
+        """Рассылает {card_id: delta} всем зрителям доски."""
+        self._dispatch(self._deliver, board_id, deltas)
+
+    def publish_settings(self, board_id: str, version: int):
+        """Сообщает зрителям доски, что настройки бейджей изменились: клиенты перезапрашивают бейджи."""
+        self._dispatch(self._deliver_settings, board_id, version)
+
+
+hub = BadgeHub()
+
+
+def format_sse(data: dict, event: str = None) -> str:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+def _ticket_signature(board_id: str, expires: int) -> str:
+    return hmac.new(SSE_TICKET_SECRET, f"{board_id}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def issue_board_ticket(board_id: str) -> str:
+    """
+    Подписанный билет на поток доски для EventSource (он не умеет заголовки, а
+    токен Trello в URL попал бы в логи). Выдаётся участнику доски после проверки токена.
+    """
+    expires = int(time.time()) + SSE_TICKET_TTL
+    return f"{expires}.{_ticket_signature(board_id, expires)}"
+
+
+def check_board_ticket(board_id: str, ticket: str) -> bool:
+    expires, _, signature = (ticket or "").partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _ticket_signature(board_id, int(expires)))
+
+
+async def board_event_stream(subscription: BoardSubscription, is_disconnected):
+    """Асинхронный генератор SSE для одного зрителя доски."""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": heartbeat\n\n"
+                continue
+            deltas, version = subscription.take()
+            if version is not None:
+                yield format_sse({"version": version}, event="settings")
+            if deltas:
+                yield format_sse({"cards": deltas}, event="badges")
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def publish_card_badges(card_id: str, board_id: str, id_list: str, db, token: str = None):
+    """
+    Пересчитывает бейджи карточки по настройкам доски и рассылает зрителям.
+    Ничего не делает, если доску никто не смотрит.
+    """
+    if not board_id or not hub.has_subscribers(board_id):
+        return
+    from .board_settings import build_card_badges, get_board_settings, get_cached_board_lists
+    from . import trello_api
+
+    try:
+        board_settings = get_board_settings(board_id, db)["settings"]
+        list_names = {}
+        if board_settings["show_current_list_time"] or board_settings["show_specific_lists_time"]:
+            list_names = {lst["id"]: lst["name"] for lst in get_cached_board_lists(board_id, token)}
+        metrics = trello_api.calculate_card_metrics(card_id, db, view="badge", token=token)
+        badges = build_card_badges(board_settings, metrics, list_names, id_list)
+    except Exception as e:
+        logger.warning("Error building live badges", extra={"card_id": card_id, "board_id": board_id, "error": str(e)})
+        return
+    hub.publish(board_id, {card_id: {"idList": id_list, "badges": badges}})
@@ -1,35 +1,49 @@
+import asyncio
+import logging
 import os
 import subprocess
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Header, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 # Обновленные импорты
 from ..app.database import init_db  # <-- Убедитесь, что import всё ещё здесь
 from ..routes import card, settings, export  # <-- Теперь ".." означает "на уровень выше"
+from .offload import shutdown_pool
+from .pages import render_page
+from .prewarm import start_prewarm_workers
+from .retention import HISTORY_RETENTION_INTERVAL, retention_loop
+from .trello_api import TRELLO_API_KEY
+from .static_assets import PrecompressedStaticFiles
+from .profiling import ProfilingMiddleware, check_admin_token, load_profile
+from .telemetry import RequestTimingMiddleware, configure_logging, record_cache_lookup, render_metrics
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "manifest.json")
 
 def run_generate_script():
     """Запускает generate_manifest.py."""
     script_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "generate_manifest.py")
-    print(f"Running generate script: {script_path}")
+    logger.info("Running generate script", extra={"script": script_path})
     # Запускаем скрипт в той же директории, где он находится
     result = subprocess.run(["python", script_path], cwd=os.path.dirname(script_path))
     if result.returncode != 0:
-        print(f"Error running {script_path}")
+        logger.error("Error running generate script", extra={"script": script_path})
     else:
-        print(f"Successfully ran {script_path}")
+        logger.info("Successfully ran generate script", extra={"script": script_path})
 
 def remove_manifest():
     """Удаляет manifest.json, если он существует."""
     if os.path.exists(MANIFEST_PATH):
         os.remove(MANIFEST_PATH)
-        print(f"Manifest {MANIFEST_PATH} removed.")
+        logger.info("Manifest removed", extra={"path": MANIFEST_PATH})
     else:
-        print(f"Manifest {MANIFEST_PATH} not found, nothing to remove.")
+        logger.info("Manifest not found, nothing to remove", extra={"path": MANIFEST_PATH})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -38,9 +52,23 @@ async def lifespan(app: FastAPI):
     
     # Инициализируем БД
     init_db()
+
+    # Периодическая свёртка старой истории (если включена)
+    retention_task = asyncio.create_task(retention_loop()) if HISTORY_RETENTION_INTERVAL > 0 else None
+
+    # Обработчики прогрева карточек при открытии доски
+    prewarm_tasks = start_prewarm_workers()
     
     yield  # <-- Здесь приложение запускается
     
+    if retention_task is not None:
+        retention_task.cancel()
+    for task in prewarm_tasks:
+        task.cancel()
+
+    # Останавливаем пул процессов для тяжёлых вычислений (если создавался)
+    shutdown_pool()
+
     # Удаляем manifest.json при остановке
     remove_manifest()
 
@@ -55,13 +83,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие ответов JSON API и HTML-страниц. Статика уже отдаётся сжатой
+# (Content-Encoding выставлен), поэтому middleware её не трогает.
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+# Профилирование по запросу (X-Profile + X-Admin-Token) или по сэмплированию
+app.add_middleware(ProfilingMiddleware)
+# Латентность запросов по маршрутам (внешний слой, учитывает и сжатие)
+app.add_middleware(RequestTimingMiddleware)
+
 # Подключаем маршруты
 app.include_router(card.router, prefix="/api", tags=["card"])
 app.include_router(settings.router, prefix="/api", tags=["settings"])
 app.include_router(export.router, prefix="/api", tags=["export"])
 
-# Подключаем статику (CSS, JS) под префикс /static
-app.mount("/static", StaticFiles(directory="./frontend"), name="static")
+# Подключаем статику (CSS, JS) под префикс /static.
+# Ассеты читаются в память один раз, отдаются с ETag, заранее сжатыми
+# вариантами gzip/brotli и immutable-кэшем для URL с хэшем содержимого.
+static_files = PrecompressedStaticFiles(directory="./frontend")
+app.mount("/static", static_files, name="static")
+
+# Хэшированные URL скриптов, подставляемые в шаблоны страниц
+ASSET_URLS = (
+    ("powerup_js", static_files.asset_url("powerup.js")),
+    ("content_js", static_files.asset_url("content.js")),
+    ("board_settings_js", static_files.asset_url("board-settings.js")),
+)
+
+def page_response(page: str, request: Request) -> HTMLResponse:
+    """Отдаёт закэшированную страницу Power-Up для origin текущего запроса."""
+    backend_url = request.url.scheme + "://" + request.url.netloc
+    hits_before = render_page.cache_info().hits
+    content = render_page(page, backend_url, ASSET_URLS, TRELLO_API_KEY or "")
+    record_cache_lookup("pages", render_page.cache_info().hits > hits_before)
+    return HTMLResponse(
+        content=content,
+        headers={"Cache-Control": "no-cache"},
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def serve_metrics():
+    """Метрики сервиса в формате Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/profiles/{profile_id}", response_class=PlainTextResponse, include_in_schema=False)
+def serve_profile(profile_id: str, x_admin_token: str = Header(None)):
+    """Отдаёт сохранённый профиль запроса (collapsed stacks для flamegraph)."""
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    content = load_profile(profile_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(content)
 
 # Убираем неправильный mount для powerup_frame.html, так как это маршрут, а не статический файл
 
@@ -69,171 +141,19 @@ app.mount("/static", StaticFiles(directory="./frontend"), name="static")
 # Этот HTML будет минимальным, он подключит powerup.js и вызовет Trello Power-Up initialize
 @app.get("/powerup_frame.html", response_class=HTMLResponse)
 def serve_powerup_frame(request: Request):
-    backend_url = request.url.scheme + "://" + request.url.netloc
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Card Tracker Frame</title>
-        <!-- Подключаем Trello Power-Up SDK -->
-        <script src="https://p.trellocdn.com/power-up.min.js"></script>
-    </head>
-    <body>
-        <!-- Пустое тело. UI будет отрисован через t.render() в powerup.js -->
-        <script>
-            // Устанавливаем BACKEND_URL для использования в powerup.js
-            window.BACKEND_URL = "{backend_url}";
-        </script>
-        <!-- Подключаем наш скрипт после установки BACKEND_URL -->
-        <script src="/static/powerup.js"></script>
-    </body>
-    </html>
-    """
-    return HTMLResponse(content=html_content)
+    return page_response("powerup_frame.html", request)
 
 @app.get("/content.html", response_class=HTMLResponse)
 def serve_content(request: Request):
-    backend_url = request.url.scheme + "://" + request.url.netloc
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Card Tracker Content</title>
-        <script src="https://p.trellocdn.com/power-up.min.js"></script>
-        <style>
-            body {{ font-family: Arial, sans-serif; padding: 20px; width: 300px; }}
-            .metric-group {{ margin: 10px 0; padding: 10px; border: 1px solid #ddd; }}
-            button {{ padding: 10px 20px; background: #0079bf; color: white; border: none; cursor: pointer; }}
-            button:hover {{ background: #005a87; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-            th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
-            .resize-handle {{ position: absolute; bottom: 0; left: 0; right: 0; height: 10px; background: #0079bf; cursor: ns-resize; opacity: 0.7; border-radius: 5px 5px 0 0; }}
-        </style>
-    </head>
-    <body>
-        <h3>Card Tracker</h3>
-        <button id="load-metrics-btn">Load Metrics</button>
-        <div id="settings">
-            <h4>Display Settings</h4>
-            <label><input type="checkbox" id="show-time-per-list" checked> Time per List</label><br>
-            <label><input type="checkbox" id="show-time-per-member" checked> Time per Member</label><br>
-            <label><input type="checkbox" id="show-total-time" checked> Total Time</label><br>
-            <label><input type="checkbox" id="show-list-counts" checked> List Counts</label><br>
-            <label><input type="checkbox" id="show-move-counts" checked> Move Counts</label><br>
-            <label><input type="checkbox" id="show-history"> Show History</label><br>
-            <label><input type="checkbox" id="show-detailed-history"> Show Detailed History</label><br>
-        </div>
-        <div id="content">Click "Load Metrics" to see data</div>
-        <div id="history">History will appear here</div>
-        <div class="resize-handle"></div>
-
-        <script>
-            window.BACKEND_URL = "{backend_url}";
-        </script>
-        <script src="/static/content.js"></script>
-    </body>
-    </html>
-    """
-    return HTMLResponse(content=html_content)
+    return page_response("content.html", request)
 
 @app.get("/popup.html", response_class=HTMLResponse)
 def serve_popup(request: Request):
-    backend_url = request.url.scheme + "://" + request.url.netloc
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Card Tracker Popup</title>
-        <script src="https://p.trellocdn.com/power-up.min.js"></script>
-        <style>
-            body {{ font-family: Arial, sans-serif; padding: 20px; }}
-            .metric-group {{ margin: 10px 0; padding: 10px; border: 1px solid #ddd; }}
-            button {{ padding: 10px 20px; background: #0079bf; color: white; border: none; cursor: pointer; }}
-            button:hover {{ background: #005a87; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-            th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
-        </style>
-    </head>
-    <body>
-        <h3>Card Tracker</h3>
-        <button id="load-metrics-btn">Load Metrics</button>
-        <div id="settings">
-            <h4>Display Settings</h4>
-            <label><input type="checkbox" id="show-time-per-list" checked> Time per List</label><br>
-            <label><input type="checkbox" id="show-time-per-member" checked> Time per Member</label><br>
-            <label><input type="checkbox" id="show-total-time" checked> Total Time</label><br>
-            <label><input type="checkbox" id="show-list-counts" checked> List Counts</label><br>
-            <label><input type="checkbox" id="show-move-counts" checked> Move Counts</label><br>
-            <label><input type="checkbox" id="show-history"> Show History</label><br>
-            <label><input type="checkbox" id="show-detailed-history"> Show Detailed History</label><br>
-        </div>
-        <div id="content">Click "Load Metrics" to see data</div>
-        <div id="history">History will appear here</div>
-
-        <script>
-            window.BACKEND_URL = "{backend_url}";
-        </script>
-        <script src="/static/content.js"></script>
-    </body>
-    </html>
-    """
-    return HTMLResponse(content=html_content)
+    return page_response("popup.html", request)
 
 @app.get("/board-settings.html", response_class=HTMLResponse)
 def serve_board_settings(request: Request):
-    backend_url = request.url.scheme + "://" + request.url.netloc
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Card Tracker - Board Settings</title>
-        <script src="https://p.trellocdn.com/power-up.min.js"></script>
-        <style>
-            body {{ font-family: Arial, sans-serif; padding: 20px; }}
-            .badge-setting {{ margin: 15px 0; padding: 10px; border: 1px solid #ddd; }}
-            .color-picker {{ display: inline-block; width: 30px; height: 30px; border: 1px solid #ccc; cursor: pointer; margin-left: 10px; }}
-            .list-selector {{ margin-top: 5px; }}
-            .list-selector select {{ width: 100%; height: 100px; }}
-        </style>
-    </head>
-    <body>
-        <h3>Card Tracker - Board Settings</h3>
-        <div id="board-settings-container">
-            <div class="badge-setting">
-                <label><input type="checkbox" id="show-current-list-time"> Show time in current list</label>
-                <button class="color-picker" id="current-list-color" style="background-color: #0079bf;"></button>
-            </div>
-
-            <div class="badge-setting">
-                <label><input type="checkbox" id="show-total-time"> Show total time</label>
-                <button class="color-picker" id="total-time-color" style="background-color: #61bd4f;"></button>
-            </div>
-
-            <div class="badge-setting">
-                <label><input type="checkbox" id="show-specific-lists-time"> Show time in specific lists</label>
-                <button class="color-picker" id="specific-lists-color" style="background-color: #ff9f43;"></button>
-                <div class="list-selector">
-                    <select multiple id="selected-lists">
-                    </select>
-                </div>
-            </div>
-
-            <div class="badge-setting">
-                <label><input type="checkbox" id="show-personal-time"> Show time only for me</label>
-                <button class="color-picker" id="personal-time-color" style="background-color: #eb5a46;"></button>
-            </div>
-
-            <button id="save-settings-btn" style="margin-top: 20px; padding: 10px 20px; background: #0079bf; color: white; border: none; cursor: pointer;">Save Settings</button>
-        </div>
-
-        <script>
-            window.BACKEND_URL = "{backend_url}";
-        </script>
-        <script src="/static/board-settings.js"></script>
-    </body>
-    </html>
-    """
-    return HTMLResponse(content=html_content)
+    return page_response("board-settings.html", request)
 
 
 # Подключаем powerup.html как корневой файл (отдаётся по /)
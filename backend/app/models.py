@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -10,25 +10,70 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     settings = Column(Text)  # JSON строка настроек
 
+class BoardSettings(Base):
+    __tablename__ = "board_settings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    board_id = Column(String, unique=True, index=True)  # ID доски в Trello
+    settings = Column(Text)  # JSON: настройки бейджей доски
+    version = Column(Integer, default=0)  # Увеличивается при каждом сохранении; 0 — ещё не сохранялись
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Card(Base):
     __tablename__ = "cards"
 
     id = Column(Integer, primary_key=True, index=True)
     trello_card_id = Column(String, unique=True, index=True)  # ID карточки в Trello
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Заполняются при загрузке истории, чтобы фильтры /cards шли по индексам
+    board_id = Column(String, index=True)  # ID доски в Trello
+    current_list = Column(String)          # колонка по последнему перемещению
+    current_list_since = Column(DateTime, index=True)
+
+    # Keyset-пагинация /cards по (created_at, id)
+    __table_args__ = (Index("ix_cards_created_at_id", "created_at", "id"),)
 
 class CardHistory(Base):
     __tablename__ = "card_history"
 
     id = Column(Integer, primary_key=True, index=True)
-    card_id = Column(Integer, ForeignKey("cards.id"))
+    card_id = Column(Integer, ForeignKey("cards.id"), index=True)
     action_type = Column(String)  # например, moveCardToList, addMemberToCard
     list_name = Column(String)    # имя колонки
     member_id = Column(String)    # ID участника
-    date = Column(DateTime)       # когда произошло действие
+    date = Column(DateTime, index=True)  # когда произошло действие
 
     card = relationship("Card", back_populates="history")
 
+class CardRollup(Base):
+    __tablename__ = "card_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    card_id = Column(Integer, ForeignKey("cards.id"), unique=True, index=True)
+    compacted_until = Column(DateTime)   # строки истории раньше этой даты свёрнуты
+    rows = Column(Integer, default=0)    # сколько строк свёрнуто всего
+    first_date = Column(DateTime)        # первая и последняя свёрнутые строки
+    last_date = Column(DateTime)
+    open_list = Column(String)           # колонка, в которой карточка была на момент свёртки
+    open_list_since = Column(DateTime)
+    open_member = Column(String)         # участник на момент свёртки
+    open_member_since = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class CardRollupEntry(Base):
+    __tablename__ = "card_rollup_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    card_id = Column(Integer, ForeignKey("cards.id"), index=True)
+    kind = Column(String)         # list, member или member_list
+    list_name = Column(String)
+    member_id = Column(String)
+    seconds = Column(Float, default=0)   # время в закрытых интервалах
+    moves = Column(Integer, default=0)   # попадания в колонку (действия перемещения)
+    visits = Column(Integer, default=0)  # все строки истории с этой колонкой
+    first_date = Column(DateTime)
+    last_date = Column(DateTime)
+
 class CardStat(Base):
     __tablename__ = "card_stats"
 
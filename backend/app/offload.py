@@ -0,0 +1,103 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from .telemetry import Counter, Histogram, register
+
+logger = logging.getLogger(__name__)
+
+# thread — тяжёлые вычисления в потоке запроса (как раньше); process — в пуле процессов,
+# чтобы экспорт и метрики длинных историй не держали GIL, пока ждут бейджи
+OFFLOAD_MODE = os.getenv("OFFLOAD_MODE", "thread").lower()
+# Процессов в пуле; 0 — по числу ядер
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", "0")) or os.cpu_count() or 1
+# Задач в пуле (выполняются + ждут); сверх этого — 503 вместо очереди
+OFFLOAD_MAX_PENDING = int(os.getenv("OFFLOAD_MAX_PENDING", "0")) or OFFLOAD_WORKERS * 2
+# Метрики карточек с историей короче этого считаются на месте: передача строк дороже расчёта
+OFFLOAD_MIN_HISTORY = int(os.getenv("OFFLOAD_MIN_HISTORY", "2000"))
+# Заголовок Retry-After для ответа 503
+OFFLOAD_RETRY_AFTER = os.getenv("OFFLOAD_RETRY_AFTER", "1")
+
+OFFLOAD_TASKS = register(Counter(
+    "offload_tasks_total", "Задачи пула процессов по результату (ok/error/rejected)",
+    ("task", "result"),
+))
+OFFLOAD_TASK_SECONDS = register(Histogram(
+    "offload_task_duration_seconds", "Время задачи в пуле процессов, включая ожидание и передачу данных",
+    ("task",),
+))
+
+
+class OffloadSaturated(Exception):
+    """Пул процессов занят: в нём уже OFFLOAD_MAX_PENDING задач."""
+
+
+def service_busy(error: OffloadSaturated) -> HTTPException:
+    """Ответ 503 с Retry-After для маршрута, задачу которого пул не принял."""
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": OFFLOAD_RETRY_AFTER})
+
+
+_pool = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def offload_enabled() -> bool:
+    return OFFLOAD_MODE == "process"
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: рабочие процессы не наследуют соединения БД и потоки веб-процесса
+        _pool = ProcessPoolExecutor(max_workers=OFFLOAD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def run_offloaded(task: str, fn, *args):
+    """
+    Выполняет fn(*args) в пуле процессов (OFFLOAD_MODE=process) и ждёт результат;
+    в режиме thread — просто вызывает fn. fn и аргументы должны сериализоваться pickle.
+    Если пул заполнен, сразу бросает OffloadSaturated — маршрут отвечает 503.
+    """
+    if not offload_enabled():
+        return fn(*args)
+
+    global _pending, _pool
+    with _lock:
+        if _pending >= OFFLOAD_MAX_PENDING:
+            OFFLOAD_TASKS.inc(task=task, result="rejected")
+            raise OffloadSaturated(f"Offload pool is busy ({_pending} tasks), retry later")
+        _pending += 1
+        pool = _get_pool()
+    try:
+        with OFFLOAD_TASK_SECONDS.time(task=task):
+            result = pool.submit(fn, *args).result()
+        OFFLOAD_TASKS.inc(task=task, result="ok")
+        return result
+    except BrokenProcessPool:
+        # Рабочий процесс упал (OOM и т.п.): следующая задача создаст новый пул
+        with _lock:
+            if _pool is pool:
+                _pool = None
+        OFFLOAD_TASKS.inc(task=task, result="error")
+        logger.error("Offload pool broken, recreating", extra={"task": task})
+        raise
+    except Exception:
+        OFFLOAD_TASKS.inc(task=task, result="error")
+        raise
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def shutdown_pool():
+    """Останавливает пул (вызывается из lifespan)."""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
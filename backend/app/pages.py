@@ -0,0 +1,179 @@
+from functools import lru_cache
+
+# Шаблоны страниц Power-Up. Рендерятся один раз на каждый backend origin
+# (см. render_page), а не собираются заново при каждой загрузке iframe.
+
+POWERUP_FRAME_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Card Tracker Frame</title>
+    <!-- Подключаем Trello Power-Up SDK -->
+    <script src="https://p.trellocdn.com/power-up.min.js"></script>
+</head>
+<body>
+    <!-- Пустое тело. UI будет отрисован через t.render() в powerup.js -->
+    <script>
+        // Устанавливаем BACKEND_URL для использования в powerup.js
+        window.BACKEND_URL = "{backend_url}";
+        window.TRELLO_APP_KEY = "{trello_app_key}";
+    </script>
+    <!-- Подключаем наш скрипт после установки BACKEND_URL -->
+    <script src="{powerup_js}"></script>
+</body>
+</html>
+"""
+
+CONTENT_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Card Tracker Content</title>
+    <script src="https://p.trellocdn.com/power-up.min.js"></script>
+    <style>
+        body {{ font-family: Arial, sans-serif; padding: 20px; width: 300px; }}
+        .metric-group {{ margin: 10px 0; padding: 10px; border: 1px solid #ddd; }}
+        button {{ padding: 10px 20px; background: #0079bf; color: white; border: none; cursor: pointer; }}
+        button:hover {{ background: #005a87; }}
+        table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
+        th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
+        .resize-handle {{ position: absolute; bottom: 0; left: 0; right: 0; height: 10px; background: #0079bf; cursor: ns-resize; opacity: 0.7; border-radius: 5px 5px 0 0; }}
+    </style>
+</head>
+<body>
+    <h3>Card Tracker</h3>
+    <button id="load-metrics-btn">Load Metrics</button>
+    <div id="settings">
+        <h4>Display Settings</h4>
+        <label><input type="checkbox" id="show-time-per-list" checked> Time per List</label><br>
+        <label><input type="checkbox" id="show-time-per-member" checked> Time per Member</label><br>
+        <label><input type="checkbox" id="show-total-time" checked> Total Time</label><br>
+        <label><input type="checkbox" id="show-list-counts" checked> List Counts</label><br>
+        <label><input type="checkbox" id="show-move-counts" checked> Move Counts</label><br>
+        <label><input type="checkbox" id="show-history"> Show History</label><br>
+        <label><input type="checkbox" id="show-detailed-history"> Show Detailed History</label><br>
+    </div>
+    <div id="content">Click "Load Metrics" to see data</div>
+    <div id="history">History will appear here</div>
+    <div class="resize-handle"></div>
+
+    <script>
+        window.BACKEND_URL = "{backend_url}";
+        window.TRELLO_APP_KEY = "{trello_app_key}";
+    </script>
+    <script src="{content_js}"></script>
+</body>
+</html>
+"""
+
+POPUP_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Card Tracker Popup</title>
+    <script src="https://p.trellocdn.com/power-up.min.js"></script>
+    <style>
+        body {{ font-family: Arial, sans-serif; padding: 20px; }}
+        .metric-group {{ margin: 10px 0; padding: 10px; border: 1px solid #ddd; }}
+        button {{ padding: 10px 20px; background: #0079bf; color: white; border: none; cursor: pointer; }}
+        button:hover {{ background: #005a87; }}
+        table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
+        th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
+    </style>
+</head>
+<body>
+    <h3>Card Tracker</h3>
+    <button id="load-metrics-btn">Load Metrics</button>
+    <div id="settings">
+        <h4>Display Settings</h4>
+        <label><input type="checkbox" id="show-time-per-list" checked> Time per List</label><br>
+        <label><input type="checkbox" id="show-time-per-member" checked> Time per Member</label><br>
+        <label><input type="checkbox" id="show-total-time" checked> Total Time</label><br>
+        <label><input type="checkbox" id="show-list-counts" checked> List Counts</label><br>
+        <label><input type="checkbox" id="show-move-counts" checked> Move Counts</label><br>
+        <label><input type="checkbox" id="show-history"> Show History</label><br>
+        <label><input type="checkbox" id="show-detailed-history"> Show Detailed History</label><br>
+    </div>
+    <div id="content">Click "Load Metrics" to see data</div>
+    <div id="history">History will appear here</div>
+
+    <script>
+        window.BACKEND_URL = "{backend_url}";
+        window.TRELLO_APP_KEY = "{trello_app_key}";
+    </script>
+    <script src="{content_js}"></script>
+</body>
+</html>
+"""
+
+BOARD_SETTINGS_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Card Tracker - Board Settings</title>
+    <script src="https://p.trellocdn.com/power-up.min.js"></script>
+    <style>
+        body {{ font-family: Arial, sans-serif; padding: 20px; }}
+        .badge-setting {{ margin: 15px 0; padding: 10px; border: 1px solid #ddd; }}
+        .color-picker {{ display: inline-block; width: 30px; height: 30px; border: 1px solid #ccc; cursor: pointer; margin-left: 10px; }}
+        .list-selector {{ margin-top: 5px; }}
+        .list-selector select {{ width: 100%; height: 100px; }}
+    </style>
+</head>
+<body>
+    <h3>Card Tracker - Board Settings</h3>
+    <div id="board-settings-container">
+        <div class="badge-setting">
+            <label><input type="checkbox" id="show-current-list-time"> Show time in current list</label>
+            <button class="color-picker" id="current-list-color" style="background-color: #0079bf;"></button>
+        </div>
+
+        <div class="badge-setting">
+            <label><input type="checkbox" id="show-total-time"> Show total time</label>
+            <button class="color-picker" id="total-time-color" style="background-color: #61bd4f;"></button>
+        </div>
+
+        <div class="badge-setting">
+            <label><input type="checkbox" id="show-specific-lists-time"> Show time in specific lists</label>
+            <button class="color-picker" id="specific-lists-color" style="background-color: #ff9f43;"></button>
+            <div class="list-selector">
+                <select multiple id="selected-lists">
+                </select>
+            </div>
+        </div>
+
+        <div class="badge-setting">
+            <label><input type="checkbox" id="show-personal-time"> Show time only for me</label>
+            <button class="color-picker" id="personal-time-color" style="background-color: #eb5a46;"></button>
+        </div>
+
+        <button id="save-settings-btn" style="margin-top: 20px; padding: 10px 20px; background: #0079bf; color: white; border: none; cursor: pointer;">Save Settings</button>
+    </div>
+
+    <script>
+        window.BACKEND_URL = "{backend_url}";
+        window.TRELLO_APP_KEY = "{trello_app_key}";
+    </script>
+    <script src="{board_settings_js}"></script>
+</body>
+</html>
+"""
+
+PAGE_TEMPLATES = {
+    "powerup_frame.html": POWERUP_FRAME_TEMPLATE,
+    "content.html": CONTENT_TEMPLATE,
+    "popup.html": POPUP_TEMPLATE,
+    "board-settings.html": BOARD_SETTINGS_TEMPLATE,
+}
+
+@lru_cache(maxsize=64)
+def render_page(page: str, backend_url: str, asset_urls: tuple, trello_app_key: str = "") -> bytes:
+    """
+    Рендерит страницу Power-Up и кэширует результат.
+    asset_urls — кортеж пар (имя_плейсхолдера, url) с хэшированными URL статики.
+    trello_app_key — публичный ключ приложения, нужен Power-Up для токена пользователя.
+    """
+    html = PAGE_TEMPLATES[page].format(
+        backend_url=backend_url, trello_app_key=trello_app_key, **dict(asset_urls)
+    )
+    return html.encode("utf-8")
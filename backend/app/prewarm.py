@@ -0,0 +1,134 @@
+"""
+Прогрев карточек доски при её открытии: Power-Up один раз присылает карточки
+доски, а фоновые обработчики по очереди (сначала недавно активные) обновляют
+их историю из Trello и загружают таймлайны в кэш горячих карточек. Панель
+карточки, открытая вскоре после этого, не ждёт Trello: fetch-history, metrics
+и detailed-history берут действия карточки из кэша (см. recent_card_actions).
+"""
+import asyncio
+import logging
+import os
+from .cache import TTLCache
+from .database import SessionLocal
+from .events import publish_card_badges
+from .models import Card
+from .telemetry import Counter, register
+from .timeline import load_card_timeline
+from .trello_api import get_card_actions, save_card_history
+from .trello_clients import BACKGROUND, token_namespace, trello_priority
+
+logger = logging.getLogger(__name__)
+
+# Фоновых обработчиков прогрева; 0 — прогрев выключен
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+# Сколько карточек доски прогревать за одно открытие
+PREWARM_MAX_CARDS = int(os.getenv("PREWARM_MAX_CARDS", "30"))
+# Очередь прогрева; при переполнении новые карточки отбрасываются
+PREWARM_QUEUE_SIZE = int(os.getenv("PREWARM_QUEUE_SIZE", "500"))
+# Сколько секунд действия карточки после обновления истории считаются свежими для панели
+PREWARM_FRESH_SECONDS = float(os.getenv("PREWARM_FRESH_SECONDS", "120"))
+# Сколько карточек держать в кэше свежих действий
+PREWARM_FRESH_MAX_CARDS = int(os.getenv("PREWARM_FRESH_MAX_CARDS", "2000"))
+
+PREWARM_CARDS = register(Counter(
+    "prewarm_cards_total", "Карточки прогрева по результату (scheduled/skipped/dropped/refreshed/error)",
+    ("result",),
+))
+
+# (пространство токена, card_id) -> действия карточки из Trello при последнем обновлении
+# истории: токен, которому карточка не видна, не получает чужие действия
+fresh_cards = TTLCache("prewarm_fresh", PREWARM_FRESH_SECONDS, maxsize=PREWARM_FRESH_MAX_CARDS)
+
+_queue = None
+_queued = set()
+
+
+def recent_card_actions(card_id: str, token: str = None):
+    """Действия карточки, если её история обновлялась этим токеном за PREWARM_FRESH_SECONDS, иначе None."""
+    return fresh_cards.get((token_namespace(token), card_id))
+
+
+def mark_refreshed(card_id: str, actions: list, token: str = None):
+    """Запоминает действия, с которыми только что сохранена история карточки."""
+    fresh_cards.set((token_namespace(token), card_id), actions)
+
+
+def board_cards_by_activity(board_id: str, limit: int) -> list:
+    """Известные карточки доски, начиная с недавно перемещённых (если Power-Up не прислал список)."""
+    db = SessionLocal()
+    try:
+        rows = db.query(Card.trello_card_id).filter(Card.board_id == board_id).order_by(
+            Card.current_list_since.desc()
+        ).limit(limit)
+        return [card_id for (card_id,) in rows]
+    finally:
+        db.close()
+
+
+def order_by_activity(cards: list, limit: int) -> list:
+    """cards — пары (card_id, dateLastActivity ISO или None); недавно активные первыми."""
+    dated = sorted(cards, key=lambda card: card[1] or "", reverse=True)
+    return list(dict.fromkeys(card_id for card_id, _ in dated))[:limit]
+
+
+def schedule_prewarm(card_ids: list, token: str = None) -> dict:
+    """Ставит карточки в очередь прогрева (вызывается из event loop)."""
+    result = {"scheduled": 0, "skipped": 0, "dropped": 0}
+    if _queue is None:
+        result["dropped"] = len(card_ids)
+        return result
+    for card_id in card_ids:
+        key = (token_namespace(token), card_id)
+        if key in _queued or recent_card_actions(card_id, token) is not None:
+            result["skipped"] += 1
+            continue
+        try:
+            _queue.put_nowait((card_id, token))
+        except asyncio.QueueFull:
+            result["dropped"] += 1
+            continue
+        _queued.add(key)
+        result["scheduled"] += 1
+    for name, count in result.items():
+        if count:
+            PREWARM_CARDS.inc(count, result=name)
+    return result
+
+
+def refresh_card(card_id: str, token: str = None):
+    """Обновляет историю карточки фоновым классом запросов и кладёт таймлайн в кэш."""
+    db = SessionLocal()
+    try:
+        with trello_priority(BACKGROUND):
+            actions = get_card_actions(card_id, token)
+            card_info = save_card_history(card_id, actions, db, token)
+        mark_refreshed(card_id, actions, token)
+        db_card_id = db.query(Card.id).filter(Card.trello_card_id == card_id).scalar()
+        load_card_timeline(db_card_id, db)
+        publish_card_badges(card_id, card_info.get("idBoard"), card_info.get("idList"), db, token)
+    finally:
+        db.close()
+
+
+async def prewarm_worker():
+    while True:
+        card_id, token = await _queue.get()
+        try:
+            await asyncio.to_thread(refresh_card, card_id, token)
+            PREWARM_CARDS.inc(result="refreshed")
+        except Exception as e:
+            PREWARM_CARDS.inc(result="error")
+            logger.warning("Prewarm failed", extra={"card_id": card_id, "error": str(e)})
+        finally:
+            _queued.discard((token_namespace(token), card_id))
+            _queue.task_done()
+
+
+def start_prewarm_workers() -> list:
+    """Создаёт очередь и обработчики прогрева (запускается из lifespan)."""
+    global _queue
+    if PREWARM_CONCURRENCY <= 0:
+        return []
+    _queue = asyncio.Queue(maxsize=PREWARM_QUEUE_SIZE)
+    _queued.clear()
+    return [asyncio.create_task(prewarm_worker()) for _ in range(PREWARM_CONCURRENCY)]
@@ -0,0 +1,174 @@
+import contextvars
+import functools
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+
+logger = logging.getLogger(__name__)
+
+# Токен администратора: без него заголовок/флаг профилирования игнорируется
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+# Доля запросов, профилируемых автоматически (0 — выключено)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Куда складывать профили в формате collapsed stacks (flamegraph.pl, speedscope)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# Сколько последних профилей хранить; более старые удаляются при сохранении нового
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Wall-clock дерево вызовов одного запроса.
+    Копит "собственное" время каждого стека в микросекундах, из чего
+    получается collapsed-формат: "a;b;c <микросекунды>" на строку.
+    """
+
+    def __init__(self, label: str):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}_{secrets.token_hex(4)}"
+        self.label = label
+        self.stacks = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _add(self, stack: str, seconds: float):
+        with self._lock:
+            self.stacks[stack] = self.stacks.get(stack, 0) + int(seconds * 1_000_000)
+
+    def _tracer(self, frame, event, arg):
+        # Стек текущего потока: [имя, начало, время детей]
+        stack = self._local.stack
+        now = time.perf_counter()
+        if event == "call":
+            stack.append([_frame_name(frame), now, 0.0])
+        elif event == "c_call":
+            stack.append([f"<builtin>.{getattr(arg, '__qualname__', arg)}", now, 0.0])
+        elif event in ("return", "c_return", "c_exception") and len(stack) > self._local.base:
+            name, start, children = stack[-1]
+            elapsed = now - start
+            self._add(";".join(entry[0] for entry in stack), elapsed - children)
+            stack.pop()
+            stack[-1][2] += elapsed
+
+    def run(self, func, *args, **kwargs):
+        """Выполняет func под трассировкой в текущем потоке."""
+        if getattr(self._local, "stack", None) is not None:
+            # Уже внутри профилируемой функции — стек и так пишется
+            return func(*args, **kwargs)
+        self._local.stack = [[self.label, time.perf_counter(), 0.0]]
+        self._local.base = 1
+        previous = sys.getprofile()
+        sys.setprofile(self._tracer)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sys.setprofile(previous)
+            root = self._local.stack[0]
+            self._add(root[0], time.perf_counter() - root[1] - root[2])
+            self._local.stack = None
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = sorted(self.stacks.items())
+        return "".join(f"{stack} {micros}\n" for stack, micros in items if micros > 0)
+
+    def save(self, directory: str = PROFILE_DIR) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        prune_profiles(directory)
+        return path
+
+
+def prune_profiles(directory: str = PROFILE_DIR, keep: int = PROFILE_MAX_FILES):
+    """Удаляет самые старые профили сверх keep (ID начинается с времени, поэтому сортировка по имени)."""
+    names = sorted(name for name in os.listdir(directory) if name.endswith(".folded"))
+    for name in names[:max(len(names) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass  # уже удалил параллельный запрос
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def profiled(func):
+    """
+    Декоратор для горячих функций: если текущий запрос профилируется,
+    вызов записывается в его дерево вызовов, иначе накладных расходов нет.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        return profile.run(func, *args, **kwargs)
+    return wrapper
+
+
+def _wants_profile(scope) -> bool:
+    headers = Headers(scope=scope)
+    query = QueryParams(scope.get("query_string", b""))
+    requested = headers.get("x-profile") == "1" or query.get("profile") == "1"
+    if requested and PROFILE_ADMIN_TOKEN:
+        return secrets.compare_digest(headers.get("x-admin-token", ""), PROFILE_ADMIN_TOKEN)
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def check_admin_token(token: str) -> bool:
+    return bool(PROFILE_ADMIN_TOKEN) and secrets.compare_digest(token or "", PROFILE_ADMIN_TOKEN)
+
+
+def load_profile(profile_id: str, directory: str = PROFILE_DIR):
+    """Читает сохранённый профиль по ID, None если его нет."""
+    if os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(directory, f"{profile_id}.folded")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: включает профилирование запроса по заголовку
+    X-Profile: 1 (или ?profile=1) с X-Admin-Token, либо по сэмплированию.
+    Профиль сохраняется в PROFILE_DIR, его ID возвращается в X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(f"{scope['method']} {scope['path']}")
+        token = _current_profile.set(profile)
+
+        async def send_wrapper(message):
+            # К началу ответа обработчик уже отработал — профиль готов
+            if message["type"] == "http.response.start" and profile.stacks:
+                path = profile.save()
+                MutableHeaders(scope=message).append("X-Profile-Id", profile.id)
+                logger.info("Request profile saved", extra={"profile_id": profile.id, "path": path})
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
@@ -0,0 +1,193 @@
+"""
+Хранение истории карточек: строки card_history старше HISTORY_RETENTION_DAYS
+сворачиваются в card_rollups/card_rollup_entries (суммы по колонкам и
+участникам плюс незакрытые интервалы), а сами строки архивируются в gzip
+JSONL (HISTORY_ARCHIVE_DIR) или удаляются. Метрики, история и экспорт
+читают свёртку вместе со свежими строками (см. timeline.py).
+
+Запуск вручную из корня репозитория:
+    python -m backend.app.retention [--days 365] [--archive-dir ./archive] [--dry-run]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .models import Card, CardHistory, CardRollup, CardRollupEntry
+from .telemetry import Counter, register
+from .timeline import CardTimeline, HistoryRollup, from_micros, invalidate_card_timeline, load_card_rollup
+
+logger = logging.getLogger(__name__)
+
+# Строки старше стольких дней сворачиваются
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "365"))
+# Куда писать архив свёрнутых строк; пусто — строки просто удаляются
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "")
+# Период фоновой свёртки в часах; 0 — только вручную
+HISTORY_RETENTION_INTERVAL = float(os.getenv("HISTORY_RETENTION_INTERVAL", "0"))
+
+HISTORY_ROWS_COMPACTED = register(Counter(
+    "history_rows_compacted_total", "Строки истории, свёрнутые политикой хранения",
+    ("action",),
+))
+
+
+class HistoryArchive:
+    """Архив свёрнутых строк: один gzip JSONL на запуск, строка на запись истории."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"card_history_{datetime.utcnow():%Y%m%dT%H%M%S}.jsonl.gz")
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+
+    def write(self, trello_card_id: str, rows):
+        for row_id, action_type, list_name, member_id, date in rows:
+            self._file.write(json.dumps({
+                "card_id": trello_card_id,
+                "id": row_id,
+                "action_type": action_type,
+                "list_name": list_name,
+                "member_id": member_id,
+                "date": date.isoformat(),
+            }, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_rollup(db_card_id: int, rollup: HistoryRollup, db: Session):
+    """Перезаписывает свёртку карточки (без commit)."""
+    def date(ts):
+        return from_micros(ts) if ts is not None else None
+
+    row = db.query(CardRollup).filter(CardRollup.card_id == db_card_id).first()
+    if row is None:
+        row = CardRollup(card_id=db_card_id)
+        db.add(row)
+    row.compacted_until = rollup.compacted_until
+    row.rows = rollup.rows
+    row.first_date, row.last_date = date(rollup.first_ts), date(rollup.last_ts)
+    row.open_list, row.open_list_since = rollup.open_list, date(rollup.open_list_since)
+    row.open_member, row.open_member_since = rollup.open_member, date(rollup.open_member_since)
+    row.updated_at = datetime.utcnow()
+
+    entries = []
+    for list_name in rollup.list_visits.keys() | rollup.list_micros.keys() | rollup.list_moves.keys():
+        visits, first_ts, last_ts = rollup.list_visits.get(list_name, (0, None, None))
+        entries.append({
+            "card_id": db_card_id, "kind": "list", "list_name": list_name, "member_id": None,
+            "seconds": rollup.list_micros.get(list_name, 0) / 1_000_000,
+            "moves": rollup.list_moves.get(list_name, 0), "visits": visits,
+            "first_date": date(first_ts), "last_date": date(last_ts),
+        })
+    for member_id, elapsed in rollup.member_micros.items():
+        entries.append({
+            "card_id": db_card_id, "kind": "member", "list_name": None, "member_id": member_id,
+            "seconds": elapsed / 1_000_000, "moves": 0, "visits": 0, "first_date": None, "last_date": None,
+        })
+    for (member_id, list_name), (visits, moves) in rollup.member_lists.items():
+        entries.append({
+            "card_id": db_card_id, "kind": "member_list", "list_name": list_name, "member_id": member_id,
+            "seconds": 0, "moves": moves, "visits": visits, "first_date": None, "last_date": None,
+        })
+
+    db.query(CardRollupEntry).filter(CardRollupEntry.card_id == db_card_id).delete()
+    if entries:
+        db.execute(insert(CardRollupEntry), entries)
+
+
+def compact_card_history(db_card_id: int, cutoff: datetime, db: Session, archive: HistoryArchive = None) -> int:
+    """
+    Сворачивает строки истории карточки раньше cutoff. Возвращает число строк.
+    Строка карточки блокируется, как и в save_card_history, поэтому свёртка
+    не пересекается с перезагрузкой истории той же карточки.
+    """
+    card = db.query(Card).filter(Card.id == db_card_id).with_for_update().first()
+    rows = db.query(
+        CardHistory.id, CardHistory.action_type, CardHistory.list_name, CardHistory.member_id, CardHistory.date
+    ).filter(CardHistory.card_id == db_card_id, CardHistory.date < cutoff).order_by(
+        CardHistory.date, CardHistory.id
+    ).all()
+    if card is None or not rows:
+        db.rollback()
+        return 0
+
+    timeline = CardTimeline.from_rows(rows, load_card_rollup(db_card_id, db))
+    save_rollup(db_card_id, timeline.compact(cutoff), db)
+    if archive is not None:
+        archive.write(card.trello_card_id, rows)
+    db.query(CardHistory).filter(CardHistory.card_id == db_card_id, CardHistory.date < cutoff).delete()
+    db.commit()
+
+    invalidate_card_timeline(db_card_id)
+    HISTORY_ROWS_COMPACTED.inc(len(rows), action="archived" if archive is not None else "deleted")
+    return len(rows)
+
+
+def run_retention(days: int = None, archive_dir: str = None, dry_run: bool = False) -> dict:
+    """Сворачивает историю всех карточек старше days дней."""
+    days = HISTORY_RETENTION_DAYS if days is None else days
+    archive_dir = HISTORY_ARCHIVE_DIR if archive_dir is None else archive_dir
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    result = {"cutoff": cutoff.isoformat(), "cards": 0, "rows": 0, "archive": None}
+
+    db = SessionLocal()
+    try:
+        old_rows = db.query(CardHistory.card_id).filter(CardHistory.date < cutoff)
+        card_ids = [card_id for (card_id,) in old_rows.distinct()]
+        if dry_run:
+            result.update(cards=len(card_ids), rows=old_rows.count())
+            return result
+
+        archive = HistoryArchive(archive_dir) if archive_dir else None
+        try:
+            for card_id in card_ids:
+                compacted = compact_card_history(card_id, cutoff, db, archive)
+                if compacted:
+                    result["cards"] += 1
+                    result["rows"] += compacted
+        finally:
+            if archive is not None:
+                archive.close()
+                result["archive"] = archive.path
+    finally:
+        db.close()
+
+    logger.info("History retention finished", extra=result)
+    return result
+
+
+async def retention_loop():
+    """Фоновая свёртка раз в HISTORY_RETENTION_INTERVAL часов (запускается из lifespan)."""
+    while True:
+        await asyncio.sleep(HISTORY_RETENTION_INTERVAL * 3600)
+        try:
+            await asyncio.to_thread(run_retention)
+        except Exception:
+            logger.exception("History retention failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact card history older than the retention period")
+    parser.add_argument("--days", type=int, default=HISTORY_RETENTION_DAYS)
+    parser.add_argument("--archive-dir", default=HISTORY_ARCHIVE_DIR,
+                        help="write compacted rows as gzip JSONL here (default: delete them)")
+    parser.add_argument("--dry-run", action="store_true", help="only count rows that would be compacted")
+    args = parser.parse_args()
+    print(json.dumps(run_retention(args.days, args.archive_dir, args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
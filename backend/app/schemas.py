@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class MemberTimeStats(BaseModel):
+    total_time: float
+    appears_count: int
+    leaves_count: int
+    sessions: List[List[Optional[datetime]]]  # [вход, выход]
+
+
+class BadgeMetrics(BaseModel):
+    """Метрики, из которых строятся бейджи: считаются без сессий и перемещений."""
+    total_time: float
+    time_per_list: Dict[str, float]
+    list_counts: Dict[str, int]
+
+
+class CardMetrics(BadgeMetrics):
+    """Полные метрики карточки (панель, экспорт)."""
+    time_per_member: Dict[str, float]
+    move_counts_by_member: Dict[str, Dict[str, int]]
+    member_time_stats: Dict[str, MemberTimeStats]
+
+
+class CardMetricsResponse(BaseModel):
+    """Ответ /card/{id}/metrics: набор полей зависит от view и fields."""
+    total_time: Optional[float] = None
+    time_per_list: Optional[Dict[str, float]] = None
+    list_counts: Optional[Dict[str, int]] = None
+    time_per_member: Optional[Dict[str, float]] = None
+    move_counts_by_member: Optional[Dict[str, Dict[str, int]]] = None
+    member_time_stats: Optional[Dict[str, MemberTimeStats]] = None
+    message: Optional[str] = None  # "Нет истории для этой карточки"
+
+
+class Badge(BaseModel):
+    text: str
+    color: str
+
+
+class BoardSettingsData(BaseModel):
+    """Настройки бейджей доски из board-settings.html; пропущенные поля — по умолчанию."""
+    model_config = ConfigDict(extra="allow")
+
+    show_current_list_time: bool = False
+    show_total_time: bool = False
+    show_specific_lists_time: bool = False
+    show_personal_time: bool = False
+    colors: Dict[str, str] = {}
+    selected_lists: List[str] = []
+
+
+class PrewarmCard(BaseModel):
+    id: str = Field(pattern="^[0-9A-Za-z]{1,64}$")
+    dateLastActivity: Optional[str] = None
+
+
+class PrewarmRequest(BaseModel):
+    """Карточки открытой доски из Power-Up; пусто — берутся известные карточки доски."""
+    cards: List[PrewarmCard] = []
+
+
+# Поля метрик по представлениям: badge не требует истории действий из Trello
+METRIC_VIEWS = {
+    "badge": tuple(BadgeMetrics.model_fields),
+    "full": tuple(CardMetrics.model_fields),
+}
@@ -0,0 +1,87 @@
+import logging
+from sqlalchemy import text
+from .models import Card
+
+logger = logging.getLogger(__name__)
+
+# Внешняя FTS5-таблица над cards.trello_card_id (только SQLite); синхронизируется триггерами
+CARD_SEARCH_TABLE = "cards_fts"
+# Триграммный поиск не находит подстроки короче трёх символов
+TRIGRAM_MIN_LENGTH = 3
+
+SQLITE_SEARCH_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {CARD_SEARCH_TABLE}
+        USING fts5(trello_card_id, content='cards', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+        INSERT INTO {CARD_SEARCH_TABLE}(rowid, trello_card_id) VALUES (new.id, new.trello_card_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+        INSERT INTO {CARD_SEARCH_TABLE}({CARD_SEARCH_TABLE}, rowid, trello_card_id)
+        VALUES ('delete', old.id, old.trello_card_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE OF trello_card_id ON cards BEGIN
+        INSERT INTO {CARD_SEARCH_TABLE}({CARD_SEARCH_TABLE}, rowid, trello_card_id)
+        VALUES ('delete', old.id, old.trello_card_id);
+        INSERT INTO {CARD_SEARCH_TABLE}(rowid, trello_card_id) VALUES (new.id, new.trello_card_id);
+    END""",
+)
+
+# Включается ensure_card_search_index, если SQLite собран с FTS5 (trigram — с 3.34)
+_sqlite_fts_enabled = False
+
+
+def create_sqlite_search_index(connection):
+    """Создаёт FTS5-индекс и триггеры; существующие карточки индексируются один раз."""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": CARD_SEARCH_TABLE}
+    ).first()
+    for statement in SQLITE_SEARCH_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text(f"INSERT INTO {CARD_SEARCH_TABLE}({CARD_SEARCH_TABLE}) VALUES ('rebuild')"))
+
+
+def ensure_card_search_index(engine):
+    """
+    Подключает полнотекстовый поиск по ID карточек, если база его умеет.
+    Без него search= работает как LIKE '%...%' (полный просмотр таблицы).
+    PostgreSQL использует GIN-индекс pg_trgm из миграции 0003.
+    """
+    global _sqlite_fts_enabled
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as connection:
+            create_sqlite_search_index(connection)
+        _sqlite_fts_enabled = True
+    except Exception as e:
+        logger.warning("SQLite FTS5 trigram search unavailable, falling back to LIKE", extra={"error": str(e)})
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Первая строка после всех строк с этим префиксом (для диапазона по B-tree индексу)."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def filter_card_id_prefix(query, prefix: str):
+    """
+    Префиксный фильтр как диапазон trello_card_id >= prefix AND < верхней границы:
+    в отличие от LIKE 'x%' использует обычный индекс и в SQLite, и в PostgreSQL.
+    """
+    return query.filter(Card.trello_card_id >= prefix, Card.trello_card_id < prefix_upper_bound(prefix))
+
+
+def filter_card_id_search(query, db, term: str):
+    """Поиск подстроки в ID карточки: FTS5 trigram в SQLite, pg_trgm (ILIKE) в PostgreSQL."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite" and _sqlite_fts_enabled and len(term) >= TRIGRAM_MIN_LENGTH:
+        phrase = '"' + term.replace('"', '""') + '"'
+        matches = text(f"SELECT rowid FROM {CARD_SEARCH_TABLE} WHERE {CARD_SEARCH_TABLE} MATCH :phrase")
+        return query.filter(Card.id.in_(matches.bindparams(phrase=phrase).columns(rowid=Card.id.type)))
+    if dialect == "postgresql":
+        return query.filter(Card.trello_card_id.ilike(f"%{escape_like(term)}%", escape="\\"))
+    return query.filter(Card.trello_card_id.contains(term, autoescape=True))
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import Response
+
+try:
+    import brotli  # Необязательная зависимость: без неё отдаём только gzip
+except ImportError:
+    brotli = None
+
+# Кэш на год для URL с актуальным хэшем содержимого
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Без хэша (или со старым хэшем) браузер обязан перепроверять ETag
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Сжимаем только текстовые ассеты, картинки и так сжаты
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".html", ".json", ".svg", ".txt"}
+
+
+class StaticAsset:
+    """Файл статики, прочитанный в память вместе со сжатыми вариантами."""
+
+    def __init__(self, path: str, body: bytes):
+        self.path = path
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.etag = f'"{self.digest}"'
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/") or self.media_type == "application/javascript":
+            self.media_type += "; charset=utf-8"
+
+        self.variants = {}  # content-encoding -> bytes
+        if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+            gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gzipped) < len(body):
+                self.variants["gzip"] = gzipped
+            if brotli is not None:
+                brotlied = brotli.compress(body, quality=11)
+                if len(brotlied) < len(body):
+                    self.variants["br"] = brotlied
+
+    def pick_encoding(self, accept_encoding: str):
+        """Выбирает лучший доступный вариант под Accept-Encoding клиента."""
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles, который при старте читает ассеты в память, считает хэш
+    содержимого и заранее готовит gzip/brotli варианты.
+    URL вида /static/powerup.js?v=<hash> кэшируются браузером навсегда.
+    """
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.assets = {}
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                full_path = os.path.join(root, filename)
+                rel_path = os.path.normpath(os.path.relpath(full_path, directory))
+                with open(full_path, "rb") as f:
+                    self.assets[rel_path] = StaticAsset(rel_path, f.read())
+
+    def asset_url(self, path: str, prefix: str = "/static") -> str:
+        """Возвращает URL ассета с хэшем содержимого для долгого кэширования."""
+        asset = self.assets[os.path.normpath(path)]
+        return f"{prefix}/{path}?v={asset.digest}"
+
+    async def get_response(self, path: str, scope):
+        asset = self.assets.get(path)
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        headers = {
+            "ETag": asset.etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if version == asset.digest else REVALIDATE_CACHE_CONTROL,
+        }
+
+        if request_headers.get("if-none-match") == asset.etag:
+            return Response(status_code=304, headers=headers)
+
+        body = asset.body
+        encoding = asset.pick_encoding(request_headers.get("accept-encoding", ""))
+        if encoding:
+            body = asset.variants[encoding]
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,265 @@
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Границы бакетов гистограмм (секунды), как у prometheus_client по умолчанию
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Доля сохраняемых "горячих" логов уровня DEBUG/INFO (1.0 — все, 0.01 — каждый сотый)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """Монотонный счётчик с метками."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма длительностей с метками (кумулятивные бакеты, sum и count)."""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [counts per bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет время выполнения блока. Метки можно дописать внутри блока."""
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (repr(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames + ("le",), key + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render_metrics() -> str:
+    """Текстовый формат экспозиции Prometheus для всех зарегистрированных метрик."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = register(Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса по маршруту",
+    ("method", "route", "status"),
+))
+TRELLO_REQUEST_SECONDS = register(Histogram(
+    "trello_request_duration_seconds", "Время запроса к Trello API по эндпоинту и статусу",
+    ("endpoint", "status"),
+))
+DB_QUERY_SECONDS = register(Histogram(
+    "db_query_duration_seconds", "Время выполнения SQL запроса по типу операции",
+    ("operation",),
+))
+COMPUTE_SECONDS = register(Histogram(
+    "metrics_compute_duration_seconds", "Время вычисления метрик и истории карточки",
+    ("stage",),
+))
+CACHE_LOOKUPS = register(Counter(
+    "cache_lookups_total", "Обращения к внутренним кэшам (hit/miss)",
+    ("cache", "result"),
+))
+
+
+def timed(histogram, **labels):
+    """Декоратор: замеряет время вызова функции в указанной гистограмме."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class RequestTimingMiddleware:
+    """ASGI middleware: гистограмма латентности по шаблону маршрута."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=route_template(scope), status=status["code"],
+            )
+
+
+def route_template(scope) -> str:
+    """
+    Шаблон пути запроса (/api/card/{card_id}/metrics), чтобы не плодить
+    серии метрик по каждому ID. Незаматченные запросы сводятся в "unmatched".
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if "endpoint" not in scope or template is None:
+        return "unmatched"
+    # Маршруты include_router(prefix=...) хранят путь без префикса: префикс — это часть
+    # запроса до того места, с которого путь совпадает с шаблоном маршрута
+    path = scope["path"]
+    for start in range(len(path)):
+        if (start == 0 or path[start] == "/") and route.path_regex.match(path[start:]):
+            return path[:start] + template
+    return template
+
+
+def instrument_engine(engine):
+    """Вешает на SQLAlchemy engine замер времени каждого SQL запроса."""
+
+    # Время старта хранится в контексте выполнения запроса, а не в стеке соединения:
+    # упавший запрос не доходит до after_cursor_execute и иначе сдвигал бы пары старт/конец
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = context.query_start_time
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=operation)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю LOG_SAMPLE_RATE записей, помеченных extra={"sampled": True}.
+    WARNING и выше не сэмплируются никогда.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, "sampled", False) and record.levelno < logging.WARNING:
+            return random.random() < self.rate
+        return True
+
+
+# Стандартные атрибуты LogRecord — всё остальное считаем структурными полями из extra
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sampled"}
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись: время, уровень, логгер, сообщение и поля из extra."""
+
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging():
+    """Настраивает структурные JSON-логи для пакета backend."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+    logger = logging.getLogger("backend")
+    logger.handlers = [handler]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
@@ -0,0 +1,322 @@
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .models import CardHistory, CardRollup, CardRollupEntry
+
+# Сколько карточек держать в памяти и как долго
+HOT_CARDS_MAX = int(os.getenv("HOT_CARDS_MAX", "100000"))
+HOT_CARDS_TTL = float(os.getenv("HOT_CARDS_TTL", "3600"))
+
+EPOCH = datetime(1970, 1, 1)
+# Действия, которые означают попадание карточки в колонку
+MOVE_TYPES = ("createCard", "moveCardToList", "updateCard")
+# Действия, которые move_counts_by_member считает перемещениями участника
+MEMBER_MOVE_TYPES = ("createCard", "updateCard")
+
+
+class Interner:
+    """
+    Общая для всех карточек таблица строк: строка хранится один раз,
+    а таймлайны держат только её номер. None и пустая строка — это -1.
+    """
+
+    def __init__(self):
+        self._index = {}
+        self._values = []
+        self._lock = threading.Lock()
+
+    def intern(self, value) -> int:
+        if not value:
+            return -1
+        index = self._index.get(value)
+        if index is None:
+            with self._lock:
+                index = self._index.get(value)
+                if index is None:
+                    index = len(self._values)
+                    self._values.append(value)
+                    self._index[value] = index
+        return index
+
+    def lookup(self, index: int):
+        return None if index < 0 else self._values[index]
+
+    def __len__(self):
+        return len(self._values)
+
+
+ACTION_TYPES = Interner()
+LIST_NAMES = Interner()
+MEMBER_IDS = Interner()
+
+
+class TimelineRow(NamedTuple):
+    """Строка истории с теми же полями, что и CardHistory."""
+    id: int
+    action_type: str
+    list_name: str
+    member_id: str
+    date: datetime
+
+
+def to_micros(dt: datetime) -> int:
+    delta = dt - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class HistoryRollup:
+    """
+    Свёрнутая часть истории карточки (строки старше срока хранения): суммы по
+    закрытым интервалам и незакрытые интервалы на момент свёртки, которые
+    продолжаются уже по свежим строкам. Время — микросекунды, как в CardTimeline.
+    """
+
+    __slots__ = ("compacted_until", "rows", "first_ts", "last_ts",
+                 "list_micros", "list_moves", "list_visits", "member_micros", "member_lists",
+                 "open_list", "open_list_since", "open_member", "open_member_since")
+
+    def __init__(self, compacted_until: datetime = None):
+        self.compacted_until = compacted_until
+        self.rows = 0
+        self.first_ts = self.last_ts = None
+        self.list_micros = {}    # list_name -> время в колонке
+        self.list_moves = {}     # list_name -> попаданий в колонку (list_counts)
+        self.list_visits = {}    # list_name -> [строк, первая, последняя]
+        self.member_micros = {}  # member_id -> время участника
+        self.member_lists = {}   # (member_id, list_name или None) -> [строк, строк MEMBER_MOVE_TYPES]
+        self.open_list = self.open_member = None
+        self.open_list_since = self.open_member_since = None
+
+
+class CardTimeline:
+    """
+    Компактная история карточки: колонки array вместо ORM-объектов.
+    Время — целые микросекунды от эпохи (UTC), строки — номера в Interner.
+    """
+
+    __slots__ = ("ids", "timestamps", "action_types", "list_names", "member_ids", "rollup")
+
+    def __init__(self, rollup: HistoryRollup = None):
+        self.rollup = rollup
+        self.ids = array("q")
+        self.timestamps = array("q")
+        self.action_types = array("b")
+        self.list_names = array("i")
+        self.member_ids = array("i")
+
+    @classmethod
+    def from_rows(cls, rows, rollup: HistoryRollup = None) -> "CardTimeline":
+        """rows — (id, action_type, list_name, member_id, date), отсортированные по дате."""
+        timeline = cls(rollup)
+        for row_id, action_type, list_name, member_id, date in rows:
+            timeline.ids.append(row_id)
+            timeline.timestamps.append(to_micros(date))
+            timeline.action_types.append(ACTION_TYPES.intern(action_type))
+            timeline.list_names.append(LIST_NAMES.intern(list_name))
+            timeline.member_ids.append(MEMBER_IDS.intern(member_id))
+        return timeline
+
+    def __len__(self):
+        return len(self.ids)
+
+    def is_empty(self) -> bool:
+        return not len(self.ids) and self.rollup is None
+
+    def nbytes(self) -> int:
+        """Размер данных колонок (без накладных расходов самих объектов array)."""
+        return sum(col.itemsize * len(col) for col in
+                   (self.ids, self.timestamps, self.action_types, self.list_names, self.member_ids))
+
+    def rows(self):
+        """Строки истории по порядку, материализуются по одной."""
+        for i in range(len(self.ids)):
+            yield TimelineRow(
+                self.ids[i],
+                ACTION_TYPES.lookup(self.action_types[i]),
+                LIST_NAMES.lookup(self.list_names[i]),
+                MEMBER_IDS.lookup(self.member_ids[i]),
+                from_micros(self.timestamps[i]),
+            )
+
+    def first_date(self) -> datetime:
+        if self.rollup is not None and self.rollup.first_ts is not None:
+            return from_micros(self.rollup.first_ts)
+        return from_micros(self.timestamps[0])
+
+    def last_ts(self):
+        if len(self.timestamps):
+            return self.timestamps[-1]
+        return self.rollup.last_ts if self.rollup is not None else None
+
+    def _fold(self):
+        """
+        Проход по строкам с учётом свёртки: суммы по закрытым интервалам
+        (ключи — номера в Interner) и незакрытые интервалы в конце.
+        """
+        move_types = {ACTION_TYPES.intern(t) for t in MOVE_TYPES}
+        list_micros = {}
+        member_micros = {}
+        list_counts = {}
+
+        current_list = -1
+        current_member = -1
+        list_start = member_start = None
+
+        rollup = self.rollup
+        if rollup is not None:
+            list_micros = {LIST_NAMES.intern(k): v for k, v in rollup.list_micros.items()}
+            member_micros = {MEMBER_IDS.intern(k): v for k, v in rollup.member_micros.items()}
+            list_counts = {LIST_NAMES.intern(k): v for k, v in rollup.list_moves.items()}
+            if rollup.open_list:
+                current_list, list_start = LIST_NAMES.intern(rollup.open_list), rollup.open_list_since
+            if rollup.open_member:
+                current_member, member_start = MEMBER_IDS.intern(rollup.open_member), rollup.open_member_since
+
+        timestamps = self.timestamps
+        for i, action_type in enumerate(self.action_types):
+            if action_type not in move_types:
+                continue
+            ts = timestamps[i]
+            list_name = self.list_names[i]
+            if list_name >= 0:
+                list_counts[list_name] = list_counts.get(list_name, 0) + 1
+                if current_list >= 0:
+                    list_micros[current_list] = list_micros.get(current_list, 0) + (ts - list_start)
+                current_list = list_name
+                list_start = ts
+            member_id = self.member_ids[i]
+            if member_id >= 0 and current_member != member_id:
+                if current_member >= 0:
+                    member_micros[current_member] = member_micros.get(current_member, 0) + (ts - member_start)
+                current_member = member_id
+                member_start = ts
+
+        return list_micros, member_micros, list_counts, current_list, list_start, current_member, member_start
+
+    def list_and_member_times(self):
+        """
+        Время в колонках, время на участниках и число попаданий в колонки.
+        Считается по колонкам напрямую, без создания объектов на каждую строку.
+        Возвращает (time_per_list, time_per_member, list_counts) с именами/ID.
+        """
+        list_micros, member_micros, list_counts, current_list, list_start, current_member, member_start = self._fold()
+
+        last = self.last_ts()
+        if current_list >= 0:
+            list_micros[current_list] = list_micros.get(current_list, 0) + (last - list_start)
+        if current_member >= 0:
+            member_micros[current_member] = member_micros.get(current_member, 0) + (last - member_start)
+
+        time_per_list = {LIST_NAMES.lookup(k): v / 1_000_000 for k, v in list_micros.items()}
+        time_per_member = {MEMBER_IDS.lookup(k): v / 1_000_000 for k, v in member_micros.items()}
+        list_counts = {LIST_NAMES.lookup(k): v for k, v in list_counts.items()}
+        return time_per_list, time_per_member, list_counts
+
+    def compact(self, compacted_until: datetime) -> HistoryRollup:
+        """
+        Сворачивает строки таймлайна вместе с прежней свёрткой в новую HistoryRollup.
+        Незакрытые интервалы переносятся как есть и закроются по следующим строкам.
+        """
+        list_micros, member_micros, list_counts, current_list, list_start, current_member, member_start = self._fold()
+        previous = self.rollup or HistoryRollup()
+
+        rollup = HistoryRollup(max(compacted_until, previous.compacted_until or compacted_until))
+        rollup.rows = previous.rows + len(self)
+        rollup.first_ts = previous.first_ts if previous.first_ts is not None else self.timestamps[0]
+        rollup.last_ts = self.last_ts()
+        rollup.list_micros = {LIST_NAMES.lookup(k): v for k, v in list_micros.items()}
+        rollup.member_micros = {MEMBER_IDS.lookup(k): v for k, v in member_micros.items()}
+        rollup.list_moves = {LIST_NAMES.lookup(k): v for k, v in list_counts.items()}
+        rollup.list_visits = {k: list(v) for k, v in previous.list_visits.items()}
+        rollup.member_lists = {k: list(v) for k, v in previous.member_lists.items()}
+        if current_list >= 0:
+            rollup.open_list, rollup.open_list_since = LIST_NAMES.lookup(current_list), list_start
+        if current_member >= 0:
+            rollup.open_member, rollup.open_member_since = MEMBER_IDS.lookup(current_member), member_start
+
+        member_move_types = {ACTION_TYPES.intern(t) for t in MEMBER_MOVE_TYPES}
+        for i in range(len(self)):
+            list_name = LIST_NAMES.lookup(self.list_names[i])
+            member_id = MEMBER_IDS.lookup(self.member_ids[i])
+            if list_name:
+                ts = self.timestamps[i]
+                visits = rollup.list_visits.setdefault(list_name, [0, ts, ts])
+                visits[0] += 1
+                visits[1] = min(visits[1], ts)
+                visits[2] = max(visits[2], ts)
+            if member_id:
+                # (member_id, None) — участник есть в истории, но без колонки
+                counts = rollup.member_lists.setdefault((member_id, list_name), [0, 0])
+                if list_name:
+                    counts[0] += 1
+                    if self.action_types[i] in member_move_types:
+                        counts[1] += 1
+        return rollup
+
+
+def load_card_rollup(db_card_id: int, db: Session):
+    """Свёртка старой истории карточки из БД или None, если карточку не сворачивали."""
+    row = db.query(CardRollup).filter(CardRollup.card_id == db_card_id).first()
+    if row is None:
+        return None
+
+    def micros(dt):
+        return to_micros(dt) if dt is not None else None
+
+    rollup = HistoryRollup(row.compacted_until)
+    rollup.rows = row.rows or 0
+    rollup.first_ts, rollup.last_ts = micros(row.first_date), micros(row.last_date)
+    rollup.open_list, rollup.open_list_since = row.open_list, micros(row.open_list_since)
+    rollup.open_member, rollup.open_member_since = row.open_member, micros(row.open_member_since)
+
+    for entry in db.query(CardRollupEntry).filter(CardRollupEntry.card_id == db_card_id):
+        elapsed = round((entry.seconds or 0) * 1_000_000)
+        if entry.kind == "list":
+            if elapsed:
+                rollup.list_micros[entry.list_name] = elapsed
+            if entry.moves:
+                rollup.list_moves[entry.list_name] = entry.moves
+            if entry.visits:
+                rollup.list_visits[entry.list_name] = [entry.visits, micros(entry.first_date), micros(entry.last_date)]
+        elif entry.kind == "member":
+            rollup.member_micros[entry.member_id] = elapsed
+        elif entry.kind == "member_list":
+            rollup.member_lists[(entry.member_id, entry.list_name)] = [entry.visits, entry.moves]
+    return rollup
+
+
+# card.id (в БД) -> (max(id), count, CardTimeline)
+timeline_cache = TTLCache("card_timeline", HOT_CARDS_TTL, maxsize=HOT_CARDS_MAX)
+
+
+def load_card_timeline(db_card_id: int, db: Session) -> CardTimeline:
+    """
+    Таймлайн карточки из кэша. Кэш проверяется дешёвым запросом max(id)/count:
+    save_card_history перезаписывает историю новыми строками, а свёртка
+    удаляет старые, так что изменения в другом воркере тоже сбрасывают кэш.
+    """
+    max_id, count = db.query(func.max(CardHistory.id), func.count(CardHistory.id)).filter(
+        CardHistory.card_id == db_card_id
+    ).one()
+    cached = timeline_cache.get(db_card_id)
+    if cached is not None and cached[0] == max_id and cached[1] == count:
+        return cached[2]
+
+    rows = db.query(
+        CardHistory.id, CardHistory.action_type, CardHistory.list_name, CardHistory.member_id, CardHistory.date
+    ).filter(CardHistory.card_id == db_card_id).order_by(CardHistory.date, CardHistory.id).all()
+    timeline = CardTimeline.from_rows(rows, load_card_rollup(db_card_id, db))
+    timeline_cache.set(db_card_id, (max_id, count, timeline))
+    return timeline
+
+
+def invalidate_card_timeline(db_card_id: int):
+    timeline_cache.invalidate(db_card_id)
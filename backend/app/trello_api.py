@@ -1,33 +1,61 @@
-import requests
+import logging
 from dotenv import load_dotenv
 import os
 from datetime import datetime
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from .models import Card, CardHistory, CardStat
-from .database import SessionLocal
+from .models import Card, CardHistory, CardRollup, CardStat
+from .database import SessionLocal, insert_ignore
+from .timeline import CardTimeline, HistoryRollup, invalidate_card_timeline, load_card_timeline
+from .telemetry import TRELLO_REQUEST_SECONDS, COMPUTE_SECONDS, timed
+from .profiling import profiled
+from .trello_clients import TRELLO_CALL_SECONDS, TRELLO_MAX_RETRIES, current_priority, get_client
+from .offload import OFFLOAD_MIN_HISTORY, offload_enabled, run_offloaded
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 TRELLO_API_KEY = os.getenv("TRELLO_API_KEY")
 TRELLO_TOKEN = os.getenv("TRELLO_TOKEN")
 
-print(f"TRELLO_API_KEY: {TRELLO_API_KEY}")  # <-- Временный лог
-print(f"TRELLO_TOKEN: {TRELLO_TOKEN}")      # <-- Временный лог
+# Можно направить на локальную заглушку Trello (loadtest/fake_trello.py)
+BASE_URL = os.getenv("TRELLO_BASE_URL", "https://api.trello.com/1")
 
-BASE_URL = "https://api.trello.com/1"
+def trello_get(endpoint: str, path: str, params: dict, token: str = None):
+    """
+    Выполняет GET к Trello API с замером времени.
+    endpoint — шаблон пути (например, "/cards/{id}/actions") для метрик.
+    token — токен пользователя; без него используется TRELLO_TOKEN. У каждого
+    токена свой пул соединений и своя корзина лимита запросов. Очередь к корзине
+    учитывает класс приоритета (trello_priority): фоновые запросы уступают интерактивным.
+    На 429 корзина токена опустошается на Retry-After, и запрос повторяется
+    (не больше TRELLO_MAX_RETRIES раз).
+    """
+    client = get_client(token or TRELLO_TOKEN)
+    priority = current_priority()
+    params = {**params, "key": TRELLO_API_KEY, "token": client.token}
+    with TRELLO_CALL_SECONDS.time(priority=priority):
+        for attempt in range(TRELLO_MAX_RETRIES + 1):
+            client.wait_for_slot(priority)
+            with TRELLO_REQUEST_SECONDS.time(endpoint=endpoint, status="error") as labels:
+                response = client.session.get(f"{BASE_URL}{path}", params=params)
+                labels["status"] = response.status_code
+            if response.status_code != 429 or attempt == TRELLO_MAX_RETRIES:
+                break
+            delay = client.back_off(response.headers.get("Retry-After"))
+            logger.warning("Trello 429 на %s, повтор через %.1f с", endpoint, delay)
+    return response
 
 def get_card_actions(card_id: str, token: str = None):
     """
     Получает историю действий по карточке.
     """
-    url = f"{BASE_URL}/cards/{card_id}/actions"
     params = {
-        "key": TRELLO_API_KEY,
-        "token": token or TRELLO_TOKEN,
         "limit": 1000,
         "filter": "all"  # Добавлено согласно документации
     }
-    response = requests.get(url, params=params)
+    response = trello_get("/cards/{id}/actions", f"/cards/{card_id}/actions", params, token)
     if response.status_code == 200:
         return response.json()
     else:
@@ -37,63 +65,94 @@ def get_card_info(card_id: str, token: str = None):
     """
     Получает базовую информацию о карточке.
     """
-    url = f"{BASE_URL}/cards/{card_id}"
-    params = {
-        "key": TRELLO_API_KEY,
-        "token": token or TRELLO_TOKEN
-    }
-    response = requests.get(url, params=params)
+    response = trello_get("/cards/{id}", f"/cards/{card_id}", {}, token)
     if response.status_code == 200:
         return response.json()
     else:
         raise Exception(f"Ошибка при получении карточки: {response.status_code}, {response.text}")
 
+def get_list_info(list_id: str, token: str = None):
+    """
+    Получает информацию о колонке (имя и т.д.).
+    """
+    response = trello_get("/lists/{id}", f"/lists/{list_id}", {}, token)
+    if response.status_code == 200:
+        return response.json()
+    else:
+        raise Exception(f"Ошибка при получении колонки: {response.status_code}, {response.text}")
+
 def get_board_lists(board_id: str, token: str = None):
     """
     Получает список колонок доски.
     """
-    url = f"{BASE_URL}/boards/{board_id}/lists"
     params = {
-        "key": TRELLO_API_KEY,
-        "token": token or TRELLO_TOKEN,
         "filter": "open"  # Только открытые колонки
     }
-    response = requests.get(url, params=params)
+    response = trello_get("/boards/{id}/lists", f"/boards/{board_id}/lists", params, token)
     if response.status_code == 200:
         return response.json()
     else:
         raise Exception(f"Ошибка при получении колонок доски: {response.status_code}, {response.text}")
 
-def save_card_history(card_id: str, actions: list, db: Session):
+def get_board_cards(board_id: str, token: str = None):
     """
-    Сохраняет историю действий в базу данных.
+    Получает ID открытых карточек доски.
     """
-    # Проверяем, существует ли карточка в базе
-    db_card = db.query(Card).filter(Card.trello_card_id == card_id).first()
-    if not db_card:
-        db_card = Card(trello_card_id=card_id)
-        db.add(db_card)
-        db.commit()
-        db.refresh(db_card)
+    params = {
+        "fields": "id"
+    }
+    response = trello_get("/boards/{id}/cards", f"/boards/{board_id}/cards", params, token)
+    if response.status_code == 200:
+        return [card["id"] for card in response.json()]
+    else:
+        raise Exception(f"Ошибка при получении карточек доски: {response.status_code}, {response.text}")
 
-    # Удаляем старую историю, чтобы не дублировать
-    db.query(CardHistory).filter(CardHistory.card_id == db_card.id).delete()
+def get_member_board_ids(token: str):
+    """
+    Получает ID досок, в которых состоит владелец токена.
+    """
+    response = trello_get("/members/me", "/members/me", {"fields": "idBoards"}, token)
+    if response.status_code == 200:
+        return set(response.json().get("idBoards", []))
+    else:
+        raise Exception(f"Ошибка при получении досок участника: {response.status_code}, {response.text}")
 
-    # Получаем текущую колонку карточки
-    card_info = get_card_info(card_id)
+@timed(COMPUTE_SECONDS, stage="save_card_history")
+@profiled
+def save_card_history(card_id: str, actions: list, db: Session, token: str = None):
+    """
+    Сохраняет историю действий в базу данных.
+    Возвращает информацию о карточке из Trello (idBoard, idList и т.д.).
+    """
+    # Текущая колонка карточки — до блокировки: запросы к Trello не держат
+    # транзакцию записи открытой (в SQLite она блокирует всю базу)
+    card_info = get_card_info(card_id, token)
     current_list_name = card_info.get("idList")
 
     # Если есть текущая колонка, получаем её имя
     if current_list_name:
-        list_url = f"{BASE_URL}/lists/{current_list_name}"
-        list_params = {
-            "key": TRELLO_API_KEY,
-            "token": TRELLO_TOKEN
-        }
-        list_response = requests.get(list_url, params=list_params)
-        if list_response.status_code == 200:
-            current_list_name = list_response.json().get("name")
+        try:
+            current_list_name = get_list_info(current_list_name, token).get("name")
+        except Exception as e:
+            logger.warning("Error getting current list", extra={"card_id": card_id, "error": str(e)})
+
+    # Создаём карточку, если её ещё нет. INSERT ... ON CONFLICT DO NOTHING —
+    # параллельные запросы из нескольких воркеров не падают на уникальном ключе
+    if not db.query(Card.id).filter(Card.trello_card_id == card_id).first():
+        insert_ignore(db, Card, {"trello_card_id": card_id, "created_at": datetime.utcnow()}, ["trello_card_id"])
+        db.commit()
+
+    # Блокируем строку карточки до конца транзакции (PostgreSQL), чтобы две
+    # загрузки одной карточки не перемешали удаление и вставку истории
+    db_card = db.query(Card).filter(Card.trello_card_id == card_id).with_for_update().first()
+
+    # Удаляем старую историю, чтобы не дублировать
+    db.query(CardHistory).filter(CardHistory.card_id == db_card.id).delete()
 
+    # Действия раньше этой даты уже свёрнуты политикой хранения (retention.py)
+    compacted_until = db.query(CardRollup.compacted_until).filter(CardRollup.card_id == db_card.id).scalar()
+
+    rows = []
     for action in actions:
         action_type = action.get("type")
         data = action.get("data", {})
@@ -103,45 +162,70 @@ def save_card_history(card_id: str, actions: list, db: Session):
         date_str = action.get("date")
 
         member_id = member.get("id")
-        date_obj = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        # Храним наивное время в UTC: колонка DateTime без часового пояса
+        date_obj = datetime.fromisoformat(date_str.replace("Z", "+00:00")).replace(tzinfo=None)
+        if compacted_until and date_obj < compacted_until:
+            continue
 
         # Сохраняем только действия перемещения карточки между колонками
         if action_type == "updateCard" and list_before.get("name") and list_after.get("name"):
             # Это перемещение карточки - сохраняем целевую колонку
-            history_entry = CardHistory(
-                card_id=db_card.id,
-                action_type=action_type,
-                list_name=list_after.get("name"),
-                member_id=member_id,
-                date=date_obj
-            )
-            db.add(history_entry)
+            rows.append({
+                "card_id": db_card.id,
+                "action_type": action_type,
+                "list_name": list_after.get("name"),
+                "member_id": member_id,
+                "date": date_obj
+            })
         elif action_type == "createCard":
             # Для создания карточки используем текущую колонку
             if current_list_name:
-                history_entry = CardHistory(
-                    card_id=db_card.id,
-                    action_type=action_type,
-                    list_name=current_list_name,
-                    member_id=member_id,
-                    date=date_obj
-                )
-                db.add(history_entry)
-
+                rows.append({
+                    "card_id": db_card.id,
+                    "action_type": action_type,
+                    "list_name": current_list_name,
+                    "member_id": member_id,
+                    "date": date_obj
+                })
+
+    # Одна пакетная вставка (executemany) вместо ORM-объекта на каждое действие
+    if rows:
+        db.execute(insert(CardHistory), rows)
+
+    # Доска и текущая колонка для индексированных фильтров /cards (одним UPDATE, без загрузки объекта)
+    if rows:
+        latest = max(enumerate(rows), key=lambda item: (item[1]["date"], item[0]))[1]
+        current = {"current_list": latest["list_name"], "current_list_since": latest["date"]}
+    else:
+        open_list = db.query(CardRollup.open_list, CardRollup.open_list_since).filter(
+            CardRollup.card_id == db_card.id
+        ).first()
+        current = {"current_list": open_list[0] if open_list else None,
+                   "current_list_since": open_list[1] if open_list else None}
+    if card_info.get("idBoard"):
+        current["board_id"] = card_info["idBoard"]
+    db.query(Card).filter(Card.id == db_card.id).update(current, synchronize_session=False)
     db.commit()
+    invalidate_card_timeline(db_card.id)
+    return card_info
 
-def calculate_card_metrics(card_id: str, db: Session):
+@timed(COMPUTE_SECONDS, stage="card_metrics")
+@profiled
+def calculate_card_metrics(card_id: str, db: Session, view: str = "full", token: str = None, actions: list = None):
     """
     Вычисляет метрики по карточке на основе истории.
-    Возвращает словарь с результатами.
+    Возвращает словарь с результатами. view="badge" — только поля для
+    бейджей (schemas.METRIC_VIEWS), без запроса действий и сессий участников.
+    actions — уже полученные действия карточки (кэш прогрева); без них
+    действия запрашиваются из Trello.
     """
     db_card = db.query(Card).filter(Card.trello_card_id == card_id).first()
     if not db_card:
         # Попытка загрузить данные автоматически
         try:
-            from .trello_api import get_card_actions, save_card_history
-            actions = get_card_actions(card_id)
-            save_card_history(card_id, actions, db)
+            if actions is None:
+                actions = get_card_actions(card_id, token)
+            save_card_history(card_id, actions, db, token)
             # Повторный запрос после загрузки
             db_card = db.query(Card).filter(Card.trello_card_id == card_id).first()
             if not db_card:
@@ -149,34 +233,49 @@ def calculate_card_metrics(card_id: str, db: Session):
         except Exception as e:
             raise ValueError(f"Карточка не найдена в базе: {str(e)}")
 
-    history = db.query(CardHistory).filter(CardHistory.card_id == db_card.id).order_by(CardHistory.date).all()
+    # Компактный таймлайн из кэша горячих карточек (или из БД при промахе)
+    timeline = load_card_timeline(db_card.id, db)
 
-    if not history:
+    if timeline.is_empty():
         return {"message": "Нет истории для этой карточки"}
 
-    # Сортируем по времени
-    history.sort(key=lambda x: x.date)
+    if view == "badge":
+        time_per_list, _, list_counts = timeline.list_and_member_times()
+        return {
+            "total_time": sum(time_per_list.values()),
+            "time_per_list": time_per_list,
+            "list_counts": list_counts,
+        }
 
-    # Переменные для подсчета
-    time_per_list = {}
-    time_per_member = {}
-    total_time = 0
+    # Полная история действий для подсчета перемещений по пользователям и времени участников
+    if actions is None:
+        try:
+            actions = get_card_actions(card_id, token)
+            logger.debug("Got actions for card", extra={"card_id": card_id, "actions": len(actions), "sampled": True})
+        except Exception as e:
+            logger.warning("Error getting actions", extra={"card_id": card_id, "error": str(e)})
 
-    # Статистика по колонкам
-    list_counts = {}
+    # Длинные истории считаются в пуле процессов (OFFLOAD_MODE=process):
+    # туда передаются строки таймлайна и свёртка, а не объекты сессии
+    if offload_enabled() and len(timeline) >= OFFLOAD_MIN_HISTORY:
+        return run_offloaded(
+            "card_metrics", compute_card_metrics_from_rows, list(timeline.rows()), timeline.rollup, actions
+        )
+    return compute_card_metrics(timeline, actions)
+
+def compute_card_metrics(timeline: CardTimeline, actions: list = None) -> dict:
+    """
+    Полные метрики по таймлайну карточки, без обращений к БД и Trello.
+    actions — действия карточки из Trello; None, если их не удалось получить:
+    тогда перемещения и участники считаются по истории из базы.
+    """
+    time_per_member = {}
     move_counts_by_member = {}
+    member_time_stats = {}
 
-    # Получаем полную историю действий для подсчета перемещений по пользователям и времени участников
-    actions = []
-    try:
-        actions = get_card_actions(card_id)
-        print(f"Got {len(actions)} actions for card {card_id}")
-    except Exception as e:
-        print(f"Error getting actions: {e}")
+    if actions is None:
         actions = []
-        member_time_stats = {}
-        move_counts_by_member = {}
-        time_per_member = {}
+        history = list(timeline.rows())
         # Создаем словарь для подсчета перемещений каждым пользователем
         member_move_counts = {}
         members_dict = {}
@@ -216,7 +315,7 @@ def calculate_card_metrics(card_id: str, db: Session):
                         member_move_counts[member_name][h.list_name] = member_move_counts[member_name].get(h.list_name, 0) + 1
 
         # Всегда добавляем данные из истории базы данных как резерв
-        print(f"Processing {len(history)} history records for move counts")
+        logger.debug("Processing history records for move counts", extra={"records": len(history), "sampled": True})
         for h in history:
             if h.member_id and h.action_type in ["createCard", "updateCard"]:
                 member_name = f"User_{h.member_id[:8]}"
@@ -224,7 +323,15 @@ def calculate_card_metrics(card_id: str, db: Session):
                     member_move_counts[member_name] = {}
                 if h.list_name:
                     member_move_counts[member_name][h.list_name] = member_move_counts[member_name].get(h.list_name, 0) + 1
-                    print(f"Added move count for {member_name} in {h.list_name}: {member_move_counts[member_name][h.list_name]}")
+
+        # Строки, свёрнутые политикой хранения, учитываются по агрегатам свёртки
+        if timeline.rollup is not None:
+            for (member_id, list_name), (visits, moves) in timeline.rollup.member_lists.items():
+                member_name = f"User_{member_id[:8]}"
+                if member_name not in member_move_counts:
+                    member_move_counts[member_name] = {}
+                if list_name:
+                    member_move_counts[member_name][list_name] = member_move_counts[member_name].get(list_name, 0) + visits + moves
 
         # Создаем member_time_stats из истории базы данных
         member_time_stats = {}
@@ -298,60 +405,10 @@ def calculate_card_metrics(card_id: str, db: Session):
 
         time_per_member = {name: stats["total_time"] for name, stats in member_time_stats.items()}
 
-    except Exception as e:
-        print(f"Error getting actions for move counts and member time: {e}")
-        import traceback
-        traceback.print_exc()
-        move_counts_by_member = {}
-        time_per_member = {}
-        member_time_stats = {}
-
-    # Временные переменные
-    current_list = None
-    current_member = None
-    list_start_time = None
-    member_start_time = None
-
-    for i, action in enumerate(history):
-        # Обновляем статистику перемещений
-        if action.action_type in ["createCard", "moveCardToList", "updateCard"] and action.list_name:
-            list_name = action.list_name
-            if list_name:
-                list_counts[list_name] = list_counts.get(list_name, 0) + 1
-
-        # Подсчет времени в колонке
-        if action.action_type in ["createCard", "moveCardToList", "updateCard"] and action.list_name:
-            if current_list and list_start_time:
-                elapsed = (action.date - list_start_time).total_seconds()
-                time_per_list[current_list] = time_per_list.get(current_list, 0) + elapsed
-            current_list = action.list_name
-            list_start_time = action.date
-
-        # Подсчет времени на участнике - теперь учитываем всех пользователей, которые работали с карточкой
-        # Используем member_id из действия перемещения карточки
-        if action.action_type in ["createCard", "moveCardToList", "updateCard"] and action.member_id:
-            member_id = action.member_id
-            if member_id:
-                # Если это новый участник или другой участник
-                if current_member != member_id:
-                    # Сохраняем время предыдущего участника
-                    if current_member and member_start_time:
-                        elapsed = (action.date - member_start_time).total_seconds()
-                        time_per_member[current_member] = time_per_member.get(current_member, 0) + elapsed
-
-                    # Начинаем отсчет для нового участника
-                    current_member = member_id
-                    member_start_time = action.date
-
-    # Завершаем подсчет для последнего списка
-    if current_list and list_start_time:
-        elapsed = (history[-1].date - list_start_time).total_seconds()
-        time_per_list[current_list] = time_per_list.get(current_list, 0) + elapsed
-
-    # Завершаем подсчет для последнего участника
-    if current_member and member_start_time:
-        elapsed = (history[-1].date - member_start_time).total_seconds()
-        time_per_member[current_member] = time_per_member.get(current_member, 0) + elapsed
+    # Время в колонках и на участниках считается прямо по колонкам таймлайна
+    time_per_list, member_times, list_counts = timeline.list_and_member_times()
+    for member_id, seconds in member_times.items():
+        time_per_member[member_id] = time_per_member.get(member_id, 0) + seconds
 
     total_time = sum(time_per_list.values())
 
@@ -362,5 +419,9 @@ def calculate_card_metrics(card_id: str, db: Session):
         "time_per_member": time_per_member,
         "list_counts": list_counts,
         "move_counts_by_member": move_counts_by_member,
-        "member_time_stats": member_time_stats if 'member_time_stats' in locals() else {}
-    }
\ No newline at end of file
+        "member_time_stats": member_time_stats
+    }
+
+def compute_card_metrics_from_rows(rows: list, rollup: HistoryRollup, actions: list = None) -> dict:
+    """compute_card_metrics для пула процессов: таймлайн собирается из переданных строк."""
+    return compute_card_metrics(CardTimeline.from_rows(rows, rollup), actions)
@@ -0,0 +1,235 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import requests
+from fastapi import Header, HTTPException
+from requests.adapters import HTTPAdapter
+from .telemetry import Histogram, register
+
+# Соединений к Trello на один токен
+TRELLO_POOL_SIZE = int(os.getenv("TRELLO_POOL_SIZE", "10"))
+# Лимит Trello — 100 запросов за 10 секунд на токен: скорость и запас корзины.
+# За любые 10 секунд корзина пропускает burst + rate * 10 запросов — не больше 100
+TRELLO_WINDOW_LIMIT = 100
+TRELLO_WINDOW_SECONDS = 10
+TRELLO_RATE_LIMIT = float(os.getenv("TRELLO_RATE_LIMIT", "5"))
+TRELLO_RATE_BURST = float(os.getenv("TRELLO_RATE_BURST", "50"))
+# Повторов запроса после 429 и пауза, если Trello не прислал Retry-After
+TRELLO_MAX_RETRIES = int(os.getenv("TRELLO_MAX_RETRIES", "3"))
+TRELLO_RETRY_AFTER_DEFAULT = float(os.getenv("TRELLO_RETRY_AFTER_DEFAULT", "10"))
+# Сколько клиентов (токенов) держать открытыми; давно не используемые закрываются
+TRELLO_MAX_CLIENTS = int(os.getenv("TRELLO_MAX_CLIENTS", "1000"))
+# Часть запаса корзины, которую фоновые запросы не расходуют (остаётся бейджам и панели)
+TRELLO_INTERACTIVE_RESERVE = float(os.getenv("TRELLO_INTERACTIVE_RESERVE", "20"))
+# Фоновый запрос, ждущий дольше этого (секунды), идёт наравне с интерактивными
+TRELLO_STARVATION_SECONDS = float(os.getenv("TRELLO_STARVATION_SECONDS", "5"))
+
+# Классы приоритета запросов к Trello, от высшего к низшему
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+TRELLO_RATE_WAIT_SECONDS = register(Histogram(
+    "trello_rate_wait_seconds", "Ожидание свободного запроса в корзине токена перед вызовом Trello",
+    ("priority",),
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0),
+))
+TRELLO_CALL_SECONDS = register(Histogram(
+    "trello_call_duration_seconds", "Полное время вызова Trello (ожидание лимита и запрос) по классу приоритета",
+    ("priority",),
+))
+
+_priority = ContextVar("trello_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def trello_priority(priority: str):
+    """Класс приоритета для запросов к Trello внутри блока (по умолчанию interactive)."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown Trello priority: {priority}")
+    reset = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(reset)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def token_namespace(token: Optional[str]) -> str:
+    """Пространство имён кэшей для токена: хэш, сам токен в ключах и логах не хранится."""
+    if not token:
+        return "default"
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class _Waiter:
+    __slots__ = ("priority", "since")
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.since = time.monotonic()
+
+
+class PriorityTokenBucket:
+    """
+    Корзина токенов (rate запросов в секунду, до burst подряд) с очередью по
+    классам: свободный запрос получает старейший interactive, а background —
+    только если интерактивных нет и в корзине остаётся больше reserve.
+    Фоновый запрос, прождавший starvation секунд, конкурирует с интерактивными
+    по времени ожидания, поэтому большой backfill не ждёт бесконечно.
+    """
+
+    def __init__(self, rate: float, burst: float, reserve: float = 0.0, starvation: float = 5.0):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, max(burst - 1, 0))
+        self.starvation = starvation
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _starving(self, waiter: _Waiter, now: float) -> bool:
+        return waiter.priority != INTERACTIVE and now - waiter.since >= self.starvation
+
+    def _next(self, now: float):
+        """Чья очередь и сколько токенов ему нужно в корзине."""
+        interactive = self._queues[INTERACTIVE]
+        background = self._queues[BACKGROUND]
+        if background and self._starving(background[0], now):
+            if not interactive or background[0].since < interactive[0].since:
+                return background[0], 1
+        if interactive:
+            return interactive[0], 1
+        if background:
+            return background[0], 1 + self.reserve
+        return None, 1
+
+    def acquire(self, priority: str = INTERACTIVE) -> float:
+        """Занимает один запрос, при необходимости ждёт своей очереди. Возвращает время ожидания."""
+        waiter = _Waiter(priority)
+        with self._cond:
+            self._queues[priority].append(waiter)
+            self._cond.notify_all()
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                head, needed = self._next(now)
+                if head is waiter and self.tokens >= needed:
+                    self._queues[priority].popleft()
+                    self.tokens -= 1
+                    self._cond.notify_all()
+                    return now - waiter.since
+                # Просыпаемся, когда накопятся токены для первого в очереди
+                # (или раньше — по notify от нового или обслуженного запроса)
+                timeout = max((needed - self.tokens) / self.rate, 0.001)
+                if head is not None and head.priority != INTERACTIVE and not self._starving(head, now):
+                    timeout = min(timeout, max(head.since + self.starvation - now, 0.001))
+                self._cond.wait(timeout)
+
+    def drain(self, seconds: float):
+        """
+        Trello ответил 429: корзина опустошается так, что следующий запрос
+        пройдёт не раньше чем через seconds (Retry-After), дальше — обычная скорость.
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+            self._cond.notify_all()
+
+
+def window_budget(rate: float, burst: float) -> float:
+    """Сколько запросов корзина пропускает за окно лимита Trello."""
+    return burst + rate * TRELLO_WINDOW_SECONDS
+
+
+def retry_after_seconds(value: Optional[str]) -> float:
+    """Пауза из заголовка Retry-After (секунды или HTTP-дата)."""
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    return TRELLO_RETRY_AFTER_DEFAULT
+
+
+class TrelloClient:
+    """Клиент одного токена: свой пул соединений и своя корзина лимита."""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.namespace = token_namespace(token)
+        self.set_rate(TRELLO_RATE_LIMIT, TRELLO_RATE_BURST, TRELLO_INTERACTIVE_RESERVE)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TRELLO_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def set_rate(self, rate: float, burst: float, reserve: float = 0.0):
+        """
+        Корзина действует только в этом процессе: каждый воркер uvicorn и каждый
+        запуск backfill расходуют лимит токена в Trello независимо.
+        """
+        self.bucket = PriorityTokenBucket(rate, burst, reserve, TRELLO_STARVATION_SECONDS)
+
+    def wait_for_slot(self, priority: str = INTERACTIVE):
+        TRELLO_RATE_WAIT_SECONDS.observe(self.bucket.acquire(priority), priority=priority)
+
+    def back_off(self, retry_after: Optional[str]) -> float:
+        """Ответ 429: все запросы этого токена ждут Retry-After."""
+        seconds = retry_after_seconds(retry_after)
+        self.bucket.drain(seconds)
+        return seconds
+
+    def close(self):
+        self.session.close()
+
+
+_clients = OrderedDict()  # token -> TrelloClient
+_clients_lock = threading.Lock()
+
+
+def get_client(token: str) -> TrelloClient:
+    """Клиент для токена (создаётся при первом обращении, LRU на TRELLO_MAX_CLIENTS)."""
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is not None:
+            _clients.move_to_end(token)
+            return client
+        client = _clients[token] = TrelloClient(token)
+        evicted = []
+        while len(_clients) > TRELLO_MAX_CLIENTS:
+            evicted.append(_clients.popitem(last=False)[1])
+    for old in evicted:
+        old.close()
+    return client
+
+
+def request_token(x_trello_token: Optional[str] = Header(None)) -> Optional[str]:
+    """
+    Токен пользователя из Power-Up (заголовок X-Trello-Token). Без него
+    запросы идут с общим TRELLO_TOKEN из .env.
+    """
+    if not x_trello_token:
+        return None
+    token = x_trello_token.strip()
+    if len(token) > 256 or not token.isalnum():
+        raise HTTPException(status_code=400, detail="Invalid Trello token")
+    return token
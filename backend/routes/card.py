@@ -1,37 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from datetime import datetime
-import requests
+from datetime import datetime, timedelta
+from typing import Dict, List
+import asyncio
+import base64
+import logging
+import os
 from ..app.database import get_db
 from ..app.trello_api import get_card_actions
-from ..app.models import Card, CardHistory
+from ..app.models import Card
+from ..app.timeline import from_micros, load_card_timeline
+from ..app.events import board_event_stream, check_board_ticket, hub, issue_board_ticket, publish_card_badges
+from ..app.board_settings import build_card_badges, get_board_settings, get_cached_board_lists, require_board_member
+from ..app.telemetry import COMPUTE_SECONDS, timed
+from ..app.profiling import profiled
+from ..app.responses import FastJSONResponse
+from ..app.schemas import METRIC_VIEWS, Badge, CardMetricsResponse, PrewarmRequest
+from ..app.search import filter_card_id_prefix, filter_card_id_search
+from ..app.trello_clients import request_token
+from ..app.offload import OffloadSaturated, service_busy
+from ..app.prewarm import (
+    PREWARM_MAX_CARDS, board_cards_by_activity, order_by_activity, mark_refreshed, recent_card_actions, schedule_prewarm,
+)
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+# Размер страницы /cards по умолчанию и максимальный
+CARDS_PAGE_SIZE = int(os.getenv("CARDS_PAGE_SIZE", "100"))
+CARDS_MAX_PAGE_SIZE = int(os.getenv("CARDS_MAX_PAGE_SIZE", "1000"))
+
 @router.get("/card/{card_id}/fetch-history")
-def fetch_and_save_card_history(card_id: str, db: Session = Depends(get_db)):
+def fetch_and_save_card_history(card_id: str, db: Session = Depends(get_db), token: str = Depends(request_token)):
     try:
-        print(f"Fetching history for card: {card_id}")
+        # Прогрев доски только что обновил историю — Trello повторно не запрашиваем
+        fresh = recent_card_actions(card_id, token)
+        if fresh is not None:
+            return {"message": f"История для карточки {card_id} сохранена", "count": len(fresh)}
         from ..app import trello_api
-        actions = trello_api.get_card_actions(card_id)
-        print(f"Got {len(actions)} actions from Trello API")
-        trello_api.save_card_history(card_id, actions, db)
-        print(f"Saved history to database")
+        actions = trello_api.get_card_actions(card_id, token)
+        card_info = trello_api.save_card_history(card_id, actions, db, token)
+        # metrics и detailed-history той же панели возьмут эти действия из кэша
+        mark_refreshed(card_id, actions, token)
+        logger.info("Saved card history", extra={"card_id": card_id, "actions": len(actions), "sampled": True})
+        # Зрители доски получают новые бейджи без повторного опроса
+        publish_card_badges(card_id, card_info.get("idBoard"), card_info.get("idList"), db, token)
         return {"message": f"История для карточки {card_id} сохранена", "count": len(actions)}
     except Exception as e:
-        print(f"Error in fetch-history: {str(e)}")
+        logger.error("Error in fetch-history", extra={"card_id": card_id, "error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/card/{card_id}/metrics")
-def get_card_metrics(card_id: str, db: Session = Depends(get_db)):
+def select_metric_fields(view: str, fields: str):
+    """
+    Представление для расчёта и поля ответа. Если все запрошенные поля есть
+    в badge, считается облегчённое представление.
+    """
+    if not fields:
+        return view, METRIC_VIEWS[view]
+    requested = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = set(requested) - set(METRIC_VIEWS["full"])
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metric fields: {', '.join(sorted(unknown))}")
+    if set(requested) <= set(METRIC_VIEWS["badge"]):
+        view = "badge"
+    elif view == "badge":
+        raise HTTPException(status_code=400, detail="Requested fields are not available in badge view")
+    return view, requested
+
+@router.get("/card/{card_id}/metrics", response_model=CardMetricsResponse, response_class=FastJSONResponse)
+def get_card_metrics(
+    card_id: str,
+    view: str = Query("full", pattern="^(badge|full)$", description="badge — только поля для бейджей"),
+    fields: str = Query(None, description="Поля ответа через запятую"),
+    db: Session = Depends(get_db),
+    token: str = Depends(request_token)
+):
+    view, selected = select_metric_fields(view, fields)
     try:
-        print(f"Calculating metrics for card: {card_id}")
         from ..app import trello_api
-        metrics = trello_api.calculate_card_metrics(card_id, db)
-        print(f"Metrics calculated: {metrics}")
-        return metrics
+        actions = recent_card_actions(card_id, token) if view == "full" else None
+        metrics = trello_api.calculate_card_metrics(card_id, db, view=view, token=token, actions=actions)
+        logger.debug("Metrics calculated", extra={"card_id": card_id, "total_time": metrics.get("total_time"), "sampled": True})
+        if "message" not in metrics:
+            metrics = {name: metrics[name] for name in selected}
+        return FastJSONResponse(metrics)
+    except OffloadSaturated as e:
+        raise service_busy(e)
     except Exception as e:
-        print(f"Error in metrics: {str(e)}")
+        logger.error("Error in metrics", extra={"card_id": card_id, "error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
     
 # Новый эндпоинт для получения истории (уникальные колонки)
@@ -41,10 +100,19 @@ def get_card_history(card_id: str, db: Session = Depends(get_db)):
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found in database")
 
-    history = db.query(CardHistory).filter(CardHistory.card_id == db_card.id).order_by(CardHistory.date).all()
+    timeline = load_card_timeline(db_card.id, db)
+    history = list(timeline.rows())
 
     # Группируем по названию колонки и считаем количество посещений
     list_visits = {}
+    # Свёрнутая старая история уже сгруппирована по колонкам
+    if timeline.rollup is not None:
+        for list_name, (count, first_ts, last_ts) in timeline.rollup.list_visits.items():
+            list_visits[list_name] = {
+                "count": count,
+                "first_visit": from_micros(first_ts),
+                "last_visit": from_micros(last_ts)
+            }
     for h in history:
         if h.list_name:
             if h.list_name not in list_visits:
@@ -82,18 +150,24 @@ def get_card_history(card_id: str, db: Session = Depends(get_db)):
 
 # Новый эндпоинт для получения детальной истории
 @router.get("/card/{card_id}/detailed-history")
-def get_card_detailed_history(card_id: str, db: Session = Depends(get_db)):
+@timed(COMPUTE_SECONDS, stage="detailed_history")
+@profiled
+def get_card_detailed_history(card_id: str, db: Session = Depends(get_db), token: str = Depends(request_token)):
     db_card = db.query(Card).filter(Card.trello_card_id == card_id).first()
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found in database")
 
-    history = db.query(CardHistory).filter(CardHistory.card_id == db_card.id).order_by(CardHistory.date).all()
+    timeline = load_card_timeline(db_card.id, db)
+    history = list(timeline.rows())
 
     # Получаем полную историю действий из Trello API для получения детальной информации
-    try:
-        actions = get_card_actions(card_id)
-    except Exception as e:
-        actions = []
+    # (после прогрева или fetch-history — из кэша свежих действий)
+    actions = recent_card_actions(card_id, token)
+    if actions is None:
+        try:
+            actions = get_card_actions(card_id, token)
+        except Exception as e:
+            actions = []
 
     # Создаем словарь для быстрого поиска членов по ID
     members_dict = {}
@@ -109,8 +183,28 @@ def get_card_detailed_history(card_id: str, db: Session = Depends(get_db)):
     # Преобразуем историю в детальный формат
     detailed_history = []
 
+    # Свёрнутая старая история: по одной записи на колонку, создание карточки в ней
+    rollup = timeline.rollup
+    if rollup is not None:
+        for list_name, (count, first_ts, last_ts) in sorted(rollup.list_visits.items(), key=lambda x: x[1][1]):
+            detailed_history.append({
+                "id": f"rollup_{db_card.id}_{list_name}",
+                "type": "historyRollup",
+                "date": from_micros(first_ts).isoformat(),
+                "data": {
+                    "listName": list_name,
+                    "visitCount": count,
+                    "lastVisit": from_micros(last_ts).isoformat(),
+                    "timeInList": rollup.list_micros.get(list_name, 0) / 1_000_000
+                },
+                "memberCreator": {
+                    "id": None,
+                    "name": "N/A"
+                }
+            })
+
     # Сначала обработаем создание карточки
-    if history:
+    if history and rollup is None:
         first_history = history[0]
         # Найдем действие создания карточки
         create_action = None
@@ -182,11 +276,30 @@ def get_card_detailed_history(card_id: str, db: Session = Depends(get_db)):
 
     return detailed_history
 
-# Новый эндпоинт для фильтрации
-@router.get("/cards")
+def encode_cursor(card: Card) -> str:
+    raw = f"{card.created_at.isoformat()}|{card.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, card_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(card_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Новый эндпоинт для фильтрации (keyset-пагинация по (created_at, id), следующая страница — в X-Next-Cursor)
+@router.get("/cards", response_class=FastJSONResponse)
 def get_filtered_cards(
+    request: Request,
     created_after: str = Query(None, description="Фильтр по дате создания (формат: YYYY-MM-DD)"),
-    trello_card_id: str = Query(None, description="Фильтр по ID карточки (или её части)"),
+    trello_card_id: str = Query(None, description="Фильтр по началу ID карточки"),
+    search: str = Query(None, description="Поиск по части ID карточки (FTS5 trigram / pg_trgm)"),
+    board_id: str = Query(None, description="Карточки доски"),
+    in_list: str = Query(None, description="Карточки, которые сейчас в этой колонке"),
+    stuck_days: float = Query(None, ge=0, le=36500, description="В текущей колонке не меньше N дней"),
+    limit: int = Query(CARDS_PAGE_SIZE, ge=1, le=CARDS_MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="X-Next-Cursor предыдущей страницы"),
     db: Session = Depends(get_db)
 ):
     query = db.query(Card)
@@ -199,31 +312,121 @@ def get_filtered_cards(
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
     if trello_card_id:
-        query = query.filter(Card.trello_card_id.contains(trello_card_id))
+        query = filter_card_id_prefix(query, trello_card_id)
+    if search:
+        query = filter_card_id_search(query, db, search)
+    if board_id:
+        query = query.filter(Card.board_id == board_id)
+    if in_list:
+        query = query.filter(Card.current_list == in_list)
+    if stuck_days is not None:
+        query = query.filter(Card.current_list_since <= datetime.utcnow() - timedelta(days=stuck_days))
 
-    cards = query.all()
-    return [{"id": c.id, "trello_card_id": c.trello_card_id, "created_at": c.created_at} for c in cards]
+    if cursor:
+        query = query.filter(tuple_(Card.created_at, Card.id) > decode_cursor(cursor))
+    cards = query.order_by(Card.created_at, Card.id).limit(limit + 1).all()
+
+    headers = {}
+    if len(cards) > limit:
+        cards = cards[:limit]
+        next_cursor = encode_cursor(cards[-1])
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return FastJSONResponse([
+        {
+            "id": c.id,
+            "trello_card_id": c.trello_card_id,
+            "created_at": c.created_at,
+            "board_id": c.board_id,
+            "current_list": c.current_list,
+            "current_list_since": c.current_list_since,
+        }
+        for c in cards
+    ], headers=headers)
 
 # Эндпоинт для получения списков доски
 @router.get("/board/{board_id}/lists")
-def get_board_lists(board_id: str):
+def get_board_lists(board_id: str, token: str = Depends(request_token)):
     """
-    Получает список активных колонок доски из Trello API.
+    Получает список активных колонок доски из Trello API (с кэшированием).
     """
     try:
-        from ..app.trello_api import BASE_URL, TRELLO_API_KEY, TRELLO_TOKEN
-        url = f"{BASE_URL}/boards/{board_id}/lists"
-        params = {
-            "key": TRELLO_API_KEY,
-            "token": TRELLO_TOKEN,
-            "filter": "open"  # Только открытые (активные) списки
-        }
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            lists = response.json()
-            # Возвращаем только id и name
-            return [{"id": lst["id"], "name": lst["name"]} for lst in lists]
-        else:
-            raise HTTPException(status_code=response.status_code, detail=f"Error fetching lists: {response.text}")
+        return get_cached_board_lists(board_id, token)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Бейджи сразу для нескольких карточек доски: настройки и колонки читаются один раз
+@router.get("/board/{board_id}/badges", response_model=Dict[str, List[Badge]], response_class=FastJSONResponse)
+async def get_board_badges(
+    board_id: str,
+    cards: str = Query(..., description="Карточки через запятую в формате cardId:listId"),
+    db: Session = Depends(get_db),
+    token: str = Depends(request_token)
+):
+    items = [item.partition(":")[::2] for item in cards.split(",")]
+    items = [(card_id, id_list) for card_id, id_list in items if card_id]
+    result, missing = await asyncio.to_thread(board_badges, board_id, items, db, token)
+    # Карточки без истории в базе не загружаются из Trello внутри запроса: они получают
+    # пустые бейджи и встают в очередь прогрева, а готовые бейджи придут по SSE
+    if missing:
+        schedule_prewarm(missing, token)
+    return FastJSONResponse(result)
+
+def board_badges(board_id: str, items: list, db: Session, token: str = None):
+    """Бейджи карточек с историей в базе и список карточек, которых в базе ещё нет."""
+    board_settings = get_board_settings(board_id, db)["settings"]
+    needs_lists = board_settings["show_current_list_time"] or board_settings["show_specific_lists_time"]
+    list_names = {}
+    if needs_lists:
+        try:
+            list_names = {lst["id"]: lst["name"] for lst in get_cached_board_lists(board_id, token)}
+        except Exception as e:
+            logger.warning("Error loading board lists for badges", extra={"board_id": board_id, "error": str(e)})
+
+    from ..app import trello_api
+    card_ids = [card_id for card_id, _ in items]
+    known = {card_id for (card_id,) in db.query(Card.trello_card_id).filter(Card.trello_card_id.in_(card_ids))}
+    result = {}
+    missing = []
+    for card_id, id_list in items:
+        if card_id not in known:
+            result[card_id] = []
+            missing.append(card_id)
+            continue
+        try:
+            metrics = trello_api.calculate_card_metrics(card_id, db, view="badge", token=token)
+        except Exception as e:
+            logger.warning("Error calculating badge metrics", extra={"card_id": card_id, "error": str(e)})
+            metrics = {}
+        result[card_id] = build_card_badges(board_settings, metrics, list_names, id_list)
+    return result, missing
+
+# Прогрев при открытии доски: недавно активные карточки обновляются в фоне до открытия панели
+@router.post("/board/{board_id}/prewarm", status_code=202)
+async def prewarm_board(board_id: str, body: PrewarmRequest = None, token: str = Depends(request_token)):
+    cards = [(card.id, card.dateLastActivity) for card in body.cards] if body else []
+    if cards:
+        card_ids = order_by_activity(cards, PREWARM_MAX_CARDS)
+    else:
+        card_ids = await asyncio.to_thread(board_cards_by_activity, board_id, PREWARM_MAX_CARDS)
+    return schedule_prewarm(card_ids, token)
+
+# Поток обновлений бейджей доски (Server-Sent Events): одна подписка на доску вместо опроса каждой карточки
+# Билет на поток доски: только участнику (X-Trello-Token), EventSource передаёт его в ?ticket=
+@router.post("/board/{board_id}/events/ticket")
+def board_events_ticket(board_id: str, token: str = Depends(request_token)):
+    require_board_member(board_id, token)
+    return {"ticket": issue_board_ticket(board_id)}
+
+@router.get("/board/{board_id}/events")
+async def board_events(board_id: str, request: Request, ticket: str = Query(None)):
+    if not check_board_ticket(board_id, ticket):
+        raise HTTPException(status_code=403, detail="Invalid or expired board events ticket")
+    subscription = hub.subscribe(board_id)
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many live subscribers")
+    return StreamingResponse(
+        board_event_stream(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -6,10 +6,14 @@ import json
 from xml.etree.ElementTree import Element, SubElement, tostring
 from ..app.database import get_db
 from ..app import trello_api
+from ..app.profiling import profiled
+from ..app.trello_clients import BACKGROUND, request_token, trello_priority
+from ..app.offload import OffloadSaturated, run_offloaded, service_busy
 from sqlalchemy.orm import Session
 
 router = APIRouter()
 
+@profiled
 def dict_to_csv(data: dict):
     """Преобразует словарь в CSV строку."""
     output = StringIO()
@@ -22,6 +26,7 @@ def dict_to_csv(data: dict):
     output.seek(0)
     return output.getvalue()
 
+@profiled
 def dict_to_xml(data: dict):
     """Преобразует словарь в XML строку."""
     root = Element("metrics")
@@ -33,6 +38,7 @@ def dict_to_xml(data: dict):
             child.text = str(value)
     return tostring(root, encoding="unicode")
 
+@profiled
 def dict_to_excel_bytes(data: dict):
     """Преобразует словарь в Excel файл (BytesIO)."""
     import pandas as pd
@@ -43,27 +49,50 @@ def dict_to_excel_bytes(data: dict):
     output.seek(0)
     return output
 
+def render_export(data: dict, format: str):
+    """
+    Содержимое файла экспорта: str для csv/xml, bytes для xlsx. Вызывается
+    через run_offloaded, поэтому принимает и возвращает сериализуемые значения.
+    """
+    if format == "csv":
+        return dict_to_csv(data)
+    elif format == "xml":
+        return dict_to_xml(data)
+    elif format == "xlsx":
+        return dict_to_excel_bytes(data).getvalue()
+    raise ValueError(f"Format not supported: {format}")
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xml": "application/xml",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
 @router.get("/export/{card_id}")
 def export_card_data(
     card_id: str,
     format: str = Query("json", regex="^(json|csv|xml|xlsx)$"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    token: str = Depends(request_token)
 ):
     try:
-        metrics = trello_api.calculate_card_metrics(card_id, db)
+        # Экспорт не ждёт пользователь на карточке: запросы к Trello — фоновым классом
+        with trello_priority(BACKGROUND):
+            metrics = trello_api.calculate_card_metrics(card_id, db, token=token)
+    except OffloadSaturated as e:
+        raise service_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     if format == "json":
         return metrics
-    elif format == "csv":
-        content = dict_to_csv(metrics)
-        return StreamingResponse(StringIO(content), media_type="text/csv", headers={"Content-Disposition": f"attachment; filename=card_{card_id}_metrics.csv"})
-    elif format == "xml":
-        content = dict_to_xml(metrics)
-        return StreamingResponse(StringIO(content), media_type="application/xml", headers={"Content-Disposition": f"attachment; filename=card_{card_id}_metrics.xml"})
-    elif format == "xlsx":
-        content = dict_to_excel_bytes(metrics)
-        return StreamingResponse(content, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": f"attachment; filename=card_{card_id}_metrics.xlsx"})
-    else:
-        raise HTTPException(status_code=400, detail="Format not supported")
\ No newline at end of file
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format not supported")
+
+    # Рендер файла (pandas/openpyxl для xlsx) — в пуле процессов при OFFLOAD_MODE=process
+    try:
+        content = run_offloaded(f"export_{format}", render_export, metrics, format)
+    except OffloadSaturated as e:
+        raise service_busy(e)
+    stream = BytesIO(content) if isinstance(content, bytes) else StringIO(content)
+    return StreamingResponse(stream, media_type=EXPORT_MEDIA_TYPES[format], headers={"Content-Disposition": f"attachment; filename=card_{card_id}_metrics.{format}"})
\ No newline at end of file
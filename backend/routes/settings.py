@@ -1,24 +1,60 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.exceptions import RequestValidationError
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from typing import Optional
+import json
 from ..app.database import get_db
 from ..app.models import User
+from ..app.events import hub
+from ..app.schemas import BoardSettingsData
 from ..app.trello_api import get_board_lists
+from ..app.trello_clients import request_token
+from ..app.board_settings import (
+    SettingsVersionConflict, get_board_settings, require_board_member, save_board_settings,
+)
 
 router = APIRouter()
 
 class SettingsUpdate(BaseModel):
-    username: str
+    username: Optional[str] = None
     settings: dict
+    board_id: Optional[str] = None  # Если указан — это настройки бейджей доски
+    version: Optional[int] = None   # Версия, которую видел клиент (защита от перезаписи)
 
 @router.post("/settings")
-def update_user_settings(settings_data: SettingsUpdate, db: Session = Depends(get_db)):
+def update_user_settings(
+    settings_data: SettingsUpdate, db: Session = Depends(get_db), token: str = Depends(request_token)
+):
+    if settings_data.board_id:
+        # Настройки доски общие для всех её участников — менять их может только участник
+        require_board_member(settings_data.board_id, token)
+        # Настройки доски проверяются схемой: неверные типы — 422, а не 500 при сохранении
+        try:
+            board_settings = BoardSettingsData.model_validate(settings_data.settings)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", "settings", *error["loc"])} for error in e.errors(include_url=False)]
+            )
+        try:
+            saved = save_board_settings(
+                settings_data.board_id, board_settings.model_dump(exclude_unset=True), db, settings_data.version
+            )
+        except SettingsVersionConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        # Зрители доски перезапрашивают бейджи по новым настройкам
+        hub.publish_settings(settings_data.board_id, saved["version"])
+        return {"message": "Board settings updated", "version": saved["version"]}
+
+    if not settings_data.username:
+        raise HTTPException(status_code=400, detail="username or board_id is required")
+
     user = db.query(User).filter(User.username == settings_data.username).first()
     if not user:
         user = User(username=settings_data.username)
         db.add(user)
 
-    user.settings = str(settings_data.settings)  # Сохраняем как строку (можно JSON)
+    user.settings = json.dumps(settings_data.settings)
     db.commit()
     return {"message": "Settings updated"}
 
@@ -29,10 +65,14 @@ def get_user_settings(username: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     return {"settings": user.settings}
 
+@router.get("/board/{board_id}/settings")
+def get_board_settings_endpoint(board_id: str, db: Session = Depends(get_db)):
+    return get_board_settings(board_id, db)
+
 @router.get("/board/{board_id}/lists")
-def get_board_lists_endpoint(board_id: str):
+def get_board_lists_endpoint(board_id: str, token: str = Depends(request_token)):
     try:
-        lists = get_board_lists(board_id)
+        lists = get_board_lists(board_id, token)
         return lists
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,95 @@
+import random
+import string
+from datetime import datetime, timedelta
+
+# Синтетические данные в формате ответов Trello API для бенчмарков.
+# Генераторы детерминированы (seed), чтобы прогоны на разных коммитах
+# сравнивались на одинаковых входных данных. У каждого генератора свой
+# поток случайных чисел (seed с солью), чтобы ID колонок, карточек и
+# действий не совпадали между собой.
+
+def _trello_id(rng: random.Random) -> str:
+    return "".join(rng.choice("0123456789abcdef") for _ in range(24))
+
+def _trello_date(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+def make_board(num_lists: int = 8, num_members: int = 12, seed: int = 0) -> dict:
+    """Доска: колонки и участники, на которые ссылаются действия карточек."""
+    rng = random.Random(f"{seed}:board")
+    lists = [{"id": _trello_id(rng), "name": f"List {i}"} for i in range(num_lists)]
+    members = []
+    for i in range(num_members):
+        username = "".join(rng.choice(string.ascii_lowercase) for _ in range(8))
+        members.append({"id": _trello_id(rng), "username": username, "fullName": f"Member {i}"})
+    return {"id": _trello_id(rng), "lists": lists, "members": members}
+
+def make_card_actions(board: dict, num_actions: int, seed: int = 0, card_id: str = None) -> list:
+    """
+    История действий одной карточки, от новых к старым (как отдаёт Trello).
+    Первое действие — createCard, дальше перемещения между колонками,
+    добавление/удаление участников и комментарии.
+    """
+    rng = random.Random(f"{seed}:actions")
+    card_id = card_id or _trello_id(rng)
+    lists = board["lists"]
+    members = board["members"]
+    date = datetime(2023, 1, 1) + timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+    current_list = rng.choice(lists)
+    on_card = set()
+    actions = []
+
+    def action(action_type, member, data):
+        data = dict(data, card={"id": card_id, "name": f"Card {card_id[:6]}"})
+        return {
+            "id": _trello_id(rng),
+            "idMemberCreator": member["id"],
+            "type": action_type,
+            "date": _trello_date(date),
+            "data": data,
+            "memberCreator": member,
+        }
+
+    actions.append(action("createCard", rng.choice(members), {"list": current_list}))
+    for _ in range(num_actions - 1):
+        date += timedelta(minutes=rng.randint(5, 60 * 48), seconds=rng.randint(0, 59))
+        member = rng.choice(members)
+        roll = rng.random()
+        if roll < 0.6:
+            next_list = rng.choice([lst for lst in lists if lst is not current_list])
+            actions.append(action("updateCard", member, {
+                "listBefore": current_list, "listAfter": next_list, "old": {"idList": current_list["id"]},
+            }))
+            current_list = next_list
+        elif roll < 0.8:
+            if member["id"] in on_card:
+                on_card.discard(member["id"])
+                actions.append(action("removeMemberFromCard", member, {"idMember": member["id"], "member": member}))
+            else:
+                on_card.add(member["id"])
+                actions.append(action("addMemberToCard", member, {"idMember": member["id"], "member": member}))
+        else:
+            actions.append(action("commentCard", member, {"text": "lorem ipsum " * rng.randint(1, 20)}))
+
+    actions.reverse()
+    return actions
+
+def make_card_info(card_id: str, actions: list) -> dict:
+    """Ответ /cards/{id}: текущая колонка — колонка последнего перемещения."""
+    id_list = None
+    for a in actions:
+        if a["type"] == "updateCard" and a["data"].get("listAfter"):
+            id_list = a["data"]["listAfter"]["id"]
+            break
+        if a["type"] == "createCard":
+            id_list = a["data"]["list"]["id"]
+    return {"id": card_id, "idList": id_list, "name": f"Card {card_id[:6]}"}
+
+def make_board_cards(board: dict, num_cards: int, actions_per_card: int, seed: int = 0) -> dict:
+    """Карточки доски: card_id -> список действий."""
+    rng = random.Random(f"{seed}:cards")
+    cards = {}
+    for i in range(num_cards):
+        card_id = _trello_id(rng)
+        cards[card_id] = make_card_actions(board, actions_per_card, seed=seed * 1_000_003 + i, card_id=card_id)
+    return cards
@@ -0,0 +1,101 @@
+"""
+Память на хранение истории горячих карточек: компактный таймлайн
+(backend/app/timeline.py) против ORM-объектов CardHistory и списков dict.
+
+Таймлайны строятся для всех карточек; ORM и dict — на выборке карточек,
+результат экстраполируется (100k карточек в виде ORM-объектов не помещаются
+в память разумной машины).
+
+Запуск из корня репозитория:
+    python -m benchmarks.memory                       # 100k карточек по 20 действий
+    python -m benchmarks.memory --cards 10000 --actions 200
+"""
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from backend.app.models import CardHistory
+from backend.app.timeline import MOVE_TYPES, CardTimeline
+
+from .generators import make_board
+
+OTHER_TYPES = ("addMemberToCard", "removeMemberFromCard", "commentCard")
+
+
+def make_rows(board: dict, card_index: int, num_actions: int, rng: random.Random) -> list:
+    """Строки истории одной карточки: (id, action_type, list_name, member_id, date)."""
+    date = datetime(2023, 1, 1) + timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+    rows = []
+    for i in range(num_actions):
+        date += timedelta(minutes=rng.randint(5, 60 * 48), seconds=rng.randint(0, 59))
+        if i == 0 or rng.random() < 0.6:
+            action_type = MOVE_TYPES[0] if i == 0 else MOVE_TYPES[2]
+            list_name = rng.choice(board["lists"])["name"]
+        else:
+            action_type = rng.choice(OTHER_TYPES)
+            list_name = None
+        member_id = rng.choice(board["members"])["id"]
+        rows.append((card_index * num_actions + i, action_type, list_name, member_id, date))
+    return rows
+
+
+def traced(build):
+    """Выполняет build() и возвращает (результат, байты, выделенные и удерживаемые им)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def as_orm(rows: list) -> list:
+    return [CardHistory(id=r[0], card_id=1, action_type=r[1], list_name=r[2], member_id=r[3], date=r[4])
+            for r in rows]
+
+
+def as_dicts(rows: list) -> list:
+    return [{"id": r[0], "action_type": r[1], "list_name": r[2], "member_id": r[3], "date": r[4]}
+            for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint of hot card timelines")
+    parser.add_argument("--cards", type=int, default=100_000)
+    parser.add_argument("--actions", type=int, default=20, help="history rows per card")
+    parser.add_argument("--sample", type=int, default=2_000, help="cards materialized as ORM/dict")
+    args = parser.parse_args()
+
+    board = make_board()
+    rng = random.Random(args.cards)
+    print(f"generating {args.cards} cards x {args.actions} rows", file=sys.stderr)
+    cards = [make_rows(board, i, args.actions, rng) for i in range(args.cards)]
+    sample = cards[:min(args.sample, args.cards)]
+    scale = args.cards / len(sample)
+
+    # Строки интернируются заранее: таблицы Interner общие и не зависят от числа карточек
+    CardTimeline.from_rows(cards[0])
+    timelines, timeline_bytes = traced(lambda: [CardTimeline.from_rows(rows) for rows in cards])
+    _, orm_bytes = traced(lambda: [as_orm(rows) for rows in sample])
+    _, dict_bytes = traced(lambda: [as_dicts(rows) for rows in sample])
+    column_bytes = sum(t.nbytes() for t in timelines)
+
+    total_rows = args.cards * args.actions
+    report = [
+        ("CardTimeline (measured)", timeline_bytes),
+        ("  of which column data", column_bytes),
+        (f"ORM CardHistory (x{scale:.0f} from sample)", orm_bytes * scale),
+        (f"list of dict (x{scale:.0f} from sample)", dict_bytes * scale),
+    ]
+    print(f"{'storage':<40} {'total MiB':>10} {'bytes/row':>10}")
+    for name, size in report:
+        print(f"{name:<40} {size / 2**20:>10.1f} {size / total_rows:>10.1f}")
+    print(f"ORM / timeline: {orm_bytes * scale / timeline_bytes:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Микробенчмарки горячих путей: загрузка истории, расчёт метрик,
+детальная история и экспорт. Trello API подменяется синтетическими
+данными (benchmarks/generators.py), база — SQLite в памяти.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run                  # быстрый набор размеров
+    python -m benchmarks.run --full           # до 10k действий и 50k карточек
+    python -m benchmarks.run --compare benchmarks/results/<old>.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.app import trello_api
+from backend.app.database import Base
+from backend.app.responses import FastJSONResponse
+from backend.app.telemetry import instrument_engine
+from backend.routes import card as card_routes
+from backend.routes import export as export_routes
+
+from .generators import make_board, make_board_cards, make_card_actions, make_card_info
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+QUICK_SIZES = {
+    "actions": [10, 100, 1000],
+    "detailed_actions": [10, 100, 1000],
+    "board_cards": [10, 100, 1000],
+}
+FULL_SIZES = {
+    "actions": [10, 100, 1000, 10000],
+    "detailed_actions": [10, 100, 1000, 10000],
+    "board_cards": [10, 1000, 10000, 50000],
+}
+ACTIONS_PER_BOARD_CARD = 20
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code: int = 200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+
+@contextmanager
+def fake_trello(board: dict, cards: dict):
+    """Подменяет вызовы Trello API ответами из сгенерированных данных."""
+    lists_by_id = {lst["id"]: lst for lst in board["lists"]}
+
+    def get_card_actions(card_id, token=None):
+        return cards[card_id]
+
+    def get_card_info(card_id, token=None):
+        return {**make_card_info(card_id, cards[card_id]), "idBoard": board["id"]}
+
+    def trello_get(endpoint, path, params, token=None):
+        if endpoint == "/lists/{id}":
+            return FakeResponse(lists_by_id[path.rsplit("/", 1)[1]])
+        if endpoint == "/boards/{id}/lists":
+            return FakeResponse(board["lists"])
+        raise AssertionError(f"Unexpected Trello call in benchmark: {endpoint}")
+
+    patches = [
+        (trello_api, "get_card_actions", get_card_actions),
+        (trello_api, "get_card_info", get_card_info),
+        (trello_api, "trello_get", trello_get),
+        (card_routes, "get_card_actions", get_card_actions),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, replacement in patches:
+        setattr(module, name, replacement)
+    try:
+        yield
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+
+def memory_session_factory():
+    """Свежая SQLite база в памяти со схемой приложения."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    instrument_engine(engine)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def measure(func, min_time: float = 0.5, min_runs: int = 3, max_runs: int = 50) -> dict:
+    """Повторяет func, пока не наберётся min_time секунд (но не меньше min_runs раз)."""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_runs:
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+        if len(timings) >= min_runs and time.perf_counter() - started >= min_time:
+            break
+    return {
+        "runs": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+    }
+
+
+def bench_card(num_actions: int, detailed: bool):
+    """Бенчмарки одной карточки с num_actions действиями."""
+    board = make_board()
+    card_id = "c" * 24
+    cards = {card_id: make_card_actions(board, num_actions, seed=num_actions, card_id=card_id)}
+    Session = memory_session_factory()
+    results = []
+    params = {"actions": num_actions}
+
+    with fake_trello(board, cards):
+        db = Session()
+        results.append(("save_card_history", params,
+                        measure(lambda: trello_api.save_card_history(card_id, cards[card_id], db))))
+        results.append(("calculate_card_metrics", params,
+                        measure(lambda: trello_api.calculate_card_metrics(card_id, db))))
+        results.append(("calculate_card_metrics_badge", params,
+                        measure(lambda: trello_api.calculate_card_metrics(card_id, db, view="badge"))))
+        if detailed:
+            results.append(("get_card_detailed_history", params,
+                            measure(lambda: card_routes.get_card_detailed_history(card_id, db, token=None))))
+
+        metrics = trello_api.calculate_card_metrics(card_id, db)
+        results.append(("metrics_json_response", params, measure(lambda: FastJSONResponse(metrics))))
+        results.append(("dict_to_csv", params, measure(lambda: export_routes.dict_to_csv(metrics))))
+        results.append(("dict_to_xml", params, measure(lambda: export_routes.dict_to_xml(metrics))))
+        try:
+            import pandas  # noqa: F401
+            import openpyxl  # noqa: F401
+        except ImportError:
+            print("  pandas/openpyxl not installed, skipping dict_to_excel_bytes", file=sys.stderr)
+        else:
+            results.append(("dict_to_excel_bytes", params,
+                            measure(lambda: export_routes.dict_to_excel_bytes(metrics))))
+        db.close()
+    return results
+
+
+def bench_board(num_cards: int):
+    """Загрузка истории всех карточек доски (один прогон — большие размеры долгие)."""
+    board = make_board()
+    cards = make_board_cards(board, num_cards, ACTIONS_PER_BOARD_CARD, seed=num_cards)
+    Session = memory_session_factory()
+    params = {"cards": num_cards, "actions_per_card": ACTIONS_PER_BOARD_CARD}
+
+    with fake_trello(board, cards):
+        db = Session()
+
+        def ingest_board():
+            for card_id, actions in cards.items():
+                trello_api.save_card_history(card_id, actions, db)
+
+        result = measure(ingest_board, min_time=0, min_runs=1, max_runs=1)
+        db.close()
+    result["per_card"] = result["median"] / num_cards
+    return [("board_save_card_history", params, result)]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def run(sizes: dict) -> dict:
+    results = []
+    for num_actions in sizes["actions"]:
+        print(f"card benchmarks: {num_actions} actions", file=sys.stderr)
+        results.extend(bench_card(num_actions, detailed=num_actions in sizes["detailed_actions"]))
+    for num_cards in sizes["board_cards"]:
+        print(f"board benchmark: {num_cards} cards", file=sys.stderr)
+        results.extend(bench_board(num_cards))
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [{"name": name, "params": params, **stats} for name, params, stats in results],
+    }
+
+
+def _key(result: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def compare(baseline: dict, current: dict):
+    """Печатает медианы и отношение текущий/базовый для общих бенчмарков."""
+    old = {_key(r): r for r in baseline["results"]}
+    print(f"{'benchmark':<60} {baseline['commit']:>12} {current['commit']:>12} {'ratio':>8}")
+    for result in current["results"]:
+        key = _key(result)
+        if key not in old:
+            continue
+        ratio = result["median"] / old[key]["median"] if old[key]["median"] else float("inf")
+        print(f"{key:<60} {old[key]['median'] * 1000:>10.2f}ms {result['median'] * 1000:>10.2f}ms {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for metrics and ingestion hot paths")
+    parser.add_argument("--full", action="store_true", help="realistic large sizes (slow)")
+    parser.add_argument("--output", help="results JSON path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    # Логи горячего пути не должны влиять на замеры
+    logging.getLogger("backend").setLevel(logging.ERROR)
+    report = run(FULL_SIZES if args.full else QUICK_SIZES)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+    else:
+        for result in report["results"]:
+            print(f"{_key(result):<60} {result['median'] * 1000:>10.2f}ms ({result['runs']} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -65,24 +65,63 @@ function initBoardSettings() {
 
     const backendUrl = window.BACKEND_URL || 'http://localhost:8000';
 
-    // Load lists for the multi-select
-    loadBoardLists(boardId, backendUrl);
-
-    // Load saved settings
-    loadSavedSettings(boardId);
+    // Load lists for the multi-select first, so saved list selection can be applied
+    loadBoardLists(boardId, backendUrl).then(() => loadSavedSettings(boardId, backendUrl));
 
     // Set up color pickers
     setupColorPickers();
 
     // Save settings on button click
     saveBtn.addEventListener('click', () => {
-        saveSettings(boardId);
+        saveSettings(boardId, backendUrl);
     });
 }
 
+// Board settings live on the backend; these map checkbox/button ids to its fields
+const SETTING_FIELDS = {
+    'show-current-list-time': 'show_current_list_time',
+    'show-total-time': 'show_total_time',
+    'show-specific-lists-time': 'show_specific_lists_time',
+    'show-personal-time': 'show_personal_time'
+};
+const COLOR_FIELDS = {
+    'current-list-color': 'current_list',
+    'total-time-color': 'total_time',
+    'specific-lists-color': 'specific_lists',
+    'personal-time-color': 'personal_time'
+};
+
+// Version of the settings loaded from the server (sent back on save)
+let loadedSettingsVersion = null;
+
+function toHexColor(color) {
+    const match = /^rgb\((\d+),\s*(\d+),\s*(\d+)\)$/.exec(color || '');
+    if (!match) return color;
+    return '#' + match.slice(1).map(n => parseInt(n).toString(16).padStart(2, '0')).join('');
+}
+
+// Member's own Trello token if they have already authorized the Power-Up;
+// with authorize=true asks for read access first (saving settings requires it)
+async function getUserToken(authorize = false) {
+    if (!window.TRELLO_APP_KEY || !window.TrelloPowerUp) return null;
+    try {
+        const t = window.TrelloPowerUp.iframe({ appKey: window.TRELLO_APP_KEY, appName: 'Card Tracker' });
+        const api = t.getRestApi();
+        if (authorize && !(await api.isAuthorized())) {
+            await api.authorize({ scope: 'read' });
+        }
+        return await api.getToken();
+    } catch (e) {
+        return null;
+    }
+}
+
 async function loadBoardLists(boardId, backendUrl) {
     try {
-        const response = await fetch(`${backendUrl}/api/board/${boardId}/lists`);
+        const token = await getUserToken();
+        const response = await fetch(`${backendUrl}/api/board/${boardId}/lists`, {
+            headers: token ? { 'X-Trello-Token': token } : {}
+        });
         if (response.ok) {
             const lists = await response.json();
             const selectElement = document.getElementById('selected-lists');
@@ -101,43 +140,42 @@ async function loadBoardLists(boardId, backendUrl) {
     }
 }
 
-function loadSavedSettings(boardId) {
-    const settings = [
-        'show-current-list-time',
-        'show-total-time',
-        'show-specific-lists-time',
-        'show-personal-time'
-    ];
-
-    settings.forEach(id => {
-        const saved = localStorage.getItem(`${boardId}_${id}`);
-        if (saved !== null) {
-            const checkbox = document.getElementById(id);
-            if (checkbox) checkbox.checked = saved === 'true';
+async function loadSavedSettings(boardId, backendUrl) {
+    let settings = null;
+    try {
+        const response = await fetch(`${backendUrl}/api/board/${boardId}/settings`);
+        if (response.ok) {
+            const data = await response.json();
+            loadedSettingsVersion = data.version;
+            settings = data.settings;
+        } else {
+            console.error('Failed to load board settings:', response.status);
         }
-    });
+    } catch (e) {
+        console.error('Error loading board settings:', e);
+    }
+    if (!settings) return;
+
+    for (const [id, field] of Object.entries(SETTING_FIELDS)) {
+        const checkbox = document.getElementById(id);
+        if (checkbox) checkbox.checked = !!settings[field];
+    }
 
     // Load saved colors
-    const colors = ['current-list-color', 'total-time-color', 'specific-lists-color', 'personal-time-color'];
-    colors.forEach(id => {
-        const savedColor = localStorage.getItem(`${boardId}_${id}`);
-        if (savedColor) {
-            const colorBtn = document.getElementById(id);
-            if (colorBtn) colorBtn.style.backgroundColor = savedColor;
+    for (const [id, field] of Object.entries(COLOR_FIELDS)) {
+        const colorBtn = document.getElementById(id);
+        if (colorBtn && settings.colors && settings.colors[field]) {
+            colorBtn.style.backgroundColor = settings.colors[field];
         }
-    });
+    }
 
     // Load selected lists
-    const savedLists = localStorage.getItem(`${boardId}_selected-lists`);
-    if (savedLists) {
-        const selectedListIds = JSON.parse(savedLists);
-        const selectElement = document.getElementById('selected-lists');
-        if (selectElement) {
-            selectedListIds.forEach(listId => {
-                const option = selectElement.querySelector(`option[value="${listId}"]`);
-                if (option) option.selected = true;
-            });
-        }
+    const selectElement = document.getElementById('selected-lists');
+    if (selectElement) {
+        (settings.selected_lists || []).forEach(listId => {
+            const option = selectElement.querySelector(`option[value="${listId}"]`);
+            if (option) option.selected = true;
+        });
     }
 }
 
@@ -160,37 +198,55 @@ function setupColorPickers() {
     });
 }
 
-function saveSettings(boardId) {
-    const settings = [
-        'show-current-list-time',
-        'show-total-time',
-        'show-specific-lists-time',
-        'show-personal-time'
-    ];
+async function saveSettings(boardId, backendUrl) {
+    const settings = { colors: {}, selected_lists: [] };
 
     // Save checkboxes
-    settings.forEach(id => {
+    for (const [id, field] of Object.entries(SETTING_FIELDS)) {
         const checkbox = document.getElementById(id);
-        if (checkbox) {
-            localStorage.setItem(`${boardId}_${id}`, checkbox.checked);
-        }
-    });
+        if (checkbox) settings[field] = checkbox.checked;
+    }
 
     // Save colors
-    const colors = ['current-list-color', 'total-time-color', 'specific-lists-color', 'personal-time-color'];
-    colors.forEach(id => {
+    for (const [id, field] of Object.entries(COLOR_FIELDS)) {
         const colorBtn = document.getElementById(id);
-        if (colorBtn) {
-            localStorage.setItem(`${boardId}_${id}`, colorBtn.style.backgroundColor);
+        if (colorBtn && colorBtn.style.backgroundColor) {
+            settings.colors[field] = toHexColor(colorBtn.style.backgroundColor);
         }
-    });
+    }
 
     // Save selected lists
     const selectElement = document.getElementById('selected-lists');
     if (selectElement) {
-        const selectedLists = Array.from(selectElement.selectedOptions).map(option => option.value);
-        localStorage.setItem(`${boardId}_selected-lists`, JSON.stringify(selectedLists));
+        settings.selected_lists = Array.from(selectElement.selectedOptions).map(option => option.value);
     }
 
-    alert('Settings saved! Refresh the board to see changes on cards.');
-}
\ No newline at end of file
+    try {
+        // Board settings are shared, so the backend only accepts them from a board member
+        const token = await getUserToken(true);
+        if (!token) {
+            alert('Authorize Card Tracker with Trello to save board settings.');
+            return;
+        }
+        const response = await fetch(`${backendUrl}/api/settings`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-Trello-Token': token },
+            body: JSON.stringify({ board_id: boardId, settings: settings, version: loadedSettingsVersion })
+        });
+        if (response.status === 409) {
+            alert('Settings were changed by someone else. Reopen this window to see the latest settings.');
+            return;
+        }
+        if (response.status === 401 || response.status === 403) {
+            alert('Only members of this board can change its settings.');
+            return;
+        }
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        const data = await response.json();
+        loadedSettingsVersion = data.version;
+        alert('Settings saved! Refresh the board to see changes on cards.');
+    } catch (e) {
+        console.error('Error saving board settings:', e);
+        alert('Failed to save settings: ' + e.message);
+    }
+}
@@ -25,6 +25,21 @@ document.addEventListener('DOMContentLoaded', function() {
     waitForTrelloSDK();
 });
 
+async function getUserToken() {
+    if (!window.TRELLO_APP_KEY || !window.TrelloPowerUp) return null;
+    try {
+        const t = window.TrelloPowerUp.iframe({ appKey: window.TRELLO_APP_KEY, appName: 'Card Tracker' });
+        const api = t.getRestApi();
+        if (!(await api.isAuthorized())) {
+            await api.authorize({ scope: 'read' });
+        }
+        return await api.getToken();
+    } catch (e) {
+        console.log('Trello token unavailable, using backend default:', e);
+        return null;
+    }
+}
+
 function initContent() {
     console.log('Initializing content...');
 
@@ -124,11 +139,13 @@ function initContent() {
             }
             const backendUrl = window.BACKEND_URL || 'http://localhost:8000';
 
-            // Use default token from backend
-            const token = null; // Will use default token from .env
+            // Member's own Trello token (asks for read access once);
+            // without it the backend uses the default token from .env
+            const token = await getUserToken();
+            const headers = token ? { 'X-Trello-Token': token } : {};
 
             // First fetch history to populate DB
-            const fetchResponse = await fetch(`${backendUrl}/api/card/${cardId}/fetch-history`);
+            const fetchResponse = await fetch(`${backendUrl}/api/card/${cardId}/fetch-history`, { headers });
             if (!fetchResponse.ok) {
                 console.error(`Error fetching history: ${fetchResponse.status} ${fetchResponse.statusText}`);
             } else {
@@ -136,7 +153,7 @@ function initContent() {
             }
 
             // Then get metrics
-            const response = await fetch(`${backendUrl}/api/card/${cardId}/metrics`);
+            const response = await fetch(`${backendUrl}/api/card/${cardId}/metrics`, { headers });
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
 
             const metrics = await response.json();
@@ -204,7 +221,7 @@ function initContent() {
             let historyHtml = '';
 
             if (document.getElementById('show-history').checked) {
-                const historyResponse = await fetch(`${backendUrl}/api/card/${cardId}/history`);
+                const historyResponse = await fetch(`${backendUrl}/api/card/${cardId}/history`, { headers });
                 if (!historyResponse.ok) throw new Error(`HTTP error fetching history! status: ${historyResponse.status}`);
 
                 const historyData = await historyResponse.json();
@@ -229,7 +246,7 @@ function initContent() {
                     historyHtml += '<hr style="border: 1px solid black; margin: 20px 0;">';
                 }
 
-                const detailedHistoryResponse = await fetch(`${backendUrl}/api/card/${cardId}/detailed-history`);
+                const detailedHistoryResponse = await fetch(`${backendUrl}/api/card/${cardId}/detailed-history`, { headers });
                 if (!detailedHistoryResponse.ok) throw new Error(`HTTP error fetching detailed history! status: ${detailedHistoryResponse.status}`);
 
                 const detailedHistoryData = await detailedHistoryResponse.json();
@@ -17,6 +17,158 @@ var boardButtonCallback = function(t){
   });
 };
 
+// Requests carry the member's own Trello token when they have authorized
+// the Power-Up, so each user has a separate rate limit on the backend.
+// Without it the backend falls back to the shared token from .env.
+async function getUserToken(t) {
+  if (!window.TRELLO_APP_KEY) return null;
+  try {
+    return await t.getRestApi().getToken();
+  } catch (e) {
+    return null;
+  }
+}
+
+function tokenHeaders(token) {
+  return token ? { 'X-Trello-Token': token } : {};
+}
+
+// Trello renders badges for every card of the board almost at once.
+// Requests made within BADGE_BATCH_DELAY are sent as one /badges call,
+// so board settings and lists are read once per board, not once per card.
+var BADGE_BATCH_DELAY = 50;
+var BADGE_BATCH_SIZE = 50;
+var badgeBatches = {};
+
+function requestCardBadges(backendUrl, boardId, card, token) {
+  return new Promise(function(resolve, reject) {
+    let batch = badgeBatches[boardId];
+    if (!batch) {
+      batch = badgeBatches[boardId] = { cards: [], waiters: {}, token: token };
+      batch.timer = setTimeout(function() { flushCardBadges(backendUrl, boardId); }, BADGE_BATCH_DELAY);
+    }
+    if (!batch.waiters[card.id]) {
+      batch.waiters[card.id] = [];
+      batch.cards.push(card.id + ':' + (card.idList || ''));
+    }
+    batch.waiters[card.id].push({ resolve: resolve, reject: reject });
+    if (batch.cards.length >= BADGE_BATCH_SIZE) {
+      clearTimeout(batch.timer);
+      flushCardBadges(backendUrl, boardId);
+    }
+  });
+}
+
+async function flushCardBadges(backendUrl, boardId) {
+  const batch = badgeBatches[boardId];
+  delete badgeBatches[boardId];
+  if (!batch) return;
+
+  try {
+    const response = await fetch(
+      `${backendUrl}/api/board/${boardId}/badges?cards=${encodeURIComponent(batch.cards.join(','))}`,
+      { headers: tokenHeaders(batch.token) }
+    );
+    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+    const badgesByCard = await response.json();
+    for (const [cardId, waiters] of Object.entries(batch.waiters)) {
+      waiters.forEach(w => w.resolve(badgesByCard[cardId] || []));
+    }
+  } catch (e) {
+    for (const waiters of Object.values(batch.waiters)) {
+      waiters.forEach(w => w.reject(e));
+    }
+  }
+}
+
+// Live badge updates: one EventSource per board, pushed by the backend
+// whenever a card's history is re-ingested or the board settings change.
+// The stream is for board members only: EventSource cannot send headers,
+// so the member's token buys a signed ticket that goes into the URL.
+var FALLBACK_BADGE = { text: 'Tracker', color: 'blue' };
+var BADGE_REFRESH = 10;
+// Most badges the backend builds for one card (current list, total, selected lists)
+var MAX_BADGE_SLOTS = 3;
+var RESUBSCRIBE_DELAY = 5000;
+var liveBadges = {};
+var boardCards = {};
+var boardEventSources = {};
+
+async function subscribeBoardEvents(backendUrl, boardId, token) {
+  if (boardEventSources[boardId] || !token || typeof EventSource === 'undefined') return;
+  boardEventSources[boardId] = 'pending';
+  let ticket;
+  try {
+    const response = await fetch(`${backendUrl}/api/board/${boardId}/events/ticket`, {
+      method: 'POST',
+      headers: tokenHeaders(token)
+    });
+    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+    ticket = (await response.json()).ticket;
+  } catch (e) {
+    console.error('Live badges unavailable:', e);
+    return;
+  }
+
+  const source = new EventSource(`${backendUrl}/api/board/${boardId}/events?ticket=${encodeURIComponent(ticket)}`);
+  source.addEventListener('badges', function(event) {
+    try {
+      const data = JSON.parse(event.data);
+      for (const [cardId, update] of Object.entries(data.cards || {})) {
+        liveBadges[cardId] = update.badges || [];
+        if (boardCards[boardId] && update.idList) boardCards[boardId][cardId] = update.idList;
+      }
+    } catch (e) {
+      console.error('Error parsing badge update:', e);
+    }
+  });
+  // Board settings changed: badges of every card on screen are requested again
+  source.addEventListener('settings', function() {
+    refreshBoardBadges(backendUrl, boardId, token);
+  });
+  // The browser gives up on a rejected reconnect (expired ticket): start over with a new one
+  source.onerror = function() {
+    if (source.readyState !== EventSource.CLOSED) return;
+    delete boardEventSources[boardId];
+    setTimeout(function() { subscribeBoardEvents(backendUrl, boardId, token); }, RESUBSCRIBE_DELAY);
+  };
+  boardEventSources[boardId] = source;
+}
+
+function refreshBoardBadges(backendUrl, boardId, token) {
+  for (const [cardId, idList] of Object.entries(boardCards[boardId] || {})) {
+    requestCardBadges(backendUrl, boardId, { id: cardId, idList: idList }, token)
+      .then(function(badges) { liveBadges[cardId] = badges; })
+      .catch(function(e) { console.error('Error refreshing card badges:', e); });
+  }
+}
+
+// When the board opens, the backend refreshes its most recently active cards
+// in the background, so card panels opened next do not wait for Trello.
+var PREWARM_CARDS = 30;
+var prewarmedBoards = {};
+
+async function prewarmBoard(t) {
+  try {
+    const board = await t.board('id');
+    if (prewarmedBoards[board.id]) return;
+    prewarmedBoards[board.id] = true;
+    const backendUrl = window.BACKEND_URL || 'http://localhost:8000';
+    const cards = await t.cards('id', 'dateLastActivity');
+    cards.sort((a, b) => (b.dateLastActivity || '').localeCompare(a.dateLastActivity || ''));
+    const token = await getUserToken(t);
+    await fetch(`${backendUrl}/api/board/${board.id}/prewarm`, {
+      method: 'POST',
+      headers: Object.assign({ 'Content-Type': 'application/json' }, tokenHeaders(token)),
+      body: JSON.stringify({
+        cards: cards.slice(0, PREWARM_CARDS).map(c => ({ id: c.id, dateLastActivity: c.dateLastActivity }))
+      })
+    });
+  } catch (e) {
+    console.error('Error prewarming board:', e);
+  }
+}
+
 TrelloPowerUp.initialize({
   'card-badges': function(t, options) {
     return new Promise(async (resolve) => {
@@ -25,87 +177,38 @@ TrelloPowerUp.initialize({
 
       // Get current card info
       const card = await t.card('id', 'idList');
-      const badges = [];
+      let badges = [];
 
       try {
-        // Fetch metrics for this card (history should already be loaded)
-        const response = await fetch(`${backendUrl}/api/card/${card.id}/metrics`);
-        if (response.ok) {
-          const metrics = await response.json();
-
-          // Check board settings
-          const showCurrentListTime = localStorage.getItem(`${board.id}_show-current-list-time`) === 'true';
-          const showTotalTime = localStorage.getItem(`${board.id}_show-total-time`) === 'true';
-          const showSpecificListsTime = localStorage.getItem(`${board.id}_show-specific-lists-time`) === 'true';
-          const showPersonalTime = localStorage.getItem(`${board.id}_show-personal-time`) === 'true';
-
-          const currentListColor = localStorage.getItem(`${board.id}_current-list-color`) || '#0079bf';
-          const totalTimeColor = localStorage.getItem(`${board.id}_total-time-color`) || '#61bd4f';
-          const specificListsColor = localStorage.getItem(`${board.id}_specific-lists-color`) || '#ff9f43';
-          const personalTimeColor = localStorage.getItem(`${board.id}_personal-time-color`) || '#eb5a46';
-
-          // Get selected lists for specific lists time
-          const selectedLists = JSON.parse(localStorage.getItem(`${board.id}_selected-lists`) || '[]');
-
-          // Current list time badge
-          if (showCurrentListTime && metrics.time_per_list) {
-            // Find current list name - we need to get it from Trello
-            const listsResponse = await fetch(`${backendUrl}/api/board/${board.id}/lists`);
-            if (listsResponse.ok) {
-              const lists = await listsResponse.json();
-              const currentList = lists.find(l => l.id === card.idList);
-              if (currentList && metrics.time_per_list[currentList.name]) {
-                const hours = (metrics.time_per_list[currentList.name] / 3600).toFixed(1);
-                badges.push({
-                  text: `${currentList.name}: ${hours}h`,
-                  color: currentListColor
-                });
-              }
-            }
-          }
-
-          // Total time badge
-          if (showTotalTime && metrics.total_time !== undefined) {
-            const hours = (metrics.total_time / 3600).toFixed(1);
-            badges.push({
-              text: `Total: ${hours}h`,
-              color: totalTimeColor
-            });
-          }
-
-          // Specific lists time badge - only show if card is in one of the selected lists
-          if (showSpecificListsTime && metrics.time_per_list && selectedLists.length > 0 && selectedLists.includes(card.idList)) {
-            const listsResponse = await fetch(`${backendUrl}/api/board/${board.id}/lists`);
-            if (listsResponse.ok) {
-              const lists = await listsResponse.json();
-              const currentList = lists.find(l => l.id === card.idList);
-              if (currentList && metrics.time_per_list[currentList.name]) {
-                const hours = (metrics.time_per_list[currentList.name] / 3600).toFixed(1);
-                badges.push({
-                  text: `${currentList.name}: ${hours}h`,
-                  color: specificListsColor
-                });
-              }
-            }
-          }
-
-          // Personal time badge - this would require user context
-          // For now, we'll skip this as it needs more complex implementation
-          // The analysis shows this is technically possible but complex
-        }
+        // Badges are built on the backend from server-side board settings
+        const token = await getUserToken(t);
+        badges = await requestCardBadges(backendUrl, board.id, card, token);
       } catch (e) {
         console.error('Error loading card badges:', e);
       }
 
-      // Fallback badge if no custom badges
-      if (badges.length === 0) {
-        badges.push({
-          text: 'Tracker',
-          color: 'blue'
+      // Further updates arrive over the board event stream instead of polling
+      liveBadges[card.id] = badges;
+      boardCards[board.id] = boardCards[board.id] || {};
+      boardCards[board.id][card.id] = card.idList;
+      subscribeBoardEvents(backendUrl, board.id, await getUserToken(t));
+
+      // Dynamic badges re-read liveBadges locally every BADGE_REFRESH seconds.
+      // Slots are reserved for every badge the backend can build, so badges
+      // enabled later in the settings appear without reloading the board
+      const result = [];
+      for (let i = 0; i < MAX_BADGE_SLOTS; i++) {
+        result.push({
+          dynamic: function() {
+            const current = liveBadges[card.id] || [];
+            // Fallback badge if no custom badges
+            const badge = current[i] || (i === 0 ? FALLBACK_BADGE : { text: '' });
+            return Object.assign({ refresh: BADGE_REFRESH }, badge);
+          }
         });
       }
 
-      resolve(badges);
+      resolve(result);
     });
   },
   // Remove card-detail-badges to avoid duplicate buttons
@@ -131,6 +234,8 @@ TrelloPowerUp.initialize({
     };
   },
   'board-buttons': function(t, options) {
+    // Board-level hook: runs once when the board is opened
+    prewarmBoard(t);
     return [{
       icon: GRAY_ICON,
       text: 'Card Tracker',
@@ -164,6 +269,6 @@ TrelloPowerUp.initialize({
       height: 600
     });
   }
-});
+}, window.TRELLO_APP_KEY ? { appKey: window.TRELLO_APP_KEY, appName: 'Card Tracker' } : {});
 
 console.log('Loaded by: ' + document.referrer);
\ No newline at end of file
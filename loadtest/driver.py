@@ -0,0 +1,164 @@
+"""
+Нагрузочный драйвер: N одновременных пользователей повторяют запросы,
+которые делает Power-Up при открытии доски и карточек.
+
+    badge  — powerup.js card-badges: metrics + списки доски
+    panel  — content.js "Load Metrics": fetch-history, metrics, history, detailed-history
+    export — выгрузка метрик в CSV
+
+    python -m loadtest.driver --backend http://localhost:8000 \\
+        --trello http://localhost:8001/1 --users 50 --duration 60
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+import requests
+
+FLOWS = {
+    "badge": [
+        "/api/card/{card_id}/metrics",
+        "/api/board/{board_id}/lists",
+    ],
+    "panel": [
+        "/api/card/{card_id}/fetch-history",
+        "/api/card/{card_id}/metrics",
+        "/api/card/{card_id}/history",
+        "/api/card/{card_id}/detailed-history",
+    ],
+    "export": [
+        "/api/export/{card_id}?format=csv",
+    ],
+}
+DEFAULT_MIX = {"badge": 0.8, "panel": 0.15, "export": 0.05}
+
+
+class Recorder:
+    """Собирает длительности по шагам и сценариям из всех потоков."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def run_user(backend: str, board_id: str, card_ids: list, mix: dict, deadline: float,
+             recorder: Recorder, think_time: float, seed: int, token: str = None):
+    rng = random.Random(seed)
+    session = requests.Session()
+    if token:
+        # Свой токен пользователя — у бэкенда отдельный клиент и лимит Trello на него
+        session.headers["X-Trello-Token"] = token
+    flows = list(mix)
+    weights = [mix[f] for f in flows]
+
+    while time.monotonic() < deadline:
+        flow = rng.choices(flows, weights)[0]
+        card_id = rng.choice(card_ids)
+        flow_start = time.perf_counter()
+        flow_ok = True
+        for step in FLOWS[flow]:
+            path = step.format(card_id=card_id, board_id=board_id)
+            step_start = time.perf_counter()
+            try:
+                ok = session.get(backend + path, timeout=60).ok
+            except requests.RequestException:
+                ok = False
+            recorder.record(f"{flow}:{step.split('?')[0]}", time.perf_counter() - step_start, ok)
+            flow_ok = flow_ok and ok
+        recorder.record(f"flow:{flow}", time.perf_counter() - flow_start, flow_ok)
+        if think_time:
+            time.sleep(rng.expovariate(1 / think_time))
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    report = {"elapsed": elapsed, "steps": {}}
+    total_requests = 0
+    for name, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        if not name.startswith("flow:"):
+            total_requests += len(values)
+        report["steps"][name] = {
+            "count": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "throughput": len(values) / elapsed,
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+            "max": values[-1],
+        }
+    report["requests"] = total_requests
+    report["throughput"] = total_requests / elapsed
+    return report
+
+
+def fetch_board(trello: str, board_id: str = None):
+    """ID доски и карточек берём у заглушки Trello."""
+    if not board_id:
+        board_id = requests.get(trello.rsplit("/1", 1)[0] + "/_stats", timeout=10).json()["board_id"]
+    cards = requests.get(f"{trello}/boards/{board_id}/cards", timeout=60).json()
+    return board_id, [c["id"] for c in cards]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent Power-Up load driver")
+    parser.add_argument("--backend", default="http://localhost:8000")
+    parser.add_argument("--trello", default="http://localhost:8001/1", help="fake Trello base URL")
+    parser.add_argument("--board", help="board ID (default: the fake Trello board)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between flows, seconds")
+    parser.add_argument("--mix", default=json.dumps(DEFAULT_MIX), help='JSON like {"badge": 0.8, "panel": 0.2}')
+    parser.add_argument("--tokens", type=int, default=0,
+                        help="distinct per-user Trello tokens sent as X-Trello-Token (0: shared .env token)")
+    parser.add_argument("--output", help="write JSON report to this path")
+    args = parser.parse_args()
+
+    board_id, card_ids = fetch_board(args.trello, args.board)
+    mix = json.loads(args.mix)
+    print(f"Board {board_id}: {len(card_ids)} cards, {args.users} users for {args.duration}s", file=sys.stderr)
+
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_user, daemon=True,
+                         args=(args.backend, board_id, card_ids, mix, deadline, recorder, args.think_time, i,
+                               f"loadtesttoken{i % args.tokens}" if args.tokens else None))
+        for i in range(args.users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = summarize(recorder, time.perf_counter() - started)
+
+    print(f"{'step':<50} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, s in report["steps"].items():
+        print(f"{name:<50} {s['count']:>7} {s['errors']:>5} {s['throughput']:>8.1f} "
+              f"{s['p50'] * 1000:>7.0f}ms {s['p95'] * 1000:>7.0f}ms {s['p99'] * 1000:>7.0f}ms {s['max'] * 1000:>7.0f}ms")
+    print(f"total: {report['requests']} requests, {report['throughput']:.1f} req/s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
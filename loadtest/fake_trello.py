@@ -0,0 +1,173 @@
+"""
+Локальная заглушка Trello API для нагрузочных тестов.
+
+Отдаёт /1/cards/{id}/actions, /1/cards/{id}, /1/lists/{id},
+/1/boards/{id}/lists и /1/boards/{id}/cards из фикстур, с настраиваемой
+задержкой, долей ошибок и лимитом запросов (429, как у Trello).
+
+    python -m loadtest.fake_trello --port 8001 --cards 500 --actions 100 --latency-ms 80
+    TRELLO_BASE_URL=http://localhost:8001/1 uvicorn backend.app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+
+from fastapi import APIRouter, FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from benchmarks.generators import make_board, make_board_cards, make_card_info
+
+
+class FakeTrelloConfig:
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 20, error_rate: float = 0.0,
+                 rate_limit: int = 100, rate_window: float = 10.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # Trello ограничивает 100 запросов за 10 секунд на токен
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+
+
+class RateLimiter:
+    """Скользящее окно запросов на токен."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def allow(self, token: str) -> bool:
+        if self.limit <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.setdefault(token, deque())
+            while hits and now - hits[0] > self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return False
+            hits.append(now)
+            return True
+
+
+def load_fixtures(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def generate_fixtures(num_cards: int, actions_per_card: int, seed: int = 0) -> dict:
+    board = make_board(seed=seed)
+    return {"board": board, "cards": make_board_cards(board, num_cards, actions_per_card, seed=seed)}
+
+
+def create_app(fixtures: dict, config: FakeTrelloConfig) -> FastAPI:
+    board = fixtures["board"]
+    cards = fixtures["cards"]
+    lists_by_id = {lst["id"]: lst for lst in board["lists"]}
+    limiter = RateLimiter(config.rate_limit, config.rate_window)
+    stats = {"requests": 0, "rate_limited": 0, "errors": 0}
+
+    async def simulate(token: str):
+        """Общая часть всех эндпоинтов: лимит, задержка, случайные ошибки."""
+        stats["requests"] += 1
+        if not limiter.allow(token or "anonymous"):
+            stats["rate_limited"] += 1
+            raise HTTPException(status_code=429, detail="API_TOKEN_LIMIT_EXCEEDED",
+                                headers={"Retry-After": str(int(config.rate_window))})
+        delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if config.error_rate and random.random() < config.error_rate:
+            stats["errors"] += 1
+            raise HTTPException(status_code=500, detail="Simulated Trello error")
+
+    router = APIRouter()
+
+    @router.get("/cards/{card_id}/actions")
+    async def card_actions(card_id: str, token: str = Query(None), limit: int = Query(1000)):
+        await simulate(token)
+        if card_id not in cards:
+            raise HTTPException(status_code=404, detail="The requested resource was not found.")
+        return JSONResponse(cards[card_id][:limit])
+
+    @router.get("/cards/{card_id}")
+    async def card_info(card_id: str, token: str = Query(None)):
+        await simulate(token)
+        if card_id not in cards:
+            raise HTTPException(status_code=404, detail="The requested resource was not found.")
+        info = make_card_info(card_id, cards[card_id])
+        info["idBoard"] = board["id"]
+        return info
+
+    @router.get("/lists/{list_id}")
+    async def list_info(list_id: str, token: str = Query(None)):
+        await simulate(token)
+        if list_id not in lists_by_id:
+            raise HTTPException(status_code=404, detail="The requested resource was not found.")
+        return {**lists_by_id[list_id], "idBoard": board["id"], "closed": False}
+
+    @router.get("/boards/{board_id}/lists")
+    async def board_lists(board_id: str, token: str = Query(None)):
+        await simulate(token)
+        if board_id != board["id"]:
+            raise HTTPException(status_code=404, detail="The requested resource was not found.")
+        return [{**lst, "idBoard": board["id"], "closed": False} for lst in board["lists"]]
+
+    @router.get("/boards/{board_id}/cards")
+    async def board_cards(board_id: str, token: str = Query(None)):
+        await simulate(token)
+        if board_id != board["id"]:
+            raise HTTPException(status_code=404, detail="The requested resource was not found.")
+        return [make_card_info(card_id, actions) for card_id, actions in cards.items()]
+
+    @router.get("/members/me")
+    async def member_me(token: str = Query(None), fields: str = Query(None)):
+        await simulate(token)
+        return {"id": "0" * 24, "idBoards": [board["id"]]}
+
+    app = FastAPI(title="Fake Trello API")
+    app.include_router(router, prefix="/1")
+
+    @app.get("/_stats")
+    def fake_stats():
+        return {"board_id": board["id"], **stats}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Trello API stand-in for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--fixtures", help="JSON with {board, cards}; generated when omitted")
+    parser.add_argument("--save-fixtures", help="write generated fixtures to this path")
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--actions", type=int, default=50, help="actions per card")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=100, help="requests per window per token, 0 = unlimited")
+    parser.add_argument("--rate-window", type=float, default=10.0)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else generate_fixtures(args.cards, args.actions, args.seed)
+    if args.save_fixtures:
+        with open(args.save_fixtures, "w", encoding="utf-8") as f:
+            json.dump(fixtures, f)
+
+    config = FakeTrelloConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, args.rate_window)
+    print(f"Fake Trello board {fixtures['board']['id']} with {len(fixtures['cards'])} cards "
+          f"on http://{args.host}:{args.port}/1")
+
+    import uvicorn
+    uvicorn.run(create_app(fixtures, config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from backend.app import models  # noqa: F401  (регистрирует таблицы в Base.metadata)
+from backend.app.database import Base, DATABASE_URL, make_engine
+from backend.app.search import CARD_SEARCH_TABLE
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    """FTS5-таблица поиска и её служебные таблицы создаются миграцией вручную."""
+    return not (type_ == "table" and name and name.startswith(CARD_SEARCH_TABLE))
+
+
+def run_migrations_offline():
+    """Генерирует SQL без подключения к базе: alembic upgrade head --sql."""
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True,
+                      render_as_batch=DATABASE_URL.startswith("sqlite"), include_name=include_name)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = make_engine(DATABASE_URL)
+    with engine.connect() as connection:
+        # SQLite не умеет ALTER большей части схемы — Alembic пересоздаёт таблицы
+        context.configure(connection=connection, target_metadata=target_metadata,
+                          render_as_batch=connection.dialect.name == "sqlite", include_name=include_name)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,74 @@
+"""Начальная схема: пользователи, настройки досок, карточки, история, статистика
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String()),
+        sa.Column("settings", sa.Text()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "board_settings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("board_id", sa.String()),
+        sa.Column("settings", sa.Text()),
+        sa.Column("version", sa.Integer()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_board_settings_id", "board_settings", ["id"])
+    op.create_index("ix_board_settings_board_id", "board_settings", ["board_id"], unique=True)
+
+    op.create_table(
+        "cards",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trello_card_id", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_cards_id", "cards", ["id"])
+    op.create_index("ix_cards_trello_card_id", "cards", ["trello_card_id"], unique=True)
+
+    op.create_table(
+        "card_history",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id")),
+        sa.Column("action_type", sa.String()),
+        sa.Column("list_name", sa.String()),
+        sa.Column("member_id", sa.String()),
+        sa.Column("date", sa.DateTime()),
+    )
+    op.create_index("ix_card_history_id", "card_history", ["id"])
+    op.create_index("ix_card_history_card_id", "card_history", ["card_id"])
+
+    op.create_table(
+        "card_stats",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id")),
+        sa.Column("total_time", sa.Integer()),
+        sa.Column("time_per_member", sa.Text()),
+        sa.Column("time_per_list", sa.Text()),
+    )
+    op.create_index("ix_card_stats_id", "card_stats", ["id"])
+
+
+def downgrade():
+    op.drop_table("card_stats")
+    op.drop_table("card_history")
+    op.drop_table("cards")
+    op.drop_table("board_settings")
+    op.drop_table("users")
@@ -0,0 +1,76 @@
+"""Свёртка старой истории карточек: card_rollups, card_rollup_entries, индекс по дате
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # База, созданная init_db() и помеченная stamp 0001, может уже содержать эти таблицы
+    tables, history_indexes = existing_schema()
+    if "ix_card_history_date" not in history_indexes:
+        op.create_index("ix_card_history_date", "card_history", ["date"])
+
+    if "card_rollups" not in tables:
+        create_card_rollups()
+    if "card_rollup_entries" not in tables:
+        create_card_rollup_entries()
+
+
+def existing_schema():
+    """Таблицы базы и индексы card_history; в офлайн-режиме (--sql) базы нет — схема пустая."""
+    if context.is_offline_mode():
+        return set(), set()
+    inspector = sa.inspect(op.get_bind())
+    return set(inspector.get_table_names()), {index["name"] for index in inspector.get_indexes("card_history")}
+
+
+def create_card_rollups():
+    op.create_table(
+        "card_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id")),
+        sa.Column("compacted_until", sa.DateTime()),
+        sa.Column("rows", sa.Integer()),
+        sa.Column("first_date", sa.DateTime()),
+        sa.Column("last_date", sa.DateTime()),
+        sa.Column("open_list", sa.String()),
+        sa.Column("open_list_since", sa.DateTime()),
+        sa.Column("open_member", sa.String()),
+        sa.Column("open_member_since", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_card_rollups_id", "card_rollups", ["id"])
+    op.create_index("ix_card_rollups_card_id", "card_rollups", ["card_id"], unique=True)
+
+
+def create_card_rollup_entries():
+    op.create_table(
+        "card_rollup_entries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("card_id", sa.Integer(), sa.ForeignKey("cards.id")),
+        sa.Column("kind", sa.String()),
+        sa.Column("list_name", sa.String()),
+        sa.Column("member_id", sa.String()),
+        sa.Column("seconds", sa.Float()),
+        sa.Column("moves", sa.Integer()),
+        sa.Column("visits", sa.Integer()),
+        sa.Column("first_date", sa.DateTime()),
+        sa.Column("last_date", sa.DateTime()),
+    )
+    op.create_index("ix_card_rollup_entries_id", "card_rollup_entries", ["id"])
+    op.create_index("ix_card_rollup_entries_card_id", "card_rollup_entries", ["card_id"])
+
+
+def downgrade():
+    op.drop_table("card_rollup_entries")
+    op.drop_table("card_rollups")
+    op.drop_index("ix_card_history_date", table_name="card_history")
@@ -0,0 +1,91 @@
+"""Фильтры /cards: доска и текущая колонка карточки, индекс (created_at, id), поиск по ID
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+from backend.app.database import FILL_CARD_CURRENT_LIST_SQL
+from backend.app.search import CARD_SEARCH_TABLE, SQLITE_SEARCH_DDL, create_sqlite_search_index
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Колонки и индексы могли уже добавить init_db() (база помечена stamp 0001)
+    bind = op.get_bind()
+    columns, indexes = existing_cards_schema()
+    new_columns = [
+        sa.Column("board_id", sa.String()),
+        sa.Column("current_list", sa.String()),
+        sa.Column("current_list_since", sa.DateTime()),
+    ]
+    new_columns = [column for column in new_columns if column.name not in columns]
+    if new_columns:
+        with op.batch_alter_table("cards") as batch:
+            for column in new_columns:
+                batch.add_column(column)
+    for name, index_columns in (
+        ("ix_cards_board_id", ["board_id"]),
+        ("ix_cards_current_list_since", ["current_list_since"]),
+        ("ix_cards_created_at_id", ["created_at", "id"]),
+    ):
+        if name not in indexes:
+            op.create_index(name, "cards", index_columns)
+
+    # Текущая колонка существующих карточек — из их истории, иначе фильтры /cards
+    # (stuck_days, in_list) не видят старые данные. board_id заполнит следующая загрузка
+    for statement in FILL_CARD_CURRENT_LIST_SQL:
+        op.execute(statement)
+
+    if bind.dialect.name == "sqlite":
+        if context.is_offline_mode():
+            # Без базы нельзя проверить, есть ли индекс: создаём и заполняем его
+            for statement in SQLITE_SEARCH_DDL:
+                op.execute(statement)
+            op.execute(f"INSERT INTO {CARD_SEARCH_TABLE}({CARD_SEARCH_TABLE}) VALUES ('rebuild')")
+        else:
+            create_sqlite_search_index(bind)
+    elif bind.dialect.name == "postgresql":
+        # pg_trgm может быть недоступен без прав суперпользователя — тогда поиск работает без
+        # индекса. Блок с EXCEPTION откатывает только себя и одинаково работает в --sql
+        op.execute("""DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS ix_cards_trello_card_id_trgm ON cards USING gin (trello_card_id gin_trgm_ops);
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm unavailable, card search works without an index';
+END $$""")
+
+
+def existing_cards_schema():
+    """Колонки и индексы cards; в офлайн-режиме (--sql) базы нет — считаем их отсутствующими."""
+    if context.is_offline_mode():
+        return set(), set()
+    inspector = sa.inspect(op.get_bind())
+    return {column["name"] for column in inspector.get_columns("cards")}, {
+        index["name"] for index in inspector.get_indexes("cards")
+    }
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for trigger in ("cards_fts_insert", "cards_fts_delete", "cards_fts_update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS cards_fts")
+    elif bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_cards_trello_card_id_trgm")
+
+    op.drop_index("ix_cards_created_at_id", table_name="cards")
+    op.drop_index("ix_cards_current_list_since", table_name="cards")
+    op.drop_index("ix_cards_board_id", table_name="cards")
+    with op.batch_alter_table("cards") as batch:
+        batch.drop_column("current_list_since")
+        batch.drop_column("current_list")
+        batch.drop_column("board_id")
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import pytest
+
+# Тесты не трогают tracker.db и .env: своя SQLite база на запуск. Задаётся до
+# импорта backend.app.database, который создаёт engine при импорте
+_TEST_DIR = tempfile.mkdtemp(prefix="tracker-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TEST_DIR}/test.db"
+
+
+@pytest.fixture
+def client():
+    """Клиент приложения на тестовой базе; без lifespan (generate_manifest и прогрев не запускаются)."""
+    from fastapi.testclient import TestClient
+    from backend.app.database import init_db
+    from backend.app.main import app
+
+    init_db()
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    """Сессия тестовой базы со схемой приложения."""
+    from backend.app.database import SessionLocal, init_db
+
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def board():
+    from benchmarks.generators import make_board
+
+    return make_board()
+
+
+@pytest.fixture
+def trello(board):
+    """Trello из сгенерированных данных: тест кладёт действия карточек в словарь card_id -> actions."""
+    from benchmarks.run import fake_trello
+
+    cards = {}
+    with fake_trello(board, cards):
+        yield cards
@@ -0,0 +1,60 @@
+"""Офлайн-загрузка и пересчёт: card_stats совпадает с метриками, контрольная точка продолжает запуск."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from backend.app import backfill, trello_api
+from backend.app.models import Card, CardStat
+from benchmarks.generators import make_card_actions
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARD_IDS = [f"backfillcard{i:012d}" for i in range(6)]
+
+
+@pytest.fixture
+def fetched(trello, board, monkeypatch):
+    calls = []
+
+    def get_card_actions(card_id, token=None):
+        calls.append(card_id)
+        return trello[card_id]
+
+    monkeypatch.setattr(backfill, "get_card_actions", get_card_actions)
+    for seed, card_id in enumerate(CARD_IDS):
+        trello[card_id] = make_card_actions(board, 25, seed=390 + seed, card_id=card_id)
+    return calls
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_backfill_matches_metrics_and_resumes(fetched, db, tmp_path, workers):
+    checkpoint = str(tmp_path / "backfill.json")
+    result = backfill.run_backfill(CARD_IDS, checkpoint, workers=workers, chunk_size=4)
+    assert result["fetch"]["cards"] == result["recompute"]["cards"] == len(CARD_IDS)
+    assert sorted(fetched) == sorted(CARD_IDS)
+
+    for card_id in CARD_IDS:
+        stat = db.query(CardStat).join(Card, Card.id == CardStat.card_id).filter(Card.trello_card_id == card_id).one()
+        metrics = trello_api.calculate_card_metrics(card_id, db, view="badge")
+        assert stat.total_time == round(metrics["total_time"])
+        assert json.loads(stat.time_per_list) == pytest.approx(metrics["time_per_list"])
+
+    # Повторный запуск с той же контрольной точкой ничего не делает
+    result = backfill.run_backfill(CARD_IDS, checkpoint, workers=workers)
+    assert result["fetch"]["cards"] == result["recompute"]["cards"] == 0
+    assert len(fetched) == len(CARD_IDS)
+
+
+def test_backfill_cli_creates_schema(tmp_path):
+    url = f"sqlite:///{tmp_path}/fresh.db"
+    env = {**os.environ, "DATABASE_URL": url}
+    result = subprocess.run(
+        [sys.executable, "-m", "backend.app.backfill", "--all", "--no-fetch"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout)["cards"] == 0
+    assert {"cards", "card_history", "card_stats"} <= set(inspect(create_engine(url)).get_table_names())
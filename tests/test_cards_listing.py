@@ -0,0 +1,74 @@
+"""/api/cards: keyset-пагинация по (created_at, id), префикс и поиск по ID, фильтры по колонке."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from backend.app.models import Card
+
+BOARD_ID = "listingboard000000000001"
+
+
+@pytest.fixture
+def cards(db):
+    """30 карточек доски; у части одинаковый created_at, чтобы проверить порядок по id."""
+    if not db.query(Card.id).filter(Card.board_id == BOARD_ID).first():
+        created = datetime(2024, 1, 1)
+        db.execute(insert(Card), [
+            {
+                "trello_card_id": f"listing{i:03d}{'x_%' if i == 7 else 'abc'}{i:014d}",
+                "created_at": created + timedelta(hours=i // 3),
+                "board_id": BOARD_ID,
+                "current_list": "Doing" if i % 2 else "Done",
+                "current_list_since": datetime.utcnow() - timedelta(days=i),
+            }
+            for i in range(30)
+        ])
+        db.commit()
+    return [card_id for (card_id,) in db.query(Card.trello_card_id).filter(Card.board_id == BOARD_ID).order_by(
+        Card.created_at, Card.id
+    )]
+
+
+def test_keyset_pagination_walks_all_cards(client, cards):
+    seen = []
+    params = {"board_id": BOARD_ID, "limit": 7}
+    while True:
+        response = client.get("/api/cards", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 7
+        seen += [card["trello_card_id"] for card in page]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            assert 'rel="next"' not in response.headers.get("link", "")
+            break
+        params["cursor"] = cursor
+    assert seen == cards
+
+
+def test_invalid_cursor(client):
+    assert client.get("/api/cards", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_prefix_and_search(client, cards):
+    prefix = client.get("/api/cards", params={"trello_card_id": "listing01"}).json()
+    assert [card["trello_card_id"] for card in prefix] == [card_id for card_id in cards if card_id.startswith("listing01")]
+
+    found = client.get("/api/cards", params={"search": "abc00000000000012"}).json()
+    assert [card["trello_card_id"] for card in found] == ["listing012abc00000000000012"]
+
+    # Метасимволы LIKE ищутся как обычные символы
+    found = client.get("/api/cards", params={"search": "x_%", "board_id": BOARD_ID}).json()
+    assert [card["trello_card_id"] for card in found] == ["listing007x_%00000000000007"]
+    assert client.get("/api/cards", params={"search": "x__", "board_id": BOARD_ID}).json() == []
+
+
+def test_list_and_stuck_filters(client, cards):
+    doing = client.get("/api/cards", params={"board_id": BOARD_ID, "in_list": "Doing"}).json()
+    assert len(doing) == 15
+    assert all(card["current_list"] == "Doing" for card in doing)
+
+    stuck = client.get("/api/cards", params={"board_id": BOARD_ID, "stuck_days": 20.5}).json()
+    assert sorted(card["trello_card_id"][7:10] for card in stuck) == [f"{i:03d}" for i in range(21, 30)]
+    assert client.get("/api/cards", params={"stuck_days": -1}).status_code == 422
@@ -0,0 +1,63 @@
+"""Поток обновлений доски: билеты только участникам, доставка бейджей и смены настроек подписчикам."""
+import asyncio
+import time
+
+import pytest
+
+from backend.app import trello_api
+from backend.app.board_settings import member_boards_cache
+from backend.app.events import _ticket_signature, check_board_ticket, format_sse, hub, issue_board_ticket
+
+BOARD_ID = "eventsboard0000000000001"
+
+
+def test_board_ticket_is_bound_to_board_and_expires():
+    ticket = issue_board_ticket(BOARD_ID)
+    assert check_board_ticket(BOARD_ID, ticket)
+    assert not check_board_ticket("otherboard", ticket)
+    assert not check_board_ticket(BOARD_ID, ticket[:-1] + ("0" if ticket[-1] != "0" else "1"))
+    assert not check_board_ticket(BOARD_ID, None)
+
+    expired = int(time.time()) - 1
+    assert not check_board_ticket(BOARD_ID, f"{expired}.{_ticket_signature(BOARD_ID, expired)}")
+
+
+@pytest.fixture
+def member(monkeypatch):
+    monkeypatch.setattr(trello_api, "get_member_board_ids", lambda token: {BOARD_ID})
+    member_boards_cache.clear()
+    yield {"X-Trello-Token": "eventsMemberToken"}
+    member_boards_cache.clear()
+
+
+def test_ticket_endpoint_requires_member(client, member):
+    assert client.post(f"/api/board/{BOARD_ID}/events/ticket").status_code == 401
+    assert client.post("/api/board/otherboard/events/ticket", headers=member).status_code == 403
+
+    ticket = client.post(f"/api/board/{BOARD_ID}/events/ticket", headers=member).json()["ticket"]
+    assert check_board_ticket(BOARD_ID, ticket)
+    assert client.get(f"/api/board/{BOARD_ID}/events").status_code == 403
+    assert client.get("/api/board/otherboard/events", params={"ticket": ticket}).status_code == 403
+
+
+def test_hub_delivers_badges_and_settings():
+    async def scenario():
+        subscription = hub.subscribe(BOARD_ID)
+        try:
+            hub.publish(BOARD_ID, {"card1": {"idList": "l1", "badges": []}})
+            hub.publish(BOARD_ID, {"card1": {"idList": "l2", "badges": []}})
+            hub.publish_settings(BOARD_ID, 7)
+            await asyncio.wait_for(subscription.ready.wait(), 1)
+            return subscription.take()
+        finally:
+            hub.unsubscribe(subscription)
+
+    deltas, version = asyncio.run(scenario())
+    # Непрочитанные обновления карточки схлопываются до последнего
+    assert deltas == {"card1": {"idList": "l2", "badges": []}}
+    assert version == 7
+    assert not hub.has_subscribers(BOARD_ID)
+
+
+def test_format_sse():
+    assert format_sse({"version": 3}, event="settings") == 'event: settings\ndata: {"version":3}\n\n'
@@ -0,0 +1,96 @@
+"""
+Компактный таймлайн и свёртка старой истории: метрики и история колонок после
+свёртки совпадают с посчитанными по полной истории. Плюс облегчённый вид метрик.
+"""
+from backend.app import trello_api
+from backend.app.models import Card, CardHistory, CardRollup
+from backend.app.retention import compact_card_history
+from backend.app.timeline import CardTimeline, load_card_timeline
+from backend.routes.card import get_card_history
+from benchmarks.generators import make_card_actions
+
+
+def rounded(value):
+    """Секунды из свёртки хранятся как float: сравниваем с точностью до миллисекунды."""
+    if isinstance(value, float):
+        return round(value, 3)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+
+def snapshot(card_id, db):
+    db_card_id = db.query(Card.id).filter(Card.trello_card_id == card_id).scalar()
+    return rounded({
+        "full": trello_api.calculate_card_metrics(card_id, db),
+        "badge": trello_api.calculate_card_metrics(card_id, db, view="badge"),
+        "without_actions": trello_api.compute_card_metrics(load_card_timeline(db_card_id, db), None),
+        "history": get_card_history(card_id, db),
+    })
+
+
+def load_card(trello, board, db, card_id, num_actions, seed):
+    trello[card_id] = make_card_actions(board, num_actions, seed=seed, card_id=card_id)
+    trello_api.save_card_history(card_id, trello[card_id], db)
+    return db.query(Card.id).filter(Card.trello_card_id == card_id).scalar()
+
+
+def history_dates(db_card_id, db):
+    return [date for (date,) in db.query(CardHistory.date).filter(CardHistory.card_id == db_card_id).order_by(
+        CardHistory.date, CardHistory.id
+    )]
+
+
+def test_timeline_matches_history_rows(trello, board, db):
+    db_card_id = load_card(trello, board, db, "timeline00000000000000001", 80, seed=34)
+    rows = db.query(
+        CardHistory.id, CardHistory.action_type, CardHistory.list_name, CardHistory.member_id, CardHistory.date
+    ).filter(CardHistory.card_id == db_card_id).order_by(CardHistory.date, CardHistory.id).all()
+
+    timeline = load_card_timeline(db_card_id, db)
+    assert [tuple(row) for row in timeline.rows()] == [tuple(row) for row in rows]
+    assert timeline.nbytes() < sum(len(repr(row)) for row in rows)
+    assert CardTimeline.from_rows(rows).list_and_member_times() == timeline.list_and_member_times()
+
+
+def test_compaction_keeps_metrics_and_history(trello, board, db):
+    card_id = "retention000000000000001"
+    db_card_id = load_card(trello, board, db, card_id, 150, seed=35)
+    baseline = snapshot(card_id, db)
+    dates = history_dates(db_card_id, db)
+
+    # Две свёртки подряд: вторая дополняет уже сохранённую
+    for cutoff in (dates[len(dates) // 3], dates[2 * len(dates) // 3]):
+        assert compact_card_history(db_card_id, cutoff, db) > 0
+        assert min(history_dates(db_card_id, db)) >= cutoff
+        assert snapshot(card_id, db) == baseline
+
+    rollup = db.query(CardRollup).filter(CardRollup.card_id == db_card_id).one()
+    assert rollup.rows + len(history_dates(db_card_id, db)) == len(dates)
+
+
+def test_compaction_of_whole_history(trello, board, db):
+    card_id = "retention000000000000002"
+    db_card_id = load_card(trello, board, db, card_id, 60, seed=36)
+    baseline = snapshot(card_id, db)
+    last = history_dates(db_card_id, db)[-1]
+
+    compact_card_history(db_card_id, last.replace(year=last.year + 1), db)
+    assert history_dates(db_card_id, db) == []
+    assert snapshot(card_id, db) == baseline
+
+
+def test_badge_view_and_field_selection(client, trello, board, db):
+    card_id = "badgeview000000000000001"
+    load_card(trello, board, db, card_id, 40, seed=37)
+
+    full = client.get(f"/api/card/{card_id}/metrics").json()
+    badge = client.get(f"/api/card/{card_id}/metrics", params={"view": "badge"}).json()
+    assert set(badge) == {"total_time", "time_per_list", "list_counts"}
+    assert rounded({key: full[key] for key in badge}) == rounded(badge)
+
+    selected = client.get(f"/api/card/{card_id}/metrics", params={"fields": "total_time"})
+    assert selected.json() == {"total_time": badge["total_time"]}
+    assert client.get(f"/api/card/{card_id}/metrics", params={"fields": "nope"}).status_code == 400
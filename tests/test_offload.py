@@ -0,0 +1,43 @@
+"""Пул процессов для тяжёлых вычислений: тот же результат, что в потоке, и 503 при заполненном пуле."""
+import pytest
+
+from backend.app import offload, trello_api
+from backend.app.models import Card
+from backend.app.timeline import load_card_timeline
+from benchmarks.generators import make_card_actions
+
+CARD_ID = "offloadcard0000000000001"
+
+
+@pytest.fixture
+def process_mode(monkeypatch):
+    monkeypatch.setattr(offload, "OFFLOAD_MODE", "process")
+    # Любая история считается длинной и уходит в пул
+    monkeypatch.setattr(trello_api, "OFFLOAD_MIN_HISTORY", 1)
+    yield
+    offload.shutdown_pool()
+
+
+@pytest.fixture
+def card(trello, board, db):
+    trello[CARD_ID] = make_card_actions(board, 50, seed=40, card_id=CARD_ID)
+    trello_api.save_card_history(CARD_ID, trello[CARD_ID], db)
+    return CARD_ID
+
+
+def test_offloaded_metrics_match_inline(card, trello, db, process_mode):
+    db_card_id = db.query(Card.id).filter(Card.trello_card_id == card).scalar()
+    inline = trello_api.compute_card_metrics(load_card_timeline(db_card_id, db), trello[card])
+    done = offload.OFFLOAD_TASKS.value(task="card_metrics", result="ok")
+    assert trello_api.calculate_card_metrics(card, db) == inline
+    assert offload.OFFLOAD_TASKS.value(task="card_metrics", result="ok") == done + 1
+
+
+def test_saturated_pool_returns_503(client, card, process_mode, monkeypatch):
+    monkeypatch.setattr(offload, "OFFLOAD_MAX_PENDING", 0)
+    for url in (f"/api/card/{card}/metrics", f"/api/export/{card}?format=csv"):
+        response = client.get(url)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == offload.OFFLOAD_RETRY_AFTER
+    # Облегчённый вид бейджей считается на месте и от пула не зависит
+    assert client.get(f"/api/card/{card}/metrics", params={"view": "badge"}).status_code == 200
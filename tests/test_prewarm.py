@@ -0,0 +1,83 @@
+"""
+Прогрев доски: действия карточки кэшируются по (токен, карточка), и панель
+(fetch-history, metrics, detailed-history) обходится одним запросом к Trello.
+Бейджи карточек без истории не грузят Trello в запросе, а ставят их в прогрев.
+"""
+import pytest
+
+from backend.app import prewarm, trello_api
+from backend.app.prewarm import fresh_cards, mark_refreshed, order_by_activity, recent_card_actions, refresh_card
+from backend.routes import card as card_routes
+from benchmarks.generators import make_card_actions
+
+TOKEN = {"X-Trello-Token": "prewarmTokenA"}
+OTHER_TOKEN = {"X-Trello-Token": "prewarmTokenB"}
+
+
+@pytest.fixture
+def actions_calls(trello, monkeypatch):
+    """Считает запросы действий к (поддельному) Trello по всем путям импорта."""
+    calls = []
+
+    def get_card_actions(card_id, token=None):
+        calls.append((card_id, token))
+        return trello[card_id]
+
+    for module in (trello_api, card_routes, prewarm):
+        monkeypatch.setattr(module, "get_card_actions", get_card_actions)
+    fresh_cards.clear()
+    yield calls
+    fresh_cards.clear()
+
+
+def add_card(trello, board, card_id, seed):
+    trello[card_id] = make_card_actions(board, 30, seed=seed, card_id=card_id)
+    return card_id
+
+
+def test_fresh_actions_are_per_token(actions_calls):
+    mark_refreshed("prewarmcard0000000000001", [{"id": "a"}], "prewarmTokenA")
+    assert recent_card_actions("prewarmcard0000000000001", "prewarmTokenA") == [{"id": "a"}]
+    assert recent_card_actions("prewarmcard0000000000001", "prewarmTokenB") is None
+    assert recent_card_actions("prewarmcard0000000000001") is None
+
+
+def test_panel_makes_one_actions_request(client, trello, board, actions_calls):
+    card_id = add_card(trello, board, "prewarmcard0000000000002", seed=42)
+
+    assert client.get(f"/api/card/{card_id}/fetch-history", headers=TOKEN).json()["count"] == 30
+    metrics = client.get(f"/api/card/{card_id}/metrics", headers=TOKEN)
+    detailed = client.get(f"/api/card/{card_id}/detailed-history", headers=TOKEN)
+    assert metrics.status_code == detailed.status_code == 200
+    assert actions_calls == [(card_id, "prewarmTokenA")]
+
+    # Другой токен не получает чужие действия из кэша
+    client.get(f"/api/card/{card_id}/metrics", headers=OTHER_TOKEN)
+    assert actions_calls[-1] == (card_id, "prewarmTokenB")
+
+
+def test_prewarmed_card_skips_trello(client, trello, board, actions_calls):
+    card_id = add_card(trello, board, "prewarmcard0000000000003", seed=43)
+    refresh_card(card_id, "prewarmTokenA")
+    assert len(actions_calls) == 1
+
+    assert client.get(f"/api/card/{card_id}/fetch-history", headers=TOKEN).json()["count"] == 30
+    client.get(f"/api/card/{card_id}/metrics", headers=TOKEN)
+    client.get(f"/api/card/{card_id}/detailed-history", headers=TOKEN)
+    assert len(actions_calls) == 1
+
+
+def test_order_by_activity():
+    cards = [("a", "2024-01-01T00:00:00Z"), ("b", None), ("c", "2024-03-01T00:00:00Z"), ("a", "2024-02-01T00:00:00Z")]
+    assert order_by_activity(cards, 2) == ["c", "a"]
+
+
+def test_badges_for_unknown_cards_are_prewarmed(client, trello, board, actions_calls, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(card_routes, "schedule_prewarm", lambda card_ids, token=None: scheduled.append(card_ids))
+    card_id = add_card(trello, board, "prewarmcard0000000000004", seed=44)
+
+    response = client.get(f"/api/board/{board['id']}/badges", params={"cards": f"{card_id}:list1"}, headers=TOKEN)
+    assert response.json() == {card_id: []}
+    assert scheduled == [[card_id]]
+    assert actions_calls == []
@@ -0,0 +1,75 @@
+"""Настройки доски: версии и 409, проверка схемы, доступ только участникам; настройки пользователя."""
+import pytest
+
+from backend.app import trello_api
+from backend.app.board_settings import member_boards_cache
+
+BOARD_ID = "settingsboard00000000001"
+MEMBER = {"X-Trello-Token": "settingsMemberToken"}
+OUTSIDER = {"X-Trello-Token": "settingsOutsiderToken"}
+
+
+@pytest.fixture
+def members(monkeypatch):
+    """Trello /members/me: участнику видна BOARD_ID, постороннему — другая доска."""
+    calls = []
+
+    def get_member_board_ids(token):
+        calls.append(token)
+        return {BOARD_ID} if token == MEMBER["X-Trello-Token"] else {"otherboard"}
+
+    monkeypatch.setattr(trello_api, "get_member_board_ids", get_member_board_ids)
+    member_boards_cache.clear()
+    yield calls
+    member_boards_cache.clear()
+
+
+def save(client, settings, version=None, headers=MEMBER):
+    body = {"board_id": BOARD_ID, "settings": settings}
+    if version is not None:
+        body["version"] = version
+    return client.post("/api/settings", json=body, headers=headers)
+
+
+def test_board_settings_versions(client, members):
+    current = client.get(f"/api/board/{BOARD_ID}/settings").json()
+    assert current["settings"]["colors"]["total_time"] == "#61bd4f"
+
+    response = save(client, {"show_total_time": True}, version=current["version"])
+    assert response.status_code == 200
+    version = response.json()["version"]
+    assert version == current["version"] + 1
+
+    saved = client.get(f"/api/board/{BOARD_ID}/settings").json()
+    assert saved["version"] == version
+    assert saved["settings"]["show_total_time"] is True
+
+    # Клиент со старой версией не перезаписывает чужие изменения
+    stale = save(client, {"show_total_time": False}, version=current["version"])
+    assert stale.status_code == 409
+    assert client.get(f"/api/board/{BOARD_ID}/settings").json()["settings"]["show_total_time"] is True
+    # Без версии — последняя запись побеждает
+    assert save(client, {"show_total_time": False}).json()["version"] == version + 1
+
+
+def test_board_settings_validation(client, members):
+    response = save(client, {"show_total_time": "yes please", "colors": {"total_time": 5}})
+    assert response.status_code == 422
+    assert all(error["loc"][:2] == ["body", "settings"] for error in response.json()["detail"])
+
+
+def test_board_settings_require_member(client, members):
+    assert save(client, {"show_total_time": True}, headers={}).status_code == 401
+    assert save(client, {"show_total_time": True}, headers=OUTSIDER).status_code == 403
+    # Доски участника кэшируются по токену: Trello спрашивается один раз
+    save(client, {"show_total_time": True})
+    save(client, {"show_total_time": True})
+    assert members.count(MEMBER["X-Trello-Token"]) == 1
+
+
+def test_user_settings_roundtrip(client):
+    assert client.post("/api/settings", json={"settings": {}}).status_code == 400
+    response = client.post("/api/settings", json={"username": "settings-user", "settings": {"theme": "dark"}})
+    assert response.status_code == 200
+    assert client.get("/api/settings/settings-user").json() == {"settings": '{"theme": "dark"}'}
+    assert client.get("/api/settings/nobody-here").status_code == 404
@@ -0,0 +1,45 @@
+"""Статика с хэшем содержимого и заранее сжатыми вариантами, кэш страниц Power-Up."""
+import gzip
+
+from backend.app.main import ASSET_URLS, static_files
+from backend.app.pages import render_page
+from backend.app.static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+
+
+def test_hashed_asset_url_is_immutable(client):
+    url = static_files.asset_url("powerup.js")
+    response = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.content == static_files.assets["powerup.js"].body
+
+    unversioned = client.get("/static/powerup.js", headers={"Accept-Encoding": "identity"})
+    assert unversioned.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+
+def test_etag_revalidation(client):
+    etag = client.get("/static/powerup.js").headers["etag"]
+    response = client.get("/static/powerup.js", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_precompressed_gzip_variant(client):
+    asset = static_files.assets["powerup.js"]
+    response = client.get("/static/powerup.js", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    # TestClient распаковывает ответ сам: сверяем и его, и готовый вариант
+    assert response.content == asset.body
+    assert gzip.decompress(asset.variants["gzip"]) == asset.body
+
+
+def test_pages_reference_hashed_assets_and_are_cached(client):
+    response = client.get("/powerup_frame.html")
+    assert response.status_code == 200
+    assert static_files.asset_url("powerup.js") in response.text
+
+    hits = render_page.cache_info().hits
+    assert client.get("/powerup_frame.html").text == response.text
+    assert render_page.cache_info().hits == hits + 1
+    assert dict(ASSET_URLS)["powerup_js"] == static_files.asset_url("powerup.js")
@@ -0,0 +1,24 @@
+"""Метрики по шаблонам маршрутов и хранение профилей запросов."""
+import os
+
+from backend.app.profiling import prune_profiles
+
+
+def test_request_metrics_use_route_template(client):
+    client.get("/api/card/telemetry-card-1/history")
+    client.get("/api/card/telemetry-card-2/history")
+    client.get("/no/such/page")
+    metrics = client.get("/metrics").text
+    assert 'route="/api/card/{card_id}/history"' in metrics
+    assert 'route="unmatched"' in metrics
+    assert "telemetry-card-1" not in metrics
+
+
+def test_prune_profiles_keeps_newest(tmp_path):
+    names = [f"20260101T0000{i:02d}_0a1b2c3d.folded" for i in range(5)]
+    for name in names:
+        (tmp_path / name).write_text("main 1\n")
+    (tmp_path / "notes.txt").write_text("")
+
+    prune_profiles(str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == sorted(names[-2:] + ["notes.txt"])
@@ -0,0 +1,106 @@
+"""
+Корзина лимита Trello: размер по умолчанию укладывается в 100 запросов за 10 секунд,
+интерактивные запросы идут раньше фоновых, на 429 корзина опустошается на Retry-After
+и запрос повторяется. У каждого токена свой клиент и своя корзина.
+"""
+import threading
+import time
+
+from backend.app import trello_api, trello_clients
+from backend.app.trello_clients import (
+    BACKGROUND, INTERACTIVE, PriorityTokenBucket, TrelloClient, get_client, retry_after_seconds, token_namespace,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_default_budget_fits_trello_limit():
+    assert trello_clients.TRELLO_RATE_BURST + trello_clients.TRELLO_RATE_LIMIT * 10 <= 100
+
+
+def test_interactive_goes_before_background():
+    bucket = PriorityTokenBucket(rate=5.0, burst=1.0, reserve=0.0, starvation=5.0)
+    bucket.acquire(INTERACTIVE)
+    order = []
+
+    def acquire(priority):
+        bucket.acquire(priority)
+        order.append(priority)
+
+    background = threading.Thread(target=acquire, args=(BACKGROUND,))
+    background.start()
+    time.sleep(0.01)
+    interactive = threading.Thread(target=acquire, args=(INTERACTIVE,))
+    interactive.start()
+    background.join(2)
+    interactive.join(2)
+    assert order == [INTERACTIVE, BACKGROUND]
+
+
+def test_background_leaves_reserve_for_interactive():
+    bucket = PriorityTokenBucket(rate=5.0, burst=5.0, reserve=2.0, starvation=5.0)
+    for _ in range(3):
+        assert bucket.acquire(BACKGROUND) < 0.05
+    # Последние два запроса запаса — только интерактивным
+    assert bucket.acquire(INTERACTIVE) < 0.05
+    assert bucket.acquire(BACKGROUND) >= 0.3
+
+
+def test_clients_are_isolated_per_token():
+    first, second = get_client("isolationTokenA"), get_client("isolationTokenB")
+    assert first is get_client("isolationTokenA")
+    assert first is not second
+    assert first.bucket is not second.bucket and first.session is not second.session
+    assert first.namespace == token_namespace("isolationTokenA") != second.namespace
+    assert token_namespace(None) == "default"
+    assert "isolationTokenA" not in first.namespace
+
+
+def test_retry_after_parsing():
+    assert retry_after_seconds("7") == 7.0
+    assert retry_after_seconds("Thu, 01 Jan 1970 00:00:00 GMT") == 0.0
+    assert retry_after_seconds(None) == trello_clients.TRELLO_RETRY_AFTER_DEFAULT
+    assert retry_after_seconds("soon") == trello_clients.TRELLO_RETRY_AFTER_DEFAULT
+
+
+def test_drain_delays_next_request():
+    bucket = PriorityTokenBucket(rate=100.0, burst=10.0, reserve=0.0, starvation=5.0)
+    bucket.drain(0.2)
+    started = time.monotonic()
+    bucket.acquire(trello_clients.INTERACTIVE)
+    assert time.monotonic() - started >= 0.2
+
+
+def test_trello_get_retries_after_429(monkeypatch):
+    client = TrelloClient("rate-test-token")
+    client.set_rate(1000.0, 10.0)
+    responses = [FakeResponse(429, {"Retry-After": "0.1"}), FakeResponse(200)]
+    monkeypatch.setattr(client.session, "get", lambda url, params: responses.pop(0))
+    monkeypatch.setattr(trello_api, "get_client", lambda token: client)
+
+    started = time.monotonic()
+    response = trello_api.trello_get("/cards/{id}", "/cards/abc", {})
+    assert response.status_code == 200
+    assert not responses
+    assert time.monotonic() - started >= 0.1
+
+
+def test_trello_get_gives_up_after_max_retries(monkeypatch):
+    client = TrelloClient("rate-test-token-2")
+    client.set_rate(1000.0, 10.0)
+    calls = []
+
+    def get(url, params):
+        calls.append(url)
+        return FakeResponse(429, {"Retry-After": "0"})
+
+    monkeypatch.setattr(client.session, "get", get)
+    monkeypatch.setattr(trello_api, "get_client", lambda token: client)
+    monkeypatch.setattr(trello_api, "TRELLO_MAX_RETRIES", 2)
+
+    assert trello_api.trello_get("/cards/{id}", "/cards/abc", {}).status_code == 429
+    assert len(calls) == 3